@@ -1,6 +1,10 @@
+import os
 from datetime import datetime, timedelta
 
-from flask import Flask, current_app
+import click
+from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
+from jinja2 import FileSystemBytecodeCache
 from flask_login import current_user
 
 from config import Config
@@ -14,44 +18,68 @@ from .blueprints.scheduling import scheduling_bp
 from .blueprints.admin import admin_bp
 from .blueprints.chat import chat_blueprint
 from .utils.data_portugues import data_utils  # ✅ IMPORTAR AQUI
+from .utils.fragmentos import fragmento
+from .utils.logs import configurar_logs
+from .utils.perfilador import configurar_perfilador
+
+def corrigir_timezone(data_utc, horas=-3):
+    """Corrige timezone UTC para local (Brasília -3h)"""
+    if not data_utc:
+        return None
+    if hasattr(data_utc, 'replace'):
+        return data_utc.replace(tzinfo=None) + timedelta(hours=horas)
+    return data_utc
+
 
 def create_app(config_class: type[Config] = Config) -> Flask:
     app = Flask(__name__, static_folder="static", template_folder="templates")
     app.config.from_object(config_class)
+    configurar_logs(app)
+    configurar_bytecode_cache(app)
 
     init_extensions(app)
+    # Por fora do middleware do Socket.IO: request.remote_addr passa a ser o
+    # IP do cliente informado pelos proxies confiáveis
+    proxies = app.config.get("PROXIES_CONFIAVEIS", 0)
+    if proxies:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxies, x_proto=proxies)
     mysql.init_app(app)
     login_manager.init_app(app)
     login_manager.login_view = "auth.login"
     login_manager.login_message = "Faça login para continuar."
+    configurar_perfilador(app)
 
     register_blueprints(app)
 
+    from .services import referencia_service
+    with app.app_context():
+        referencia_service.aquecer()
+
+    # Valores fixos ficam nos globals do Jinja (montados uma vez por worker);
+    # o context processor só calcula o que depende do usuário/requisição.
+    app.jinja_env.globals.update(
+        app_version=app.config.get("APP_VERSION", "1.0.0"),
+        timedelta=timedelta,
+        corrigir_timezone=corrigir_timezone,
+        datetime_py=datetime,  # ✅ Módulo datetime padrão
+        data_pt=data_utils,    # ✅ Suas funções customizadas
+        fragmento=fragmento,
+    )
+
     @app.context_processor
     def inject_template_globals():
-        role = getattr(current_user, "role", None)
-        unidade = getattr(current_user, "unidade_nome", None)
-        
-        def corrigir_timezone(data_utc, horas=-3):
-            """Corrige timezone UTC para local (Brasília -3h)"""
-            if not data_utc:
-                return None
-            if hasattr(data_utc, 'replace'):
-                return data_utc.replace(tzinfo=None) + timedelta(hours=horas)
-            return data_utc
-        
         return {
-            "usuario_logado_role": role,
-            "usuario_logado_unidade": unidade,
+            "usuario_logado_role": getattr(current_user, "role", None),
+            "usuario_logado_unidade": getattr(current_user, "unidade_nome", None),
             "current_year": datetime.now().year,
-            "app_version": current_app.config.get("APP_VERSION", "1.0.0"),
-            "timedelta": timedelta,
-            "corrigir_timezone": corrigir_timezone,
-            "datetime_py": datetime,  # ✅ Módulo datetime padrão
-            "data_pt": data_utils       # ✅ Suas funções customizadas
         }
-    
+
+    register_commands(app)
+    if app.config.get("JINJA_AQUECER_TEMPLATES"):
+        aquecer_templates(app)
+
     from .blueprints.chat import socket_events
+    from .blueprints.dashboards import socket_events as socket_events_filas
 
     return app
 
@@ -64,4 +92,37 @@ def register_blueprints(app: Flask) -> None:
     app.register_blueprint(regulator_bp, url_prefix="/regulador")
     app.register_blueprint(scheduling_bp, url_prefix="/agendamento")
     app.register_blueprint(admin_bp)
-    app.register_blueprint(chat_blueprint)
\ No newline at end of file
+    app.register_blueprint(chat_blueprint)
+
+
+# ==========================================================
+# ⚡ Templates: cache de bytecode e pré-compilação
+# ==========================================================
+def configurar_bytecode_cache(app: Flask) -> None:
+    """
+    Grava o bytecode dos templates compilados em disco, compartilhado entre
+    workers e reinícios. Precisa ser feito antes do primeiro uso de jinja_env.
+    """
+    diretorio = app.config.get("JINJA_BYTECODE_CACHE_DIR")
+    if not diretorio:
+        return
+    if not os.path.isabs(diretorio):
+        diretorio = os.path.join(os.path.dirname(app.root_path), diretorio)
+    os.makedirs(diretorio, exist_ok=True)
+    app.jinja_options = {**app.jinja_options, "bytecode_cache": FileSystemBytecodeCache(diretorio)}
+
+
+def aquecer_templates(app: Flask) -> int:
+    """Compila todos os templates (preenchendo os caches). Retorna quantos."""
+    nomes = [nome for nome in app.jinja_env.list_templates() if nome.endswith(".html")]
+    for nome in nomes:
+        app.jinja_env.get_template(nome)
+    return len(nomes)
+
+
+def register_commands(app: Flask) -> None:
+    @app.cli.command("precompile-templates")
+    def precompile_templates():
+        """Pré-compila os templates para o cache de bytecode (rodar no deploy)."""
+        total = aquecer_templates(app)
+        click.echo(f"{total} templates compilados.")
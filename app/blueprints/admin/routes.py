@@ -4,15 +4,17 @@ import re
 from datetime import datetime
 from typing import Optional
 
-from flask import flash, redirect, render_template, request, url_for
+from flask import abort, flash, jsonify, redirect, render_template, request, send_from_directory, url_for
 from flask_login import login_required
-from werkzeug.security import generate_password_hash
 
 from app.repositories import exames as exames_repo
 from app.repositories import unidades as unidades_repo
 from app.repositories import usuarios as usuarios_repo
 from app.repositories import consultas as consultas_repo
+from app.services import acompanhamento_service, referencia_service, usuarios_service
+from app.utils import perfilador
 from app.utils.decorators import roles_required
+from app.utils.security import hash_password
 
 from . import admin_bp
 
@@ -52,7 +54,7 @@ def _normalizar_cpf(valor: Optional[str]) -> str:
 
 
 def _carregar_unidades_para_formulario():
-    unidades = unidades_repo.listar_unidades_ativas()
+    unidades = referencia_service.listar("unidades")
     return sorted(unidades, key=lambda unidade: unidade["nome"].lower())
 
 
@@ -77,6 +79,7 @@ def criar_unidade():
             return render_template("admin/unidades/form.html", unidade=None)
 
         unidades_repo.criar_unidade(nome=nome, ativa=ativa)
+        referencia_service.invalidar()
         flash("Unidade criada com sucesso.", "success")
         return redirect(url_for("admin.listar_unidades"))
 
@@ -101,6 +104,9 @@ def editar_unidade(unidade_id: int):
             return render_template("admin/unidades/form.html", unidade=unidade)
 
         unidades_repo.atualizar_unidade(unidade_id=unidade_id, nome=nome, ativa=ativa)
+        referencia_service.invalidar()
+        if nome != unidade["nome"]:
+            usuarios_service.invalidar()  # unidade_nome vem junto no usuário logado
         flash("Unidade atualizada com sucesso.", "success")
         return redirect(url_for("admin.listar_unidades"))
 
@@ -118,6 +124,7 @@ def alterar_status_unidade(unidade_id: int):
 
     nova_situacao = not bool(unidade["ativo"])
     unidades_repo.definir_status(unidade_id=unidade_id, ativa=nova_situacao)
+    referencia_service.invalidar()
 
     mensagem = "Unidade ativada com sucesso." if nova_situacao else "Unidade desativada com sucesso."
     flash(mensagem, "success")
@@ -203,7 +210,7 @@ def criar_usuario():
                 roles_opcoes=ROLES_OPCOES,
             )
 
-        senha_hash = generate_password_hash(senha)
+        senha_hash = hash_password(senha)
 
         usuarios_repo.criar_usuario(
             nome=nome,
@@ -315,9 +322,9 @@ def editar_usuario(usuario_id: int):
         }
 
         if senha:
-            campos_atualizados["senha_hash"] = generate_password_hash(senha)
+            campos_atualizados["senha_hash"] = hash_password(senha)
 
-        usuarios_repo.atualizar_usuario(usuario_id=usuario_id, **campos_atualizados)
+        usuarios_service.atualizar_usuario(usuario_id=usuario_id, **campos_atualizados)
 
         flash("Usuário atualizado com sucesso.", "success")
         return redirect(url_for("admin.listar_usuarios"))
@@ -352,7 +359,7 @@ def alterar_status_usuario(usuario_id: int):
         return redirect(url_for("admin.listar_usuarios"))
 
     novo_status = 0 if usuario.get("ativo") else 1
-    usuarios_repo.atualizar_usuario(
+    usuarios_service.atualizar_usuario(
         usuario_id=usuario_id,
         ativo=novo_status,
         atualizado_em=datetime.utcnow(),
@@ -390,6 +397,7 @@ def novo_exame():
             )
 
         exames_repo.criar_exame(nome=nome)
+        referencia_service.invalidar()
         flash("Exame criado com sucesso.", "success")
         return redirect(url_for("admin.listar_exames"))
 
@@ -423,6 +431,7 @@ def editar_exame(exame_id: int):
             )
 
         exames_repo.atualizar_exame(exame_id=exame_id, nome=nome)
+        referencia_service.invalidar()
         flash("Exame atualizado com sucesso.", "success")
         return redirect(url_for("admin.listar_exames"))
 
@@ -462,6 +471,7 @@ def nova_consulta():
             )
 
         consultas_repo.criar_consulta(especialidade=especialidade, descricao=descricao)
+        referencia_service.invalidar()
         flash("Especialidade criada com sucesso.", "success")
         return redirect(url_for("admin.listar_consultas"))
 
@@ -496,6 +506,7 @@ def editar_consulta(consulta_id: int):
             )
 
         consultas_repo.atualizar_consulta(consulta_id=consulta_id, especialidade=especialidade, descricao=descricao)
+        referencia_service.invalidar()
         flash("Especialidade atualizada com sucesso.", "success")
         return redirect(url_for("admin.listar_consultas"))
 
@@ -518,7 +529,54 @@ def alterar_status_consulta(consulta_id: int):
 
     nova_situacao = not bool(consulta["ativo"])
     consultas_repo.alterar_status(consulta_id=consulta_id, ativo=nova_situacao)
+    referencia_service.invalidar()
 
     mensagem = "Especialidade ativada com sucesso." if nova_situacao else "Especialidade desativada com sucesso."
     flash(mensagem, "success")
-    return redirect(url_for("admin.listar_consultas"))
\ No newline at end of file
+    return redirect(url_for("admin.listar_consultas"))
+
+
+@admin_bp.route("/metricas/acompanhamento")
+@login_required
+@roles_required("admin")
+def metricas_acompanhamento():
+    """Contadores da consulta pública (consultas, cache, bloqueios) deste worker."""
+    return jsonify(acompanhamento_service.metricas())
+
+
+# ==========================================================
+# 🔬 Perfis de requisição (?_perfil=1 em qualquer página, como admin)
+# ==========================================================
+@admin_bp.route("/perfis")
+@login_required
+@roles_required("admin")
+def listar_perfis():
+    return render_template(
+        "admin/perfis/list.html",
+        perfis=perfilador.listar_perfis(),
+        parametro=perfilador.PARAMETRO,
+        cabecalho=perfilador.CABECALHO,
+    )
+
+
+@admin_bp.route("/perfis/<nome>")
+@login_required
+@roles_required("admin")
+def ver_perfil(nome: str):
+    perfil = perfilador.obter_perfil(nome)
+    if not perfil:
+        abort(404)
+    return render_template("admin/perfis/detalhe.html", perfil=perfil, folha_espera=perfilador.FOLHA_ESPERA)
+
+
+@admin_bp.route("/perfis/<nome>/collapsed")
+@login_required
+@roles_required("admin")
+def baixar_perfil(nome: str):
+    """Pilhas no formato collapsed (flamegraph.pl, speedscope)."""
+    if not perfilador.obter_perfil(nome, limite=0):
+        abort(404)
+    return send_from_directory(
+        perfilador.diretorio_perfis(), f"{nome}.folded",
+        mimetype="text/plain", as_attachment=True, download_name=f"{nome}.folded.txt",
+    )
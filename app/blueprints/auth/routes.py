@@ -1,11 +1,39 @@
-from flask import render_template, request, redirect, url_for, flash
+import re
+
+from flask import current_app, render_template, request, redirect, url_for, flash
 from flask_login import login_user, logout_user, current_user
 
 from app.models.usuario import Usuario
 from app.repositories import usuarios as usuarios_repo
+from app.utils.rate_limit import LimiteTaxa, ip_cliente
 from app.utils.security import verify_password
 from . import auth_bp
 
+_limites: dict[str, LimiteTaxa] = {}
+
+
+def _limites_login() -> dict[str, LimiteTaxa]:
+    """Limites de tentativas por IP e por CPF (criados com a config do app)."""
+    if not _limites:
+        config = current_app.config
+        janela = config["LOGIN_LIMITE_JANELA_SEGUNDOS"]
+        _limites["ip"] = LimiteTaxa(config["LOGIN_LIMITE_POR_IP"], janela)
+        _limites["cpf"] = LimiteTaxa(config["LOGIN_LIMITE_POR_CPF"], janela)
+    return _limites
+
+
+def _tentativa_bloqueada(cpf: str):
+    """
+    Consome uma tentativa do IP e do CPF. Retorna os segundos de espera se
+    algum limite foi atingido (antes de consultar o banco ou calcular hash).
+    """
+    limites = _limites_login()
+    chaves = (("ip", ip_cliente()), ("cpf", re.sub(r"\D", "", cpf)))
+    for nome, chave in chaves:
+        if not limites[nome].consumir(chave):
+            return limites[nome].segundos_para_liberar(chave)
+    return None
+
 
 @auth_bp.route("/login", methods=["GET", "POST"])
 def login():
@@ -16,6 +44,11 @@ def login():
         cpf = request.form.get("cpf", "")
         senha = request.form.get("senha", "")
 
+        espera = _tentativa_bloqueada(cpf)
+        if espera is not None:
+            flash(f"Muitas tentativas de login. Aguarde {espera} segundos e tente novamente.", "danger")
+            return render_template("auth/login.html"), 429, {"Retry-After": str(espera)}
+
         usuario_db = usuarios_repo.obter_por_cpf(cpf)
         if not usuario_db:
             flash("CPF não encontrado ou usuário inativo.", "danger")
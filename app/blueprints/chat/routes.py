@@ -1,6 +1,8 @@
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, current_app, render_template, request, jsonify
 from flask_login import login_required, current_user
 from app.extensions import mysql
+from app.services import cache_service
+from app.utils.http_cache import resposta_condicional
 from datetime import datetime, timedelta
 import os
 import json
@@ -25,9 +27,19 @@ def update_user_status(user_id, is_online=True):
     with mysql.get_cursor() as (_, cursor):
         cursor.execute("""
             UPDATE usuarios 
-            SET is_online = %s, last_seen = NOW()
-            WHERE id = %s
-        """, (is_online, user_id))  # ✅ USAR NOW() EM VEZ DE datetime.now()
+            SET is_online = %s
+            WHERE id = %s AND NOT (is_online <=> %s)
+        """, (is_online, user_id, is_online))
+        mudou = cursor.rowcount > 0
+        cursor.execute("UPDATE usuarios SET last_seen = NOW() WHERE id = %s", (user_id,))  # ✅ USAR NOW() EM VEZ DE datetime.now()
+
+    # Geração de presença: só muda quando alguém entra/sai (usada nos ETags do chat)
+    if mudou:
+        cache_service.invalidar(cache_service.PRESENCA)
+
+
+def _minuto_atual():
+    return datetime.now().strftime("%Y%m%d%H%M")
 
 def get_user_status(user_id):
     """Retorna o status de um usuário"""
@@ -124,6 +136,12 @@ def chat():
 @login_required
 def get_user_online_status(user_id):
     """Retorna status online/offline de um usuário"""
+    # "Xmin atrás" muda a cada minuto: o minuto atual entra no ETag
+    partes = ("status", user_id, cache_service.versao(cache_service.PRESENCA), _minuto_atual())
+    return resposta_condicional(partes, lambda: _status_usuario(user_id))
+
+
+def _status_usuario(user_id):
     with mysql.get_cursor(dictionary=True) as (_, cursor):
         cursor.execute("""
             SELECT is_online, last_seen,
@@ -203,7 +221,7 @@ def get_messages(conversation_id):
         
         return jsonify(mensagens)
     except Exception as e:
-        print(f"❌ Erro ao carregar mensagens: {e}")
+        current_app.logger.exception("Erro ao carregar mensagens")
         return jsonify({"error": str(e)}), 500
 
 # ==========================================================
@@ -246,8 +264,8 @@ def upload_file():
             "mime_type": file.content_type
         }), 201
         
-    except Exception as e:
-        print(f"❌ Erro no upload: {e}")
+    except Exception:
+        current_app.logger.exception("Erro no upload de anexo do chat")
         return jsonify({"error": "Erro ao fazer upload do arquivo"}), 500
 
 # ==========================================================
@@ -256,6 +274,19 @@ def upload_file():
 @chat_blueprint.route("/chat/usuarios")
 @login_required
 def get_users():
+    # O minuto entra no ETag para que usuários inativos há >5 min sejam revistos
+    partes = (
+        "usuarios",
+        current_user.id,
+        current_user.role,
+        cache_service.versao(cache_service.PRESENCA),
+        cache_service.versao(cache_service.USUARIOS),
+        _minuto_atual(),
+    )
+    return resposta_condicional(partes, _listar_usuarios)
+
+
+def _listar_usuarios():
     role = current_user.role
     query = """
         SELECT id, nome, role, is_online, last_seen,
@@ -289,6 +320,28 @@ def get_users():
 @chat_blueprint.route("/chat/conversas")
 @login_required
 def list_conversations():
+    # Sonda barata: quantas conversas e a última mensagem delas (pelo índice de conversation_id)
+    with mysql.get_cursor(dictionary=True) as (_, cursor):
+        cursor.execute("""
+            SELECT COUNT(DISTINCT p.conversation_id) AS conversas, MAX(m.id) AS ultima_mensagem_id
+            FROM conversation_participants p
+            LEFT JOIN messages m ON m.conversation_id = p.conversation_id
+            WHERE p.user_id = %s
+        """, (current_user.id,))
+        sonda = cursor.fetchone()
+
+    partes = (
+        "conversas",
+        current_user.id,
+        sonda["conversas"],
+        sonda["ultima_mensagem_id"],
+        cache_service.versao(cache_service.PRESENCA),
+        cache_service.versao(cache_service.USUARIOS),
+    )
+    return resposta_condicional(partes, _listar_conversas)
+
+
+def _listar_conversas():
     with mysql.get_cursor(dictionary=True) as (_, cursor):
         cursor.execute("""
             SELECT 
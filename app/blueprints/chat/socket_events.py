@@ -1,19 +1,14 @@
+from flask import current_app
 from flask_socketio import emit, join_room
 from flask_login import current_user
 from app.extensions import socketio, mysql
-import json
+from .routes import update_user_status
 
 @socketio.on('connect')
 def on_connect():
     if current_user.is_authenticated:
         try:
-            with mysql.get_cursor() as (conn, cursor):
-                cursor.execute("""
-                    UPDATE usuarios 
-                    SET is_online = TRUE, last_seen = NOW()
-                    WHERE id = %s
-                """, (current_user.id,))  # ✅ USAR NOW()
-                conn.commit()
+            update_user_status(current_user.id, True)
             
             emit('user_status_changed', {
                 'user_id': current_user.id,
@@ -22,21 +17,15 @@ def on_connect():
                 'event': 'connected'
             }, broadcast=True, include_self=False)
             
-            print(f"✅ {current_user.nome} ficou online")
-        except Exception as e:
-            print(f"❌ Erro ao marcar como online: {e}")
+            current_app.logger.info("Usuário online", extra={"evento": "socket.conexao"})
+        except Exception:
+            current_app.logger.exception("Erro ao marcar usuário como online")
 
 @socketio.on('disconnect')
 def on_disconnect():
     if current_user.is_authenticated:
         try:
-            with mysql.get_cursor() as (conn, cursor):
-                cursor.execute("""
-                    UPDATE usuarios 
-                    SET is_online = FALSE, last_seen = NOW()
-                    WHERE id = %s
-                """, (current_user.id,))  # ✅ USAR NOW()
-                conn.commit()
+            update_user_status(current_user.id, False)
             
             emit('user_status_changed', {
                 'user_id': current_user.id,
@@ -45,9 +34,9 @@ def on_disconnect():
                 'event': 'disconnected'
             }, broadcast=True)
             
-            print(f"❌ {current_user.nome} ficou offline")
-        except Exception as e:
-            print(f"❌ Erro ao marcar como offline: {e}")
+            current_app.logger.info("Usuário offline", extra={"evento": "socket.desconexao"})
+        except Exception:
+            current_app.logger.exception("Erro ao marcar usuário como offline")
 
 @socketio.on('heartbeat')
 def on_heartbeat():
@@ -60,21 +49,20 @@ def on_heartbeat():
                     WHERE id = %s
                 """, (current_user.id,))  # ✅ USAR NOW()
                 conn.commit()
-        except Exception as e:
-            print(f"❌ Erro no heartbeat: {e}")
+        except Exception:
+            current_app.logger.exception("Erro no heartbeat")
 
 @socketio.on("join")
 def handle_join(data):
     room = data.get("room")
     if not room:
-        print("⚠️ Evento JOIN sem room.")
+        current_app.logger.warning("Evento join sem sala", extra={"evento": "socket.entrar_sala"})
         return
     join_room(room)
-    print(f"👥 {current_user.nome if current_user.is_authenticated else 'Anônimo'} entrou na sala {room}")
+    current_app.logger.info("Entrou na sala", extra={"evento": "socket.entrar_sala", "sala": room})
 
 @socketio.on("send_message")
 def handle_send_message(data):
-    print("📩 Evento send_message recebido:", data)
     try:
         room = data.get("room")
         conversation_id = data.get("conversation_id")
@@ -82,7 +70,10 @@ def handle_send_message(data):
         attachments = data.get("attachments", [])
 
         if not room or not conversation_id or (not message_text and not attachments):
-            print("⚠️ Dados incompletos para enviar mensagem.")
+            current_app.logger.warning(
+                "Mensagem do chat com dados incompletos",
+                extra={"evento": "chat.mensagem", "conversation_id": conversation_id},
+            )
             return
 
         user_id = current_user.id if current_user.is_authenticated else None
@@ -138,7 +129,17 @@ def handle_send_message(data):
             
             conn.commit()
 
-        print(f"✅ Mensagem salva na conversa {conversation_id} por {user_name}")
+        # Só ids e tamanhos: o texto da mensagem não vai para o log
+        current_app.logger.info(
+            "Mensagem do chat salva",
+            extra={
+                "evento": "chat.mensagem",
+                "conversation_id": conversation_id,
+                "message_id": message_id,
+                "tamanho": len(message_text),
+                "anexos": len(saved_attachments),
+            },
+        )
 
         # ✅ EMITIR COM TIMESTAMP DO BANCO
         emit(
@@ -166,5 +167,8 @@ def handle_send_message(data):
         )
 
     except Exception as e:
-        print(f"❌ Erro ao processar mensagem: {e}")
+        current_app.logger.exception(
+            "Erro ao processar mensagem do chat",
+            extra={"evento": "chat.mensagem", "conversation_id": (data or {}).get("conversation_id")},
+        )
         emit("error", {"error": str(e)})
\ No newline at end of file
@@ -1,3 +1,5 @@
+from flask import current_app
+
 from app.extensions import mysql
 
 def get_or_create_private_conversation(user_id_1: int, user_id_2: int):
@@ -30,5 +32,8 @@ def get_or_create_private_conversation(user_id_1: int, user_id_2: int):
             (conversation_id, user_id_2),
         )
 
-        print(f"💬 Nova room privada criada: {room_name}")
+        current_app.logger.info(
+            "Nova conversa privada criada",
+            extra={"evento": "chat.conversa_criada", "conversation_id": conversation_id},
+        )
         return conversation_id, room_name
@@ -1,6 +1,8 @@
-from flask import redirect, url_for, render_template
+from flask import abort, flash, jsonify, redirect, request, url_for, render_template
 from flask_login import current_user, login_required
 from app.extensions import mysql
+from app.services import analytics_service, jobs_service, relatorios_service, series_service
+from app.utils.exportacao import FORMATOS_SUPORTADOS, resposta_exportacao, xlsx_disponivel
 from datetime import datetime, timedelta
 
 # Importa as utilidades de data em português
@@ -65,6 +67,7 @@ def _get_dashboard_stats():
         # Unidades por atividade
         cursor.execute("""
             SELECT 
+                u.id as unidade_id,
                 u.nome as unidade,
                 COUNT(p.id) as total_pedidos,
                 COUNT(CASE WHEN p.status LIKE '%AGUARDANDO%' THEN 1 END) as pendentes,
@@ -518,58 +521,121 @@ def relatorios():
     if role not in ["admin", "medico_regulador", "malote"]:
         return redirect(url_for("dashboards.home"))
     
-    with mysql.get_cursor(dictionary=True) as (_, cursor):
-        relatorios = {}
-        
-        # Relatórios existentes + novos
-        cursor.execute("""
-            SELECT 
-                DATE_FORMAT(data_solicitacao, '%Y-%m') as mes,
-                tipo_solicitacao,
-                status,
-                COUNT(*) as total,
-                AVG(TIMESTAMPDIFF(DAY, data_solicitacao, data_atualizacao)) as tempo_medio_dias
-            FROM pedidos
-            WHERE data_solicitacao >= DATE_SUB(NOW(), INTERVAL 12 MONTH)
-            GROUP BY DATE_FORMAT(data_solicitacao, '%Y-%m'), tipo_solicitacao, status
-            ORDER BY mes DESC
-        """)
-        relatorios['pedidos_periodo'] = cursor.fetchall()
-        
-        cursor.execute("""
-            SELECT 
-                u.nome as unidade,
-                COUNT(p.id) as total_pedidos,
-                AVG(DATEDIFF(p.data_atualizacao, p.data_solicitacao)) as tempo_medio_dias,
-                COUNT(CASE WHEN p.status LIKE '%AGENDADO%' THEN 1 END) as agendados,
-                COUNT(CASE WHEN p.status LIKE '%CANCELADO%' THEN 1 END) as cancelados,
-                ROUND((COUNT(CASE WHEN p.status LIKE '%AGENDADO%' THEN 1 END) / COUNT(p.id)) * 100, 1) as taxa_sucesso
-            FROM unidades_saude u
-            LEFT JOIN pedidos p ON u.id = p.unidade_id 
-                AND p.data_solicitacao >= DATE_SUB(NOW(), INTERVAL 3 MONTH)
-            WHERE u.ativo = 1
-            GROUP BY u.id, u.nome
-            ORDER BY total_pedidos DESC
-        """)
-        relatorios['performance_unidades'] = cursor.fetchall()
-        
-        cursor.execute("""
-            SELECT 
-                u.nome,
-                u.role,
-                COUNT(h.id) as acoes_realizadas,
-                MAX(u.last_seen) as ultimo_acesso,
-                COUNT(DISTINCT p.id) as pedidos_criados
-            FROM usuarios u
-            LEFT JOIN historico_pedidos h ON u.id = h.criado_por 
-                AND h.criado_em >= DATE_SUB(NOW(), INTERVAL 30 DAY)
-            LEFT JOIN pedidos p ON u.id = p.usuario_criacao
-                AND p.data_solicitacao >= DATE_SUB(NOW(), INTERVAL 30 DAY)
-            WHERE u.ativo = 1
-            GROUP BY u.id
-            ORDER BY acoes_realizadas DESC
-            LIMIT 20
-        """)
-        relatorios['usuarios_ativos'] = cursor.fetchall()
+    # O cálculo roda em segundo plano; se ainda não houver resultado em cache,
+    # a página mostra "gerando…" e consulta o status do job até concluir.
+    # Só o admin descarta o resultado em cache; para os demais, "atualizar"
+    # reaproveita o que já existe
+    try:
+        job = jobs_service.submeter(
+            "relatorios",
+            usuario_id=current_user.id,
+            forcar=request.args.get("atualizar") == "1" and role == "admin",
+        )
+    except jobs_service.FilaDeJobsCheia as exc:
+        job = {"id": None, "status": "erro", "erro": str(exc), "concluido_em": None}
+    relatorios = None
+    if job["status"] == "concluido":
+        relatorios = jobs_service.desserializar_resultado(job["resultado"])
     
-    return render_template("dashboards/relatorios.html", relatorios=relatorios, user_role=role)
\ No newline at end of file
+    return render_template(
+        "dashboards/relatorios.html",
+        relatorios=relatorios,
+        job=job,
+        analytics=analytics_service.obter_metricas(),
+        user_role=role,
+        xlsx_disponivel=xlsx_disponivel(),
+    )
+
+
+@dashboards_bp.route("/jobs/<tipo>", methods=["POST"])
+@login_required
+def submeter_job(tipo: str):
+    """Agenda um job em segundo plano e devolve seu identificador."""
+    if current_user.role not in ["admin", "medico_regulador", "malote"]:
+        abort(403)
+    if tipo not in jobs_service.tipos_registrados():
+        abort(404)
+
+    parametros = request.get_json(silent=True) or {}
+    if not isinstance(parametros, dict):
+        return jsonify({"erro": "Os parâmetros do job devem ser um objeto JSON."}), 400
+    forcar = bool(parametros.pop("forcar", False)) and current_user.role == "admin"
+    try:
+        job = jobs_service.submeter(tipo, parametros, usuario_id=current_user.id, forcar=forcar)
+    except ValueError as exc:
+        return jsonify({"erro": str(exc)}), 400
+    except jobs_service.FilaDeJobsCheia as exc:
+        resposta = jsonify({"erro": str(exc)})
+        resposta.headers["Retry-After"] = "5"
+        return resposta, 503
+    return jsonify({
+        "id": job["id"],
+        "status": job["status"],
+        "url_status": url_for("dashboards.status_job", job_id=job["id"]),
+    }), 202
+
+
+@dashboards_bp.route("/jobs/<int:job_id>")
+@login_required
+def status_job(job_id: int):
+    """Status do job; o resultado é incluído quando ?resultado=1 e o job concluiu."""
+    if current_user.role not in ["admin", "medico_regulador", "malote"]:
+        abort(403)
+
+    status = jobs_service.obter_status(job_id)
+    if not status:
+        abort(404)
+
+    if request.args.get("resultado") != "1":
+        status.pop("resultado", None)
+    return jsonify(status)
+
+
+@dashboards_bp.route("/relatorios/exportar/<secao>.<formato>")
+@login_required
+def exportar_relatorio(secao: str, formato: str):
+    """Exporta uma seção dos relatórios em CSV/XLSX, em streaming."""
+    if current_user.role not in ["admin", "medico_regulador", "malote"]:
+        abort(403)
+
+    if secao not in relatorios_service.SECOES_RELATORIO or formato not in FORMATOS_SUPORTADOS:
+        abort(404)
+
+    if formato == "xlsx" and not xlsx_disponivel():
+        flash("Exportação XLSX indisponível: instale o pacote XlsxWriter.", "warning")
+        return redirect(url_for("dashboards.relatorios"))
+
+    return resposta_exportacao(
+        relatorios_service.iterar_secao(secao),
+        relatorios_service.SECOES_RELATORIO[secao]["colunas"],
+        nome_base=f"relatorio_{secao}",
+        formato=formato,
+    )
+
+
+# ==========================================================
+# 📈 Séries do dashboard em JSON (atualização incremental)
+# ==========================================================
+@dashboards_bp.route("/api/series/<serie>")
+@login_required
+def serie_dashboard(serie: str):
+    """
+    Devolve uma série do dashboard. Com ?since=<gerado_em anterior>, apenas
+    os buckets novos ou alterados desde então são enviados.
+    """
+    if current_user.role not in ["admin", "medico_regulador", "malote"]:
+        abort(403)
+
+    calcular = series_service.SERIES.get(serie)
+    if calcular is None:
+        abort(404)
+
+    desde = None
+    since = request.args.get("since")
+    if since:
+        try:
+            desde = datetime.fromisoformat(since)
+        except ValueError:
+            return jsonify({"erro": "Parâmetro 'since' inválido (use ISO 8601)."}), 400
+
+    return jsonify(calcular(desde))
@@ -0,0 +1,30 @@
+from flask_login import current_user
+from flask_socketio import join_room, leave_room
+
+from app.extensions import socketio
+from app.services import filas_tempo_real
+
+
+@socketio.on("entrar_fila")
+def entrar_fila(data):
+    """Painéis de fila entram na sala da fila para receber os deltas."""
+    if not current_user.is_authenticated:
+        return {"ok": False}
+    data = data or {}
+    sala = filas_tempo_real.sala_permitida(
+        current_user,
+        data.get("fila"),
+        tipo=data.get("tipo"),
+        unidade_id=data.get("unidade_id"),
+    )
+    if not sala:
+        return {"ok": False}
+    join_room(sala)
+    return {"ok": True, "sala": sala}
+
+
+@socketio.on("sair_fila")
+def sair_fila(data):
+    sala = (data or {}).get("sala")
+    if sala and sala.startswith("fila:"):
+        leave_room(sala)
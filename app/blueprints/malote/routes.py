@@ -3,8 +3,10 @@ from flask_login import login_required, current_user
 
 from app.domain.status import StatusPedido
 from app.repositories import pedidos as pedidos_repo
-from app.services.pedidos_service import atualizar_status
+from app.services.pedidos_service import atualizar_status, versao_fila
 from app.utils.decorators import roles_required
+from app.utils.exportacao import FORMATOS_SUPORTADOS, resposta_exportacao, xlsx_disponivel
+from app.utils.http_cache import partes_pagina, resposta_condicional
 from . import malote_bp
 
 
@@ -17,43 +19,26 @@ def listar():
     categoria = request.args.get('categoria', '').strip()
     cpf = request.args.get('cpf', '').strip()
     nome = request.args.get('nome', '').strip()
-    
-    # Listar todos os pedidos (repository atual não aceita filtros)
-    pedidos = pedidos_repo.listar_para_malote()
-    
-    # Filtrar no Python se há parâmetros de filtro
-    if unidade or categoria or cpf or nome:
-        pedidos_filtrados = []
-        
-        for pedido in pedidos:
-            incluir = True
-            
-            # Filtro por unidade
-            if unidade and unidade.lower() not in pedido.get('unidade_nome', '').lower():
-                incluir = False
-                
-            # Filtro por categoria
-            if categoria and pedido.get('tipo_solicitacao') != categoria:
-                incluir = False
-                
-            # Filtro por CPF
-            if cpf:
-                cpf_limpo = ''.join(filter(str.isdigit, cpf))
-                pedido_cpf_limpo = ''.join(filter(str.isdigit, pedido.get('paciente_cpf', '')))
-                if cpf_limpo not in pedido_cpf_limpo:
-                    incluir = False
-                    
-            # Filtro por nome
-            if nome and nome.lower() not in pedido.get('paciente_nome', '').lower():
-                incluir = False
-                
-            if incluir:
-                pedidos_filtrados.append(pedido)
-                
-        pedidos = pedidos_filtrados
+
+    # Fila inalterada desde a última visita: 304 sem consultar a lista
+    versao = versao_fila(pedidos_repo.STATUS_FILA_MALOTE)
+    return resposta_condicional(
+        partes_pagina(versao),
+        lambda: _renderizar_lista(unidade, categoria, cpf, nome, versao),
+    )
+
+
+def _renderizar_lista(unidade: str, categoria: str, cpf: str, nome: str, versao: str):
+    # Filtros aplicados no banco (nome/CPF pelos índices de pacientes)
+    pedidos = pedidos_repo.listar_para_malote(
+        unidade=unidade or None,
+        categoria=categoria or None,
+        cpf=cpf or None,
+        nome=nome or None,
+    )
     
     # Obter lista de unidades para o dropdown
-    unidades_disponiveis = sorted(list(set(p.get('unidade_nome', '') for p in pedidos_repo.listar_para_malote() if p.get('unidade_nome'))))
+    unidades_disponiveis = pedidos_repo.listar_unidades_da_fila(pedidos_repo.STATUS_FILA_MALOTE)
     
     # Dados para o template
     template_data = {
@@ -64,12 +49,39 @@ def listar():
             'cpf': cpf,
             'nome': nome
         },
-        'unidades_disponiveis': unidades_disponiveis
+        'unidades_disponiveis': unidades_disponiveis,
+        'versao_fila': versao,
+        'xlsx_disponivel': xlsx_disponivel(),
     }
     
     return render_template("malote/list.html", **template_data)
 
 
+@malote_bp.route("/pedidos/exportar.<formato>")
+@login_required
+@roles_required("malote", "admin")
+def exportar(formato: str):
+    """Exporta a fila do malote, respeitando os filtros ativos, em CSV/XLSX."""
+    if formato not in FORMATOS_SUPORTADOS:
+        abort(404)
+
+    if formato == "xlsx" and not xlsx_disponivel():
+        flash("Exportação XLSX indisponível: instale o pacote XlsxWriter.", "warning")
+        return redirect(url_for("malote.listar", **request.args))
+
+    linhas = pedidos_repo.iterar_para_exportacao(
+        status=[
+            StatusPedido.AGUARDANDO_TRIAGEM.value,
+            StatusPedido.DEVOLVIDO_SEM_CONTATO.value,
+        ],
+        unidade_nome=request.args.get('unidade', '').strip() or None,
+        categoria=request.args.get('categoria', '').strip() or None,
+        cpf=request.args.get('cpf', '').strip() or None,
+        nome=request.args.get('nome', '').strip() or None,
+    )
+    return resposta_exportacao(linhas, pedidos_repo.COLUNAS_EXPORTACAO, "fila_malote", formato)
+
+
 @malote_bp.route("/pedidos/<int:pedido_id>/classificar", methods=["POST"])
 @login_required
 @roles_required("malote", "admin")
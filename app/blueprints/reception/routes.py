@@ -1,18 +1,22 @@
+import base64
+import os
 from datetime import date, datetime, timedelta
 from typing import Any, Dict, Optional
 
-from flask import render_template, request, redirect, url_for, flash, abort, jsonify
+from flask import Response, current_app, render_template, request, redirect, url_for, flash, abort, jsonify, stream_with_context
 from flask_login import login_required, current_user
 from urllib.parse import urlparse
 
 from app.domain.status import StatusPedido
 from app.repositories import pacientes as pacientes_repo
 from app.repositories import pedidos as pedidos_repo
-from app.repositories import exames as exames_repo
-from app.repositories import unidades as unidades_repo
-from app.repositories import consultas as consultas_repo
-from app.services.pedidos_service import atualizar_status, registrar_historico
+from app.services import acompanhamento_service, importacao_service, impressao_service, pacientes_service, pedidos_service, referencia_service
+from app.services.pedidos_service import atualizar_status
 from app.utils.decorators import roles_required
+from app.utils.exportacao import FORMATOS_SUPORTADOS, gerar_csv, resposta_exportacao, xlsx_disponivel
+from app.utils.importacao import FORMATOS_IMPORTACAO, xlsx_importacao_disponivel
+from app.utils.pdf import pdf_disponivel
+from app.utils.rate_limit import ip_cliente
 from app.services.pedidos_service import registrar_retirada_service, confirmar_entrega_service
 from . import reception_bp
 
@@ -101,7 +105,7 @@ def _coletar_dados_paciente(unidade_id: int) -> Dict[str, Any]:
     }
 
 
-def _determinar_unidade_id(unidades: list[dict]) -> Optional[int]:
+def _determinar_unidade_id() -> Optional[int]:
     """
     Determina o ID da unidade para o pedido ou paciente.
     - Usuário não-admin: usa a unidade vinculada ao usuário (se houver).
@@ -119,8 +123,7 @@ def _determinar_unidade_id(unidades: list[dict]) -> Optional[int]:
     except ValueError:
         return None
 
-    ids_validos = {unidade["id"] for unidade in unidades}
-    return unidade_id if unidade_id in ids_validos else None
+    return unidade_id if referencia_service.obter_por_id("unidades", unidade_id) else None
 
 
 # ============================================================================
@@ -130,8 +133,10 @@ def _determinar_unidade_id(unidades: list[dict]) -> Optional[int]:
 @login_required
 @roles_required("recepcao", "admin")
 def listar_pedidos():
+    incluir_arquivados = False
     if current_user.role == "admin":
-        pedidos = pedidos_repo.listar_todos() or []
+        incluir_arquivados = request.args.get("arquivados") == "1"
+        pedidos = pedidos_repo.listar_todos(incluir_arquivados=incluir_arquivados) or []
         pedidos_devolvidos = pedidos_repo.listar_devolvidos_todas_unidades() or []
     else:
         unidade_id = current_user.unidade_id
@@ -144,12 +149,98 @@ def listar_pedidos():
         pedidos_devolvidos = pedidos_repo.listar_devolvidos_por_unidade(unidade_id)
     
     return render_template(
-        "reception/list.html", 
+        "reception/list.html",
         pedidos=pedidos,
-        pedidos_devolvidos=pedidos_devolvidos
+        pedidos_devolvidos=pedidos_devolvidos,
+        incluir_arquivados=incluir_arquivados,
+        xlsx_disponivel=xlsx_disponivel(),
     )
 
 
+@reception_bp.route("/pedidos/exportar.<formato>")
+@login_required
+@roles_required("recepcao", "admin")
+def exportar_pedidos(formato: str):
+    """Exporta os pedidos da unidade (ou de todas, para admin) em CSV/XLSX."""
+    if formato not in FORMATOS_SUPORTADOS:
+        abort(404)
+
+    if formato == "xlsx" and not xlsx_disponivel():
+        flash("Exportação XLSX indisponível: instale o pacote XlsxWriter.", "warning")
+        return redirect(url_for("reception.listar_pedidos"))
+
+    unidade_id = None
+    if current_user.role != "admin":
+        unidade_id = current_user.unidade_id
+        if not unidade_id:
+            flash("Usuário de recepção sem unidade vinculada. Contate o administrador.", "danger")
+            return redirect(url_for("dashboards.home"))
+
+    linhas = pedidos_repo.iterar_para_exportacao(
+        unidade_id=unidade_id,
+        status=request.args.getlist("status") or None,
+    )
+    return resposta_exportacao(linhas, pedidos_repo.COLUNAS_EXPORTACAO, "pedidos_recepcao", formato)
+
+
+# ============================================================================
+# ROTA: IMPORTAR PEDIDOS DE PLANILHA (CSV/XLSX)
+# ============================================================================
+# Linhas de erro mostradas na tela; o relatório completo vai no CSV
+ERROS_EXIBIDOS_IMPORTACAO = 200
+
+
+@reception_bp.route("/pedidos/importar", methods=["GET", "POST"])
+@login_required
+@roles_required("recepcao", "admin")
+def importar_pedidos():
+    if current_user.role == "recepcao" and not current_user.unidade_id:
+        flash("Usuário de recepção sem unidade vinculada. Contate o administrador.", "danger")
+        return redirect(url_for("dashboards.home"))
+
+    contexto = {
+        "unidades": referencia_service.listar("unidades"),
+        "unidade_atual": current_user.unidade_id if current_user.role != "admin" else None,
+        "xlsx_disponivel": xlsx_importacao_disponivel(),
+        "resultado": None,
+    }
+    if request.method == "GET":
+        return render_template("reception/importar.html", **contexto)
+
+    arquivo = request.files.get("arquivo")
+    formato = os.path.splitext(arquivo.filename or "")[1].lower().lstrip(".") if arquivo else ""
+    if formato not in FORMATOS_IMPORTACAO:
+        flash("Envie um arquivo .csv ou .xlsx.", "danger")
+        return render_template("reception/importar.html", **contexto)
+    if formato == "xlsx" and not contexto["xlsx_disponivel"]:
+        flash("Importação XLSX indisponível: instale o pacote openpyxl ou envie CSV.", "warning")
+        return render_template("reception/importar.html", **contexto)
+
+    unidade_padrao = None
+    if current_user.role == "admin":
+        unidade_padrao = _determinar_unidade_id()
+
+    try:
+        resultado = importacao_service.importar_pedidos(
+            arquivo.stream,
+            formato,
+            usuario_id=current_user.id,
+            unidade_fixa=contexto["unidade_atual"],
+            unidade_padrao=unidade_padrao,
+            simular=bool(request.form.get("simular")),
+        )
+    except ValueError as erro:
+        flash(str(erro), "danger")
+        return render_template("reception/importar.html", **contexto)
+
+    if resultado["erros"]:
+        relatorio = b"".join(gerar_csv(resultado["erros"], importacao_service.COLUNAS_RELATORIO))
+        contexto["relatorio_erros"] = base64.b64encode(relatorio).decode("ascii")
+    contexto["resultado"] = resultado
+    contexto["erros_exibidos"] = resultado["erros"][:ERROS_EXIBIDOS_IMPORTACAO]
+    return render_template("reception/importar.html", **contexto)
+
+
 # ============================================================================
 # ROTA: NOVO PEDIDO - ADMIN PODE ESCOLHER UNIDADE
 # ============================================================================
@@ -161,13 +252,13 @@ def novo_pedido():
         flash("Usuário de recepção sem unidade vinculada. Contate o administrador.", "danger")
         return redirect(url_for("dashboards.home"))
     
-    exames = exames_repo.listar_exames()
-    consultas = consultas_repo.listar_ativas()
-    unidades = unidades_repo.listar_unidades_ativas()
+    exames = referencia_service.listar("exames")
+    consultas = referencia_service.listar("consultas")
+    unidades = referencia_service.listar("unidades")
     dados_form = dict(request.form) if request.method == "POST" else {}
 
     if request.method == "POST":
-        unidade_id = _determinar_unidade_id(unidades)
+        unidade_id = _determinar_unidade_id()
         
         if unidade_id is None:
             mensagem = "Selecione a unidade do pedido." if current_user.role == "admin" else \
@@ -200,8 +291,7 @@ def novo_pedido():
                 except ValueError:
                     erros.append("Exame inválido selecionado.")
                 else:
-                    ids_exames_validos = {exame["id"] for exame in exames}
-                    if exame_id not in ids_exames_validos:
+                    if referencia_service.obter_por_id("exames", exame_id) is None:
                         erros.append("Exame solicitado não está disponível.")
 
         elif tipo_solicitacao == "consulta":
@@ -214,8 +304,7 @@ def novo_pedido():
                 except ValueError:
                     erros.append("Consulta inválida selecionada.")
                 else:
-                    ids_consultas_validos = {c["id"] for c in consultas}
-                    if consulta_id not in ids_consultas_validos:
+                    if referencia_service.obter_por_id("consultas", consulta_id) is None:
                         erros.append("Consulta solicitada não está disponível.")
 
         if not paciente_data["nome"]:
@@ -237,39 +326,17 @@ def novo_pedido():
                 dados_form=dados_form,
             )
 
-        paciente_existente = pacientes_repo.obter_por_cpf(paciente_data["cpf"])
-        if paciente_existente:
-            pacientes_repo.atualizar_paciente(paciente_existente["id"], paciente_data)
-            paciente_id = paciente_existente["id"]
-        else:
-            paciente_id = pacientes_repo.criar_paciente(paciente_data)
-
-        if tipo_solicitacao == "exame":
-            dados_pedido = {
-                "paciente_id": paciente_id,
+        # Paciente (criado ou atualizado pelo CPF), pedido e histórico numa transação
+        pedidos_service.criar_pedido_completo(
+            paciente_data,
+            {
                 "exame_id": exame_id,
-                "consulta_id": None,
-                "unidade_id": unidade_id,
-                "usuario_criacao": current_user.id,
-                "observacoes": observacoes,
-            }
-        else:
-            dados_pedido = {
-                "paciente_id": paciente_id,
-                "exame_id": None,
                 "consulta_id": consulta_id,
                 "unidade_id": unidade_id,
-                "usuario_criacao": current_user.id,
                 "observacoes": observacoes,
-            }
-
-        pedido_id = pedidos_repo.criar_pedido(dados_pedido)
-
-        registrar_historico(
-            pedido_id=pedido_id,
-            status=StatusPedido.AGUARDANDO_TRIAGEM,
-            descricao=f"Pedido de {tipo_solicitacao} criado pela {current_user.role}.",
+            },
             usuario_id=current_user.id,
+            descricao=f"Pedido de {tipo_solicitacao} criado pela {current_user.role}.",
         )
         flash(f"Pedido de {tipo_solicitacao} criado e enviado para triagem.", "success")
         return redirect(url_for("reception.listar_pedidos"))
@@ -284,11 +351,32 @@ def novo_pedido():
     )
 
 
+@reception_bp.route("/pacientes/buscar")
+@login_required
+@roles_required("recepcao", "admin")
+def buscar_pacientes():
+    """Autocomplete do formulário: pacientes por prefixo de CPF ou trecho do nome."""
+    termo = (request.args.get("q") or "").strip()
+    if len(termo) < 3:
+        return jsonify([])
+
+    pacientes = pacientes_service.buscar_para_autocomplete(termo)
+    return jsonify([
+        {
+            **paciente,
+            "data_nascimento": paciente["data_nascimento"].isoformat() if paciente["data_nascimento"] else None,
+        }
+        for paciente in pacientes
+    ])
+
+
 @reception_bp.route("/pedidos/<int:pedido_id>")
 @login_required
 @roles_required("recepcao", "recepcao_regulacao", "admin")
 def detalhes_pedido(pedido_id: int):
-    pedido = pedidos_repo.obter_por_id(pedido_id)
+    # Pedidos arquivados só são consultados quando o admin pede explicitamente
+    incluir_arquivados = current_user.role == "admin" and request.args.get("arquivados") == "1"
+    pedido = pedidos_repo.obter_por_id(pedido_id, incluir_arquivados=incluir_arquivados)
     if not pedido:
         abort(404)
 
@@ -301,7 +389,7 @@ def detalhes_pedido(pedido_id: int):
             abort(403)
 
     pedido["horario_exame"] = _to_time(pedido.get("horario_exame"))
-    historico = pedidos_repo.obter_historico(pedido_id)
+    historico = pedidos_repo.obter_historico(pedido_id, incluir_arquivados=bool(pedido.get("arquivado")))
     
     return render_template(
         "reception/detalhe.html", 
@@ -355,28 +443,8 @@ def tratar_devolucao(pedido_id: int):
             flash("Descreva a tratativa realizada.", "danger")
             return redirect(url_for("reception.tratar_devolucao", pedido_id=pedido_id))
 
-        registrar_historico(
-            pedido_id=pedido_id,
-            status=StatusPedido.DEVOLVIDO_PELO_MEDICO,
-            descricao=f"Tratativa da {current_user.role}: {tratativa}",
-            usuario_id=current_user.id,
-        )
-        pedidos_repo.atualizar_campos(
-            pedido_id,
-            {
-                "status": StatusPedido.AGUARDANDO_TRIAGEM.value,
-                "tipo_regulacao": None,
-                "prioridade": None,
-                "pendente_recepcao": 0,
-                "motivo_devolucao": None,
-                "usuario_atualizacao": current_user.id,
-            },
-        )
-        registrar_historico(
-            pedido_id=pedido_id,
-            status=StatusPedido.AGUARDANDO_TRIAGEM,
-            descricao="Pedido reenviado à triagem após tratativa.",
-            usuario_id=current_user.id,
+        pedidos_service.reenviar_para_triagem(
+            pedido_id, f"Tratativa da {current_user.role}: {tratativa}", current_user.id
         )
         flash("Tratativa registrada e pedido reenviado ao malote.", "success")
         return redirect(url_for("reception.listar_pedidos"))
@@ -397,7 +465,7 @@ def editar_paciente(paciente_id: int):
     if current_user.role == "recepcao" and paciente["unidade_id"] != current_user.unidade_id:
         abort(403)
 
-    unidades = unidades_repo.listar_unidades_ativas() if current_user.role == "admin" else []
+    unidades = referencia_service.listar("unidades") if current_user.role == "admin" else []
     dados_form = request.form.to_dict() if request.method == "POST" else {}
     raw_next = request.args.get("next") or request.form.get("next")
     next_url = url_for("reception.listar_pedidos")
@@ -411,7 +479,7 @@ def editar_paciente(paciente_id: int):
     if request.method == "POST":
         unidade_id = paciente["unidade_id"]
         if current_user.role == "admin":
-            unidade_selecionada = _determinar_unidade_id(unidades)
+            unidade_selecionada = _determinar_unidade_id()
             if unidade_selecionada is None:
                 flash("Selecione a unidade do paciente.", "danger")
                 return render_template(
@@ -446,7 +514,7 @@ def editar_paciente(paciente_id: int):
             )
 
         paciente_payload["unidade_id"] = unidade_id
-        pacientes_repo.atualizar_paciente(paciente_id, paciente_payload)
+        pacientes_service.atualizar_paciente(paciente_id, paciente_payload)
         flash("Dados do paciente atualizados com sucesso.", "success")
         return redirect(next_url)
 
@@ -465,30 +533,39 @@ def acompanhar_pedido():
     """Consulta pública para acompanhamento de pedidos por CPF"""
     pedidos_paciente = []
     cpf_consulta = None
+    incluir_arquivados = False
     
     if request.method == "POST":
         cpf_consulta = (request.form.get("cpf") or "").strip()
+        incluir_arquivados = request.form.get("incluir_arquivados") == "1"
         
+        # Página pública: limite por IP antes de qualquer consulta ao banco
+        espera = acompanhamento_service.limite_atingido(ip_cliente())
+        if espera is not None:
+            flash(f"Muitas consultas em sequência. Aguarde {espera} segundos e tente novamente.", "danger")
+            return render_template(
+                "reception/acompanhamento.html",
+                pedidos=[],
+                cpf_consulta=cpf_consulta,
+                incluir_arquivados=incluir_arquivados,
+            ), 429, {"Retry-After": str(espera)}
+
         if not cpf_consulta:
             flash("Informe o CPF para consulta.", "warning")
         elif len(cpf_consulta) != 11 or not cpf_consulta.isdigit():
             flash("CPF deve conter exatamente 11 dígitos.", "danger")
         else:
-            paciente = pacientes_repo.obter_por_cpf(cpf_consulta)
-            
-            if not paciente:
+            # Resposta em cache por CPF, descartada quando os pedidos do paciente mudam
+            pedidos_paciente = acompanhamento_service.consultar(cpf_consulta, incluir_arquivados)
+            if pedidos_paciente is None:
+                pedidos_paciente = []
                 flash("Nenhum pedido encontrado para este CPF.", "info")
-            else:
-                pedidos_paciente = pedidos_repo.listar_por_paciente(paciente["id"])
-                
-                for pedido in pedidos_paciente:
-                    pedido["historico"] = pedidos_repo.obter_historico(pedido["id"])
-                    pedido["horario_exame"] = _to_time(pedido.get("horario_exame"))
     
     return render_template(
         "reception/acompanhamento.html", 
         pedidos=pedidos_paciente,
-        cpf_consulta=cpf_consulta
+        cpf_consulta=cpf_consulta,
+        incluir_arquivados=incluir_arquivados,
     )
 
 
@@ -508,37 +585,19 @@ def regulacao():
     unidade = request.args.get("unidade", "").strip()
     categoria = request.args.get("categoria", "").strip()
     
-    # Buscar todos os pedidos inicialmente
-    pedidos = pedidos_repo.listar_todos() or []
-    
-    # Se não há filtros, mostrar apenas pedidos agendados
-    if not (cpf or nome or unidade or categoria):
-        pedidos = [p for p in pedidos if 'AGENDADO' in p.get('status', '').upper() or 'CONFIRMADO' in p.get('status', '').upper()]
-    
-    # Aplicar filtros específicos
-    if cpf:
-        cpf_clean = cpf.replace(".", "").replace("-", "")
-        pedidos = [p for p in pedidos if (p.get("paciente_cpf") or "").replace(".", "").replace("-", "") == cpf_clean]
-        filtros["cpf"] = cpf
-    
-    if nome:
-        pedidos = [p for p in pedidos if nome.lower() in (p.get("paciente_nome") or "").lower()]
-        filtros["nome"] = nome
-    
-    if unidade:
-        pedidos = [p for p in pedidos if p.get("unidade_nome") == unidade]
-        filtros["unidade"] = unidade
-    
-    if categoria:
-        if categoria == "exame":
-            pedidos = [p for p in pedidos if p.get("tipo_solicitacao") == "exame"]
-        elif categoria == "consulta":
-            pedidos = [p for p in pedidos if p.get("tipo_solicitacao") == "consulta"]
-        filtros["categoria"] = categoria
+    # Filtros aplicados no banco; sem filtros, apenas pedidos com agendamento confirmado
+    pedidos = pedidos_repo.listar_para_regulacao(
+        unidade=unidade or None,
+        categoria=categoria or None,
+        cpf=cpf.replace(".", "").replace("-", "") or None,
+        nome=nome or None,
+    )
+    for chave, valor in (("cpf", cpf), ("nome", nome), ("unidade", unidade), ("categoria", categoria)):
+        if valor:
+            filtros[chave] = valor
     
     # Unidades para dropdown
-    todos_pedidos = pedidos_repo.listar_todos() or []
-    unidades_disponiveis = sorted(set(p.get("unidade_nome") for p in todos_pedidos if p.get("unidade_nome")))
+    unidades_disponiveis = [u["nome"] for u in referencia_service.listar("unidades")]
     
     return render_template(
         "reception/regulacao.html",
@@ -553,6 +612,7 @@ def regulacao():
 @roles_required("recepcao_regulacao", "admin")
 def folha_impressao(pedido_id: int):
     """Página imprimível com todos os dados do paciente e do pedido."""
+    # obter_por_id já traz paciente, exame/consulta e unidade (uma consulta só)
     pedido = pedidos_repo.obter_por_id(pedido_id)
     if not pedido:
         abort(404)
@@ -560,30 +620,44 @@ def folha_impressao(pedido_id: int):
     if current_user.role == "recepcao" and pedido.get("unidade_id") != current_user.unidade_id:
         abort(403)
 
-    paciente = pacientes_repo.obter_por_id(pedido.get("paciente_id")) or {}
-    exame = None
-    consulta = None
-    if pedido.get("exame_id"):
-        exame = exames_repo.obter_por_id(pedido.get("exame_id"))
-    if pedido.get("consulta_id"):
-        consulta = consultas_repo.obter_por_id(pedido.get("consulta_id"))
+    pedido["horario_exame"] = _to_time(pedido.get("horario_exame"))
+    return render_template("reception/folhaImpressao.html", pedido=pedido)
 
-    unidade = None
-    if pedido.get("unidade_id"):
-        unidade = unidades_repo.obter_por_id(pedido.get("unidade_id"))
 
-    pedido["horario_exame"] = _to_time(pedido.get("horario_exame"))
-    historico = pedidos_repo.obter_historico(pedido_id)
+@reception_bp.route("/pedidos/folhas")
+@login_required
+@roles_required("recepcao_regulacao", "admin")
+def folhas_impressao():
+    """
+    Folhas de vários pedidos (?ids=1&ids=2 ou ?ids=1,2) num único PDF; sem
+    WeasyPrint instalado (ou com formato=html), numa página só para o navegador.
+    """
+    pedido_ids = []
+    for valor in request.args.getlist("ids"):
+        pedido_ids.extend(int(parte) for parte in valor.split(",") if parte.strip().isdigit())
+    if not pedido_ids:
+        flash("Selecione ao menos um pedido para imprimir.", "warning")
+        return redirect(url_for("reception.regulacao"))
+
+    limite = current_app.config["IMPRESSAO_MAX_PEDIDOS"]
+    if len(pedido_ids) > limite:
+        flash(f"Imprima no máximo {limite} pedidos por vez.", "warning")
+        return redirect(url_for("reception.regulacao"))
+
+    pedidos = impressao_service.carregar_folhas(pedido_ids)
+    if not pedidos:
+        abort(404)
 
-    return render_template(
-        "reception/folhaImpressao.html",
-        pedido=pedido,
-        paciente=paciente,
-        exame=exame,
-        consulta=consulta,
-        unidade=unidade,
-        historico=historico,
-    )
+    formato = request.args.get("formato", "pdf")
+    if formato != "pdf" or not pdf_disponivel():
+        return impressao_service.renderizar_html(pedidos, pdf_indisponivel=formato == "pdf")
+
+    corpo = impressao_service.gerar_pdf_folhas(pedidos)
+    resposta = Response(stream_with_context(corpo), mimetype="application/pdf")
+    nome_arquivo = f"folhas_{datetime.now():%Y%m%d_%H%M}.pdf"
+    resposta.headers["Content-Disposition"] = f'inline; filename="{nome_arquivo}"'
+    resposta.headers["X-Accel-Buffering"] = "no"
+    return resposta
 
 # Rota para registrar retirada (chamada antes da impressão)
 @reception_bp.route("/pedido/<int:pedido_id>/registrar-retirada", methods=["POST"])
@@ -1,10 +1,13 @@
-from flask import render_template, request, redirect, url_for, flash, abort, session
+from flask import render_template, request, redirect, url_for, flash, abort, session, jsonify
 from flask_login import login_required, current_user
 
 from app.domain.status import StatusPedido
 from app.repositories import pedidos as pedidos_repo
-from app.services.pedidos_service import atualizar_status
+from app.services import reservas_service
+from app.services.pedidos_service import atualizar_status, versao_fila
 from app.utils.decorators import roles_required
+from app.utils.exportacao import FORMATOS_SUPORTADOS, resposta_exportacao, xlsx_disponivel
+from app.utils.http_cache import partes_pagina, resposta_condicional
 from . import regulator_bp
 
 
@@ -45,44 +48,29 @@ def painel():
     categoria = request.args.get('categoria', '').strip()
     cpf = request.args.get('cpf', '').strip()
     nome = request.args.get('nome', '').strip()
-    
-    # Buscar pedidos do tipo especificado
-    pedidos = pedidos_repo.listar_para_medico(tipo)
-    
-    # Filtrar pedidos se houver parâmetros
-    if unidade or categoria or cpf or nome:
-        pedidos_filtrados = []
-        
-        for pedido in pedidos:
-            incluir = True
-            
-            # Filtro por unidade
-            if unidade and unidade.lower() not in pedido.get('unidade_nome', '').lower():
-                incluir = False
-                
-            # Filtro por categoria (tipo_solicitacao)
-            if categoria and pedido.get('tipo_solicitacao') != categoria:
-                incluir = False
-                
-            # Filtro por CPF
-            if cpf:
-                cpf_limpo = ''.join(filter(str.isdigit, cpf))
-                pedido_cpf_limpo = ''.join(filter(str.isdigit, pedido.get('paciente_cpf', '')))
-                if cpf_limpo not in pedido_cpf_limpo:
-                    incluir = False
-                    
-            # Filtro por nome
-            if nome and nome.lower() not in pedido.get('paciente_nome', '').lower():
-                incluir = False
-                
-            if incluir:
-                pedidos_filtrados.append(pedido)
-                
-        pedidos = pedidos_filtrados
+
+    # Fila inalterada desde a última visita: 304 sem consultar a lista.
+    # As reservas entram na ETag, mas não no cache das linhas (são marcadas via JS)
+    versao = versao_fila([pedidos_repo.status_fila_medico(tipo)], tipo)
+    reservas = reservas_service.ativas(tipo)
+    return resposta_condicional(
+        partes_pagina((versao, tipo, reservas)),
+        lambda: _renderizar_painel(tipo, unidade, categoria, cpf, nome, versao, reservas),
+    )
+
+
+def _renderizar_painel(tipo: str, unidade: str, categoria: str, cpf: str, nome: str, versao: str, reservas: list):
+    # Buscar pedidos do tipo especificado, já filtrados no banco
+    pedidos = pedidos_repo.listar_para_medico(
+        tipo,
+        unidade=unidade or None,
+        categoria=categoria or None,
+        cpf=cpf or None,
+        nome=nome or None,
+    )
     
     # Obter lista de unidades para o dropdown (apenas do tipo atual)
-    todos_pedidos_tipo = pedidos_repo.listar_para_medico(tipo)
-    unidades_disponiveis = sorted(list(set(p.get('unidade_nome', '') for p in todos_pedidos_tipo if p.get('unidade_nome'))))
+    unidades_disponiveis = pedidos_repo.listar_unidades_da_fila([pedidos_repo.status_fila_medico(tipo)])
     
     # Preparar dados para o template
     return render_template(
@@ -96,10 +84,99 @@ def painel():
             'cpf': cpf,
             'nome': nome
         },
-        unidades_disponiveis=unidades_disponiveis
+        unidades_disponiveis=unidades_disponiveis,
+        versao_fila=versao,
+        reservas=reservas,
+        reserva_segundos=reservas_service.duracao_segundos("regulador"),
+        xlsx_disponivel=xlsx_disponivel(),
     )
 
 
+# ==========================================================
+# 🔒 Reserva do próximo pedido (lease com heartbeat)
+# ==========================================================
+@regulator_bp.route("/fila/<tipo>/proximo", methods=["POST"])
+@login_required
+@roles_required("medico_regulador", "malote", "admin")
+def reservar_proximo(tipo: str):
+    """Reserva o próximo pedido livre da fila para o usuário atual."""
+    if tipo not in ("municipal", "estadual"):
+        abort(404)
+    reserva = reservas_service.reservar_proximo(tipo, current_user.id)
+    if reserva is None:
+        return jsonify({"success": False, "error": "Nenhum pedido livre nesta fila."}), 404
+    return jsonify({
+        "success": True,
+        "reserva": reservas_service.serializar(reserva),
+        "duracao_segundos": reservas_service.duracao_segundos("regulador"),
+    })
+
+
+@regulator_bp.route("/reservas/<int:pedido_id>/renovar", methods=["POST"])
+@login_required
+@roles_required("medico_regulador", "malote", "admin")
+def renovar_reserva(pedido_id: int):
+    reserva = reservas_service.renovar(pedido_id, current_user.id)
+    if reserva is None:
+        return jsonify({"success": False, "error": "Reserva expirada ou de outro usuário."}), 409
+    return jsonify({"success": True, "reserva": reservas_service.serializar(reserva)})
+
+
+@regulator_bp.route("/reservas/<int:pedido_id>/liberar", methods=["POST"])
+@login_required
+@roles_required("medico_regulador", "malote", "admin")
+def liberar_reserva(pedido_id: int):
+    return jsonify({"success": reservas_service.liberar(pedido_id, current_user.id)})
+
+
+def _reservado_por_outro(pedido_id: int) -> bool:
+    """Impede que dois reguladores tratem o mesmo pedido ao mesmo tempo."""
+    reserva = reservas_service.reservado_por_outro(pedido_id, current_user.id)
+    if reserva:
+        flash(f"Pedido #{pedido_id} está em análise por {reserva['usuario_nome']}.", "warning")
+        return True
+    return False
+
+
+def _url_painel(tipo_regulacao: str, filtros_ativos: dict) -> str:
+    params = [f"tipo={tipo_regulacao}"]
+    for key, value in filtros_ativos.items():
+        if value:
+            params.append(f"{key}={value}")
+    return url_for("regulator.painel") + "?" + "&".join(params)
+
+
+@regulator_bp.route("/painel/exportar.<formato>")
+@login_required
+@roles_required("medico_regulador", "malote", "admin")
+def exportar(formato: str):
+    """Exporta a fila do médico regulador (tipo e filtros ativos) em CSV/XLSX."""
+    if formato not in FORMATOS_SUPORTADOS:
+        abort(404)
+
+    tipo = request.args.get("tipo") or session.get('tipo_regulacao_preferido', 'municipal')
+    if tipo not in ["municipal", "estadual"]:
+        abort(404)
+
+    if formato == "xlsx" and not xlsx_disponivel():
+        flash("Exportação XLSX indisponível: instale o pacote XlsxWriter.", "warning")
+        return redirect(url_for("regulator.painel", **request.args))
+
+    status_esperado = (
+        StatusPedido.AGUARDANDO_ANALISE_MEDICO_MUNICIPAL.value
+        if tipo == "municipal"
+        else StatusPedido.AGUARDANDO_ANALISE_MEDICO_ESTADUAL.value
+    )
+    linhas = pedidos_repo.iterar_para_exportacao(
+        status=[status_esperado],
+        unidade_nome=request.args.get('unidade', '').strip() or None,
+        categoria=request.args.get('categoria', '').strip() or None,
+        cpf=request.args.get('cpf', '').strip() or None,
+        nome=request.args.get('nome', '').strip() or None,
+    )
+    return resposta_exportacao(linhas, pedidos_repo.COLUNAS_EXPORTACAO, f"fila_regulador_{tipo}", formato)
+
+
 @regulator_bp.route("/pedidos/<int:pedido_id>/aprovar", methods=["POST"])
 @login_required
 @roles_required("medico_regulador", "malote", "admin")
@@ -117,6 +194,9 @@ def aprovar(pedido_id: int):
     if tipo_regulacao not in ("municipal", "estadual"):
         abort(400)
 
+    if _reservado_por_outro(pedido_id):
+        return redirect(_url_painel(tipo_regulacao, filtros_ativos))
+
     status_destino = (
         StatusPedido.APROVADO_MUNICIPAL if tipo_regulacao == "municipal" else StatusPedido.APROVADO_ESTADUAL
     )
@@ -161,6 +241,9 @@ def cancelar(pedido_id: int):
         'nome': request.form.get('filtro_nome', '')
     }
     
+    if _reservado_por_outro(pedido_id):
+        return redirect(_url_painel(tipo_regulacao, filtros_ativos))
+
     if not motivos_checkbox and not motivo_obs:
         flash("Selecione pelo menos um motivo ou adicione observações.", "danger")
         # Redirecionar mantendo filtros
@@ -218,6 +301,9 @@ def devolver(pedido_id: int):
         'nome': request.form.get('filtro_nome', '')
     }
     
+    if _reservado_por_outro(pedido_id):
+        return redirect(_url_painel(tipo_regulacao, filtros_ativos))
+
     if not motivos_checkbox and not motivo_obs:
         flash("Selecione pelo menos um motivo ou adicione observações.", "danger")
         # Redirecionar mantendo filtros
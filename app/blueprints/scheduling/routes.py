@@ -1,10 +1,15 @@
 from datetime import datetime
-from flask import render_template, request, redirect, url_for, flash, abort
+from flask import render_template, request, redirect, url_for, flash, abort, jsonify
 from flask_login import login_required, current_user
 
+from app.domain.status import StatusPedido
 from app.repositories import pedidos as pedidos_repo
+from app.services import agendamento_service, reservas_service
 from app.services.agendamento_service import registrar_tentativa
+from app.services.pedidos_service import versao_fila
 from app.utils.decorators import roles_required
+from app.utils.exportacao import FORMATOS_SUPORTADOS, resposta_exportacao, xlsx_disponivel
+from app.utils.http_cache import partes_pagina, resposta_condicional
 from . import scheduling_bp
 
 
@@ -23,6 +28,18 @@ def lista(tipo: str):
     if current_user.role not in (papel_necessario, "admin"):
         abort(403)
 
+    # Fila inalterada desde a última visita: 304 sem consultar a lista
+    versao = versao_fila(
+        [
+            StatusPedido.APROVADO_MUNICIPAL.value if tipo == "municipal" else StatusPedido.APROVADO_ESTADUAL.value,
+            StatusPedido.AGENDAMENTO_EM_ANDAMENTO.value,
+        ],
+        tipo,
+    )
+    return resposta_condicional(partes_pagina(versao), lambda: _renderizar_lista(tipo, versao))
+
+
+def _renderizar_lista(tipo: str, versao: str):
     # Filtros
     ano = request.args.get("ano", type=int)
     mes = request.args.get("mes", type=int)
@@ -31,89 +48,31 @@ def lista(tipo: str):
     exame_q = request.args.get("exame", type=str)
     cpf = request.args.get("cpf", type=str)
 
-    # Buscar todos os pedidos do tipo
+    # Buscar pedidos do tipo, com todos os filtros aplicados no banco
     pedidos = pedidos_repo.listar_para_agendador(
         tipo,
         ano=ano,
         mes=mes,
-        prioridade=prioridade
+        prioridade=prioridade,
+        nome=nome,
+        cpf=cpf,
+        exame=exame_q,
     )
 
-    # Filtrar por nome/cpf se fornecidos
-    if nome or cpf:
-        pedidos_filtrados = []
-        nome_lower = nome.lower() if nome else None
-        cpf_digits = ''.join(filter(str.isdigit, cpf)) if cpf else None
-        for p in pedidos:
-            incluir = True
-            if nome_lower:
-                paciente_nome = (p.get('paciente_nome') or '').lower()
-                if nome_lower not in paciente_nome:
-                    incluir = False
-            if cpf_digits and incluir:
-                pedido_cpf = ''.join(filter(str.isdigit, (p.get('paciente_cpf') or '')))
-                if cpf_digits not in pedido_cpf:
-                    incluir = False
-            if incluir:
-                pedidos_filtrados.append(p)
-        pedidos = pedidos_filtrados
-
-    # Filtrar por nome do exame se fornecido (filtro adicional)
-    if exame_q:
-        exame_lower = exame_q.lower()
-        pedidos = [p for p in pedidos if exame_lower in ((p.get('exame_nome') or p.get('nome_solicitacao') or '').lower())]
-
-    
     # 🔥 SEPARAÇÃO FINAL
     exames = [p for p in pedidos if p.get("exame_id")]
     consultas = [p for p in pedidos if p.get("consulta_id")]
 
-    # Agrupar exames por nome e por mês/ano, contando prioridades (P1/P2)
-    dados = {}
-    for p in exames:
-        exame_nome = p.get('exame_nome') or p.get('nome_solicitacao') or 'Sem Exame'
-        data_solicitacao = p.get('data_solicitacao')
-
-        # normalizar label mês/ano (MM/YYYY)
-        mes_label = 'Sem data'
-        if data_solicitacao:
-            try:
-                # pode ser date/datetime ou string 'YYYY-MM-DD'
-                if hasattr(data_solicitacao, 'month') and hasattr(data_solicitacao, 'year'):
-                    mes_label = f"{data_solicitacao.month:02d}/{data_solicitacao.year}"
-                else:
-                    parts = str(data_solicitacao).split('-')
-                    if len(parts) >= 2:
-                        mes_label = f"{int(parts[1]):02d}/{parts[0]}"
-                    else:
-                        mes_label = str(data_solicitacao)
-            except Exception:
-                mes_label = str(data_solicitacao)
-
-        dados.setdefault(exame_nome, {})
-        dados[exame_nome].setdefault(mes_label, {'P1': 0, 'P2': 0})
-        prioridade_pedido = (p.get('prioridade') or '').upper()
-        if prioridade_pedido == 'P1':
-            dados[exame_nome][mes_label]['P1'] += 1
-        elif prioridade_pedido == 'P2':
-            dados[exame_nome][mes_label]['P2'] += 1
-
-    # Gerar lista ordenada de meses (MM/YYYY) do menor ano/mês para o maior
-    meses_set = set()
-    for exame_nome, meses_map in dados.items():
-        for mes_label in meses_map.keys():
-            meses_set.add(mes_label)
-
-    def _parse_label(label: str):
-        try:
-            if '/' in label:
-                m, y = label.split('/')
-                return int(y), int(m)
-        except Exception:
-            pass
-        return (9999, 99)
-
-    meses_ordenados = sorted(list(meses_set), key=lambda l: _parse_label(l))
+    # Pivô exame × mês × prioridade agregado no banco (com cache por filtros)
+    dados, meses_ordenados = agendamento_service.pivo_exames_por_mes(
+        tipo,
+        ano=ano,
+        mes=mes,
+        prioridade=prioridade,
+        nome=nome,
+        cpf=cpf,
+        exame=exame_q,
+    )
 
     # Anos / meses
     ano_atual = datetime.now().year
@@ -204,6 +163,7 @@ def lista(tipo: str):
         nome_selecionado=nome,
         cpf_selecionado=cpf,
         tipo_agendador=current_user.tipo_agendador,
+        xlsx_disponivel=xlsx_disponivel(),
 
         # Paginação de EXAMES
         page_exames=page_exames,
@@ -215,10 +175,46 @@ def lista(tipo: str):
 
         # Função de geração de URLs
         make_page_url=make_page_url,
+
+        # Versão da fila para o cache dos cartões (partials)
+        versao_fila=versao,
     )
 
 
 
+# ==========================================================
+# 📤 Exportar fila de agendamento (CSV/XLSX)
+# ==========================================================
+@scheduling_bp.route("/<tipo>/exportar.<formato>")
+@login_required
+def exportar(tipo: str, formato: str):
+    if tipo not in ("municipal", "estadual") or formato not in FORMATOS_SUPORTADOS:
+        abort(404)
+
+    papel_necessario = "agendador_municipal" if tipo == "municipal" else "agendador_estadual"
+    if current_user.role not in (papel_necessario, "admin"):
+        abort(403)
+
+    if formato == "xlsx" and not xlsx_disponivel():
+        flash("Exportação XLSX indisponível: instale o pacote XlsxWriter.", "warning")
+        return redirect(url_for("scheduling.lista", tipo=tipo, **request.args))
+
+    status_aprovado = (
+        StatusPedido.APROVADO_MUNICIPAL.value
+        if tipo == "municipal"
+        else StatusPedido.APROVADO_ESTADUAL.value
+    )
+    linhas = pedidos_repo.iterar_para_exportacao(
+        status=[status_aprovado, StatusPedido.AGENDAMENTO_EM_ANDAMENTO.value],
+        tipo_regulacao=tipo,
+        ano=request.args.get("ano", type=int),
+        mes=request.args.get("mes", type=int),
+        prioridade=request.args.get("prioridade", type=str) or None,
+        nome=request.args.get("nome", type=str) or None,
+        cpf=request.args.get("cpf", type=str) or None,
+        exame=request.args.get("exame", type=str) or None,
+    )
+    return resposta_exportacao(linhas, pedidos_repo.COLUNAS_EXPORTACAO, f"fila_agendamento_{tipo}", formato)
 
 
 # ==========================================================
@@ -279,3 +275,45 @@ def registrar(tipo: str, pedido_id: int):
         flash(str(exc), "danger")
 
     return redirect(url_for("scheduling.lista", tipo=tipo))
+
+
+# ==========================================================
+# 📞 Fila de ligações (próximo paciente, com reserva e heartbeat)
+# ==========================================================
+def _exigir_agendador(tipo: str):
+    if tipo not in ("municipal", "estadual"):
+        abort(404)
+    papel_necessario = "agendador_municipal" if tipo == "municipal" else "agendador_estadual"
+    if current_user.role not in (papel_necessario, "admin"):
+        abort(403)
+
+
+@scheduling_bp.route("/<tipo>/ligacoes/proxima", methods=["POST"])
+@login_required
+def proxima_ligacao(tipo: str):
+    _exigir_agendador(tipo)
+    ligacao = agendamento_service.proxima_ligacao(tipo, current_user.id)
+    if ligacao is None:
+        return jsonify({"success": False, "error": "Nenhum paciente liberado para ligação agora."}), 404
+    return jsonify({
+        "success": True,
+        **ligacao,
+        "duracao_segundos": reservas_service.duracao_segundos("agendador"),
+    })
+
+
+@scheduling_bp.route("/<tipo>/ligacoes/<int:pedido_id>/renovar", methods=["POST"])
+@login_required
+def renovar_ligacao(tipo: str, pedido_id: int):
+    _exigir_agendador(tipo)
+    reserva = reservas_service.renovar(pedido_id, current_user.id, fila="agendador")
+    if reserva is None:
+        return jsonify({"success": False, "error": "Reserva expirada ou de outro usuário."}), 409
+    return jsonify({"success": True, "reserva": reservas_service.serializar(reserva)})
+
+
+@scheduling_bp.route("/<tipo>/ligacoes/<int:pedido_id>/liberar", methods=["POST"])
+@login_required
+def liberar_ligacao(tipo: str, pedido_id: int):
+    _exigir_agendador(tipo)
+    return jsonify({"success": reservas_service.liberar(pedido_id, current_user.id, fila="agendador")})
@@ -1,12 +1,12 @@
 from contextlib import contextmanager
-from typing import Generator, Tuple
+from typing import Any, Generator, Iterator, Sequence, Tuple
 
 import mysql.connector
 from mysql.connector import pooling
 
-from werkzeug.security import generate_password_hash
 
-from .schema import SCHEMA_STATEMENTS
+from .schema import SCHEMA_COLUMNS, SCHEMA_INDEXES, SCHEMA_STATEMENTS
+from .utils.security import hash_password
 
 DEFAULT_ADMIN = {
     "nome": "Leandro da Silva",
@@ -53,6 +53,39 @@ class MySQLConnector:
             for statement in SCHEMA_STATEMENTS:
                 cursor.execute(statement)
 
+            for tabela, coluna, definicao in SCHEMA_COLUMNS:
+                cursor.execute(
+                    """
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+                    LIMIT 1
+                    """,
+                    (tabela, coluna),
+                )
+                if cursor.fetchone() is None:
+                    cursor.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {definicao}")
+                    if logger:
+                        logger.info("Coluna %s adicionada em %s.", coluna, tabela)
+
+            for tabela, nome_indice, colunas, *tipo in SCHEMA_INDEXES:
+                cursor.execute(
+                    """
+                    SELECT 1 FROM information_schema.statistics
+                    WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+                    LIMIT 1
+                    """,
+                    (tabela, nome_indice),
+                )
+                if cursor.fetchone() is None:
+                    prefixo = f"{tipo[0]} " if tipo else ""
+                    if prefixo == "FULLTEXT ":
+                        # A lista de stopwords vale para o índice desde a criação;
+                        # com o parser ngram ela eliminaria bigramas comuns em nomes
+                        cursor.execute("SET SESSION innodb_ft_enable_stopword = OFF")
+                    cursor.execute(f"CREATE {prefixo}INDEX {nome_indice} ON {tabela} {colunas}")
+                    if logger:
+                        logger.info("Índice %s criado em %s.", nome_indice, tabela)
+
         if logger:
             logger.info("Schema do banco verificado/criado com sucesso.")
 
@@ -77,7 +110,7 @@ class MySQLConnector:
                     )
                 return
 
-            senha_hash = generate_password_hash(
+            senha_hash = hash_password(
                 DEFAULT_ADMIN["senha"],
                 method="pbkdf2:sha256",
                 salt_length=12,
@@ -126,4 +159,37 @@ class MySQLConnector:
             raise
         finally:
             cursor.close()
+            connection.close()
+
+    def iterar_linhas(
+        self,
+        query: str,
+        params: Sequence[Any] = (),
+        *,
+        dictionary: bool = True,
+        tamanho_lote: int = 1000,
+    ) -> Iterator[Any]:
+        """
+        Executa a consulta com cursor não bufferizado (server-side) e entrega as
+        linhas em lotes via fetchmany, mantendo memória constante em exportações
+        grandes. A conexão só volta ao pool quando o gerador termina ou é fechado.
+        """
+        connection = self.get_connection()
+        cursor = connection.cursor(dictionary=dictionary, buffered=False)
+        try:
+            cursor.execute(query, tuple(params))
+            while True:
+                lote = cursor.fetchmany(tamanho_lote)
+                if not lote:
+                    break
+                yield from lote
+        finally:
+            # Gerador interrompido (ex.: cliente cancelou o download): descarta o
+            # restante do resultado para a conexão voltar ao pool em estado limpo.
+            try:
+                if connection.unread_result:
+                    connection.consume_results()
+            except mysql.connector.Error:
+                pass
+            cursor.close()
             connection.close()
\ No newline at end of file
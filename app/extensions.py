@@ -1,7 +1,6 @@
 from flask_socketio import SocketIO
 from flask_login import LoginManager
 from .database import MySQLConnector
-from .models.usuario import Usuario
 
 # Usa gevent em vez de eventlet
 socketio = SocketIO(
@@ -23,8 +22,5 @@ def init_extensions(app):
 
 @login_manager.user_loader
 def load_user(user_id: str):
-    from app.repositories import usuarios as usuarios_repo
-    data = usuarios_repo.obter_por_id(int(user_id))
-    if data:
-        return Usuario.from_row(data)
-    return None
\ No newline at end of file
+    from app.services import usuarios_service
+    return usuarios_service.carregar_usuario(int(user_id))
\ No newline at end of file
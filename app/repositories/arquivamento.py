@@ -0,0 +1,117 @@
+from typing import List, Sequence
+
+from app.extensions import mysql
+
+# Tabelas quentes -> tabelas de arquivo (criadas com CREATE TABLE ... LIKE)
+TABELAS_ARQUIVO = {
+    "pedidos": "pedidos_arquivo",
+    "historico_pedidos": "historico_pedidos_arquivo",
+    "tentativas_contato": "tentativas_contato_arquivo",
+    "messages": "messages_arquivo",
+    "attachments": "attachments_arquivo",
+}
+
+_colunas_cache: dict[str, List[str]] = {}
+
+
+def _colunas(cursor, tabela: str) -> List[str]:
+    """
+    Colunas comuns à tabela quente e à de arquivo. A cópia usa lista explícita
+    para não quebrar se uma coluna for adicionada só em uma das tabelas.
+    """
+    if tabela not in _colunas_cache:
+        cursor.execute(
+            """
+            SELECT column_name AS coluna
+            FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s
+              AND column_name IN (
+                  SELECT column_name FROM information_schema.columns
+                  WHERE table_schema = DATABASE() AND table_name = %s
+              )
+            ORDER BY ordinal_position
+            """,
+            (tabela, TABELAS_ARQUIVO[tabela]),
+        )
+        _colunas_cache[tabela] = [linha["coluna"] for linha in cursor.fetchall()]
+    return _colunas_cache[tabela]
+
+
+def _mover(cursor, tabela: str, coluna_chave: str, ids: Sequence[int]) -> None:
+    """
+    Copia as linhas para a tabela de arquivo e as remove da tabela quente.
+    Sem IGNORE: se uma linha já existir no arquivo o INSERT falha e o lote
+    inteiro volta (rollback), em vez de apagar a linha quente sem cópia.
+    """
+    colunas = ", ".join(f"`{c}`" for c in _colunas(cursor, tabela))
+    marcadores = ", ".join(["%s"] * len(ids))
+    cursor.execute(
+        f"""
+        INSERT INTO {TABELAS_ARQUIVO[tabela]} ({colunas})
+        SELECT {colunas} FROM {tabela} WHERE {coluna_chave} IN ({marcadores})
+        """,
+        tuple(ids),
+    )
+    copiadas = cursor.rowcount
+    cursor.execute(f"DELETE FROM {tabela} WHERE {coluna_chave} IN ({marcadores})", tuple(ids))
+    if cursor.rowcount != copiadas:
+        # Levanta dentro do get_cursor(): a transação do lote é desfeita
+        raise RuntimeError(
+            f"Arquivamento de {tabela} abortado: {copiadas} linha(s) copiada(s), {cursor.rowcount} removida(s)."
+        )
+
+
+# ==========================================================
+# 🗄️ Arquivamento em lotes (uma transação por lote)
+# ==========================================================
+def arquivar_lote_pedidos(status_encerrados: Sequence[str], dias: int, tamanho_lote: int) -> int:
+    """
+    Move um lote de pedidos encerrados há mais de `dias` dias, junto com o
+    histórico e as tentativas de contato. Retorna quantos pedidos foram movidos.
+    """
+    marcadores = ", ".join(["%s"] * len(status_encerrados))
+    with mysql.get_cursor(dictionary=True) as (_, cursor):
+        cursor.execute(
+            f"""
+            SELECT id
+            FROM pedidos
+            WHERE status IN ({marcadores})
+              AND data_atualizacao < DATE_SUB(NOW(), INTERVAL %s DAY)
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE
+            """,
+            (*status_encerrados, dias, tamanho_lote),
+        )
+        ids = [linha["id"] for linha in cursor.fetchall()]
+        if not ids:
+            return 0
+
+        # Filhos primeiro, por causa das chaves estrangeiras para pedidos
+        _mover(cursor, "historico_pedidos", "pedido_id", ids)
+        _mover(cursor, "tentativas_contato", "pedido_id", ids)
+        _mover(cursor, "pedidos", "id", ids)
+        return len(ids)
+
+
+def arquivar_lote_mensagens(dias: int, tamanho_lote: int) -> int:
+    """Move um lote de mensagens do chat (e seus anexos) com mais de `dias` dias."""
+    with mysql.get_cursor(dictionary=True) as (_, cursor):
+        cursor.execute(
+            """
+            SELECT id
+            FROM messages
+            WHERE created_at < DATE_SUB(NOW(), INTERVAL %s DAY)
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE
+            """,
+            (dias, tamanho_lote),
+        )
+        ids = [linha["id"] for linha in cursor.fetchall()]
+        if not ids:
+            return 0
+
+        _mover(cursor, "attachments", "message_id", ids)
+        _mover(cursor, "messages", "id", ids)
+        return len(ids)
@@ -0,0 +1,19 @@
+from app.extensions import mysql
+
+
+def obter(namespace: str) -> int:
+    with mysql.get_cursor() as (_, cursor):
+        cursor.execute("SELECT versao FROM cache_versoes WHERE namespace = %s", (namespace,))
+        linha = cursor.fetchone()
+        return linha["versao"] if linha else 0
+
+
+def incrementar(namespace: str) -> None:
+    with mysql.get_cursor() as (_, cursor):
+        cursor.execute(
+            """
+            INSERT INTO cache_versoes (namespace, versao) VALUES (%s, 1)
+            ON DUPLICATE KEY UPDATE versao = versao + 1
+            """,
+            (namespace,),
+        )
@@ -0,0 +1,133 @@
+import json
+from typing import Optional
+
+from mysql.connector import errorcode
+from mysql.connector.errors import IntegrityError
+
+from app.extensions import mysql
+
+
+def criar_job(tipo: str, chave_parametros: str, parametros: dict, criado_por: Optional[int]) -> Optional[int]:
+    """
+    Cria o job já marcado como em andamento para a chave. Retorna None se
+    outro job com a mesma chave estiver pendente/executando (índice UNIQUE
+    em chave_pendente), sem janela entre a conferência e o INSERT.
+    """
+    query = """
+        INSERT INTO jobs (tipo, chave_parametros, chave_pendente, parametros, status, criado_por, criado_em)
+        VALUES (%s, %s, %s, %s, 'pendente', %s, NOW())
+    """
+    try:
+        with mysql.get_cursor() as (_, cursor):
+            cursor.execute(query, (tipo, chave_parametros, chave_parametros, json.dumps(parametros), criado_por))
+            return cursor.lastrowid
+    except IntegrityError as exc:
+        if exc.errno == errorcode.ER_DUP_ENTRY:
+            return None
+        raise
+
+
+def expirar_travados(sem_sinal_segundos: int, timeout_segundos: int,
+                     chave_parametros: Optional[str] = None, job_id: Optional[int] = None) -> int:
+    """
+    Marca como erro (e libera a chave) os jobs em andamento da chave ou do id
+    informado cujo worker parou de dar sinal de vida ou que passaram do
+    timeout: o worker morreu ou foi reiniciado no meio da execução.
+    """
+    filtro, params = ("chave_pendente = %s", [chave_parametros]) if job_id is None else (
+        "id = %s AND chave_pendente IS NOT NULL", [job_id]
+    )
+    query = f"""
+        UPDATE jobs
+        SET status = 'erro', erro = 'Job interrompido: o worker parou de responder',
+            chave_pendente = NULL, concluido_em = NOW()
+        WHERE {filtro}
+          AND (COALESCE(sinal_em, criado_em) < DATE_SUB(NOW(), INTERVAL %s SECOND)
+               OR criado_em < DATE_SUB(NOW(), INTERVAL %s SECOND))
+    """
+    with mysql.get_cursor() as (_, cursor):
+        cursor.execute(query, (*params, sem_sinal_segundos, timeout_segundos))
+        return cursor.rowcount
+
+
+def obter_por_id(job_id: int) -> Optional[dict]:
+    query = """
+        SELECT id, tipo, chave_parametros, parametros, status, resultado, erro,
+               criado_por, criado_em, iniciado_em, concluido_em, expira_em
+        FROM jobs
+        WHERE id = %s
+    """
+    with mysql.get_cursor(dictionary=True) as (_, cursor):
+        cursor.execute(query, (job_id,))
+        return cursor.fetchone()
+
+
+def obter_reaproveitavel(tipo: str, chave_parametros: str, timeout_segundos: int) -> Optional[dict]:
+    """
+    Retorna o job mais recente com os mesmos parâmetros que ainda pode ser
+    reaproveitado: concluído e não expirado, ou em andamento dentro do timeout.
+    """
+    query = """
+        SELECT id, tipo, status, resultado, erro, criado_em, concluido_em, expira_em
+        FROM jobs
+        WHERE tipo = %s
+          AND chave_parametros = %s
+          AND (
+                (status = 'concluido' AND expira_em > NOW())
+             OR (status IN ('pendente', 'executando')
+                 AND criado_em >= DATE_SUB(NOW(), INTERVAL %s SECOND))
+          )
+        ORDER BY id DESC
+        LIMIT 1
+    """
+    with mysql.get_cursor(dictionary=True) as (_, cursor):
+        cursor.execute(query, (tipo, chave_parametros, timeout_segundos))
+        return cursor.fetchone()
+
+
+def marcar_executando(job_id: int) -> None:
+    query = "UPDATE jobs SET status = 'executando', iniciado_em = NOW(), sinal_em = NOW() WHERE id = %s"
+    with mysql.get_cursor() as (_, cursor):
+        cursor.execute(query, (job_id,))
+
+
+def registrar_sinal(job_id: int) -> None:
+    query = "UPDATE jobs SET sinal_em = NOW() WHERE id = %s AND status = 'executando'"
+    with mysql.get_cursor() as (_, cursor):
+        cursor.execute(query, (job_id,))
+
+
+def concluir(job_id: int, resultado: str, ttl_segundos: int) -> None:
+    query = """
+        UPDATE jobs
+        SET status = 'concluido',
+            chave_pendente = NULL,
+            resultado = %s,
+            concluido_em = NOW(),
+            expira_em = DATE_ADD(NOW(), INTERVAL %s SECOND)
+        WHERE id = %s
+    """
+    with mysql.get_cursor() as (_, cursor):
+        cursor.execute(query, (resultado, ttl_segundos, job_id))
+
+
+def registrar_erro(job_id: int, erro: str) -> None:
+    query = """
+        UPDATE jobs
+        SET status = 'erro', erro = %s, chave_pendente = NULL, concluido_em = NOW()
+        WHERE id = %s
+    """
+    with mysql.get_cursor() as (_, cursor):
+        cursor.execute(query, (erro, job_id))
+
+
+def remover_antigos(dias: int = 7) -> int:
+    """Apaga jobs finalizados há mais de `dias` dias (limpeza periódica)."""
+    query = """
+        DELETE FROM jobs
+        WHERE status IN ('concluido', 'erro')
+          AND concluido_em < DATE_SUB(NOW(), INTERVAL %s DAY)
+    """
+    with mysql.get_cursor() as (_, cursor):
+        cursor.execute(query, (dias,))
+        return cursor.rowcount
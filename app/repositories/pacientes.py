@@ -1,7 +1,13 @@
-from typing import Optional
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
 
 from app.extensions import mysql
 
+# Operadores do modo booleano do FULLTEXT, removidos dos termos digitados
+_OPERADORES_FULLTEXT = re.compile(r'[+\-<>()~*"@]')
+# Tamanho do n-grama do parser ngram (ngram_token_size padrão do MySQL)
+TAMANHO_NGRAM = 2
+
 
 def obter_por_id(paciente_id: int) -> Optional[dict]:
     query = "SELECT * FROM pacientes WHERE id = %s"
@@ -41,6 +47,96 @@ def criar_paciente(dados: dict) -> int:
         return cursor.lastrowid
 
 
+# Linhas afetadas pelo upsert (sem CLIENT_FOUND_ROWS): 1 inseriu, 2 alterou,
+# 0 já estava igual
+_SITUACAO_UPSERT = {1: "criado", 2: "atualizado", 0: "inalterado"}
+
+
+def upsert_paciente(cursor, dados: dict) -> Tuple[int, str]:
+    """
+    Cria o paciente ou atualiza o cadastro do mesmo CPF num único comando, no
+    cursor (transação) de quem chama. Dois cadastros simultâneos do mesmo CPF
+    não esbarram mais na UNIQUE: o segundo vira UPDATE. Retorna o id e a
+    situação ("criado", "atualizado" ou "inalterado").
+    """
+    query = """
+        INSERT INTO pacientes
+        (nome, cpf, data_nascimento, telefone_principal, telefone_secundario,
+         email, cartao_sus, endereco, unidade_id)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            id = LAST_INSERT_ID(id),
+            nome = VALUES(nome),
+            data_nascimento = VALUES(data_nascimento),
+            telefone_principal = VALUES(telefone_principal),
+            telefone_secundario = VALUES(telefone_secundario),
+            email = VALUES(email),
+            cartao_sus = VALUES(cartao_sus),
+            endereco = VALUES(endereco),
+            unidade_id = VALUES(unidade_id)
+    """
+    valores = (
+        dados["nome"],
+        "".join(filter(str.isdigit, dados["cpf"])),
+        dados.get("data_nascimento"),
+        dados.get("telefone_principal"),
+        dados.get("telefone_secundario"),
+        dados.get("email"),
+        dados.get("cartao_sus"),
+        dados.get("endereco"),
+        dados.get("unidade_id"),
+    )
+    cursor.execute(query, valores)
+    return cursor.lastrowid, _SITUACAO_UPSERT.get(cursor.rowcount, "atualizado")
+
+
+def upsert_pacientes_em_lote(cursor, lista: Sequence[dict]) -> Dict[str, int]:
+    """
+    Upsert de vários pacientes num único INSERT de múltiplas linhas (o
+    executemany do conector junta os VALUES), no cursor de quem chama.
+    Retorna {cpf: id} de todos os CPFs do lote. O mesmo CPF repetido no lote
+    fica com os dados da última ocorrência. Campo vazio (None) na planilha não
+    apaga o que já está no cadastro: só os valores informados são gravados.
+    """
+    if not lista:
+        return {}
+    query = """
+        INSERT INTO pacientes
+        (nome, cpf, data_nascimento, telefone_principal, telefone_secundario,
+         email, cartao_sus, endereco, unidade_id)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            nome = VALUES(nome),
+            data_nascimento = COALESCE(VALUES(data_nascimento), data_nascimento),
+            telefone_principal = COALESCE(VALUES(telefone_principal), telefone_principal),
+            telefone_secundario = COALESCE(VALUES(telefone_secundario), telefone_secundario),
+            email = COALESCE(VALUES(email), email),
+            cartao_sus = COALESCE(VALUES(cartao_sus), cartao_sus),
+            endereco = COALESCE(VALUES(endereco), endereco),
+            unidade_id = COALESCE(VALUES(unidade_id), unidade_id)
+    """
+    cpfs = ["".join(filter(str.isdigit, dados["cpf"])) for dados in lista]
+    cursor.executemany(query, [
+        (
+            dados["nome"],
+            cpf,
+            dados.get("data_nascimento"),
+            dados.get("telefone_principal"),
+            dados.get("telefone_secundario"),
+            dados.get("email"),
+            dados.get("cartao_sus"),
+            dados.get("endereco"),
+            dados.get("unidade_id"),
+        )
+        for cpf, dados in zip(cpfs, lista)
+    ])
+
+    unicos = list(dict.fromkeys(cpfs))
+    marcadores = ", ".join(["%s"] * len(unicos))
+    cursor.execute(f"SELECT id, cpf FROM pacientes WHERE cpf IN ({marcadores})", unicos)
+    return {linha["cpf"]: linha["id"] for linha in cursor.fetchall()}
+
+
 def atualizar_paciente(paciente_id: int, dados: dict):
     query = """
         UPDATE pacientes
@@ -66,4 +162,104 @@ def atualizar_paciente(paciente_id: int, dados: dict):
         paciente_id,
     )
     with mysql.get_cursor() as (_, cursor):
-        cursor.execute(query, valores)
\ No newline at end of file
+        cursor.execute(query, valores)
+
+
+# ==========================================================
+# 🔎 Busca indexada de pacientes (nome e prefixo de CPF)
+# ==========================================================
+def _termos_nome(nome: Optional[str]) -> Tuple[List[str], List[str]]:
+    """Separa os termos do nome entre os que o índice ngram atende e os curtos demais."""
+    termos = _OPERADORES_FULLTEXT.sub(" ", nome or "").split()
+    longos = [t for t in termos if len(t) >= TAMANHO_NGRAM]
+    curtos = [t for t in termos if len(t) < TAMANHO_NGRAM]
+    return longos, curtos
+
+
+def _expressao_fulltext(termos: List[str]) -> str:
+    # Cada termo vira uma frase obrigatória: com o parser ngram, isso equivale
+    # a "contém o trecho", sem diferenciar maiúsculas/acentos (collation da coluna)
+    return " ".join(f'+"{termo}"' for termo in termos)
+
+
+def filtro_busca(nome: Optional[str] = None, cpf: Optional[str] = None, alias: str = "pa") -> Tuple[str, list]:
+    """
+    Condições SQL (prefixadas por AND) para filtrar pacientes por trecho do
+    nome e prefixo do CPF, usando o índice FULLTEXT de nome e o índice UNIQUE
+    de CPF. Usado pelas filas para filtrar no banco em vez de em Python.
+    """
+    condicoes: List[str] = []
+    params: list = []
+
+    longos, curtos = _termos_nome(nome)
+    if longos:
+        condicoes.append(f"MATCH({alias}.nome) AGAINST (%s IN BOOLEAN MODE)")
+        params.append(_expressao_fulltext(longos))
+    for termo in curtos:
+        condicoes.append(f"{alias}.nome LIKE %s")
+        params.append(f"%{termo}%")
+
+    cpf_digitos = "".join(filter(str.isdigit, cpf or ""))
+    if cpf_digitos:
+        condicoes.append(f"{alias}.cpf LIKE %s")
+        params.append(f"{cpf_digitos}%")
+
+    return "".join(f" AND {condicao}" for condicao in condicoes), params
+
+
+def buscar_ids(nome: Optional[str] = None, cpf: Optional[str] = None, limit: int = 50, offset: int = 0) -> List[int]:
+    """IDs de pacientes que atendem à busca, do mais relevante para o menos relevante."""
+    filtro, params = filtro_busca(nome, cpf, alias="pa")
+    if not filtro:
+        return []
+
+    longos, _ = _termos_nome(nome)
+    relevancia = "0"
+    params_relevancia: list = []
+    if longos:
+        relevancia = "MATCH(pa.nome) AGAINST (%s IN BOOLEAN MODE)"
+        params_relevancia.append(_expressao_fulltext(longos))
+
+    query = f"""
+        SELECT pa.id, {relevancia} AS relevancia
+        FROM pacientes pa
+        WHERE 1 = 1 {filtro}
+        ORDER BY relevancia DESC, pa.nome
+        LIMIT %s OFFSET %s
+    """
+    with mysql.get_cursor() as (_, cursor):
+        cursor.execute(query, (*params_relevancia, *params, limit, offset))
+        return [linha["id"] for linha in cursor.fetchall()]
+
+
+def buscar_para_autocomplete(termo: str, limit: int = 10) -> List[dict]:
+    """
+    Pacientes para preenchimento do formulário: por prefixo de CPF quando o
+    termo é numérico, senão por trecho do nome (mais relevantes primeiro).
+    """
+    termo_cpf = (termo or "").replace(".", "").replace("-", "").strip()
+    if termo_cpf.isdigit():
+        filtro, params = filtro_busca(cpf=termo_cpf, alias="pa")
+        ordem, params_ordem = "pa.cpf", []
+    else:
+        filtro, params = filtro_busca(nome=termo, alias="pa")
+        longos, _ = _termos_nome(termo)
+        ordem, params_ordem = "pa.nome", []
+        if longos:
+            ordem = "MATCH(pa.nome) AGAINST (%s IN BOOLEAN MODE) DESC, pa.nome"
+            params_ordem = [_expressao_fulltext(longos)]
+    if not filtro:
+        return []
+
+    query = f"""
+        SELECT pa.id, pa.nome, pa.cpf, pa.data_nascimento, pa.telefone_principal,
+               pa.telefone_secundario, pa.email, pa.cartao_sus, pa.endereco
+        FROM pacientes pa
+        WHERE 1 = 1 {filtro}
+        ORDER BY {ordem}
+        LIMIT %s
+    """
+    with mysql.get_cursor(dictionary=True) as (_, cursor):
+        cursor.execute(query, (*params, *params_ordem, limit))
+        return cursor.fetchall()
+
@@ -1,12 +1,89 @@
-from typing import List, Optional
+from datetime import date
+from typing import Iterator, List, Optional, Sequence
 from app.domain.status import StatusPedido
 from app.extensions import mysql
+from app.repositories import pacientes as pacientes_repo
+
+
+def _unir_com_arquivo(select: str, incluir_arquivados: bool) -> str:
+    """
+    Monta a consulta sobre `pedidos` e, se pedido, acrescenta a mesma consulta
+    sobre `pedidos_arquivo` com UNION ALL. O SELECT deve ter os marcadores
+    {tabela} e {arquivado}; o ORDER BY fica a cargo de quem chama.
+    """
+    query = select.format(tabela="pedidos", arquivado=0)
+    if incluir_arquivados:
+        query += " UNION ALL " + select.format(tabela="pedidos_arquivo", arquivado=1)
+    return query
+
+
+def _filtros_fila(
+    *,
+    unidade: Optional[str] = None,
+    unidade_exata: bool = False,
+    categoria: Optional[str] = None,
+    cpf: Optional[str] = None,
+    nome: Optional[str] = None,
+) -> tuple[str, list]:
+    """
+    Filtros comuns às filas (unidade, categoria, CPF e nome do paciente),
+    aplicados no SQL. Espera os aliases `p`, `pa` e `un` na consulta.
+    """
+    sql, params = pacientes_repo.filtro_busca(nome, cpf, alias="pa")
+    if unidade:
+        sql += " AND un.nome = %s" if unidade_exata else " AND un.nome LIKE %s"
+        params.append(unidade if unidade_exata else f"%{unidade}%")
+    if categoria in ("exame", "consulta"):
+        sql += " AND p.tipo_solicitacao = %s"
+        params.append(categoria)
+    return sql, params
+
+
+def listar_unidades_da_fila(status: Sequence[str], tipo_regulacao: Optional[str] = None) -> List[str]:
+    """Nomes das unidades com pedidos na fila (para os filtros das telas)."""
+    query = f"""
+        SELECT DISTINCT un.nome
+        FROM pedidos p
+        JOIN unidades_saude un ON un.id = p.unidade_id
+        WHERE p.status IN ({', '.join(['%s'] * len(status))})
+    """
+    params = list(status)
+    if tipo_regulacao:
+        query += " AND p.tipo_regulacao = %s"
+        params.append(tipo_regulacao)
+    query += " ORDER BY un.nome"
+    with mysql.get_cursor() as (_, cursor):
+        cursor.execute(query, tuple(params))
+        return [linha["nome"] for linha in cursor.fetchall()]
+
+
+def resumo_fila(status: Sequence[str], tipo_regulacao: Optional[str] = None) -> tuple:
+    """(maior data_atualizacao, total) dos pedidos nos status; muda a cada entrada/saída/edição."""
+    query = f"""
+        SELECT MAX(p.data_atualizacao) AS atualizado_em, COUNT(*) AS total
+        FROM pedidos p
+        WHERE p.status IN ({', '.join(['%s'] * len(status))})
+    """
+    params = list(status)
+    if tipo_regulacao:
+        query += " AND p.tipo_regulacao = %s"
+        params.append(tipo_regulacao)
+    with mysql.get_cursor() as (_, cursor):
+        cursor.execute(query, tuple(params))
+        linha = cursor.fetchone()
+        return linha["atualizado_em"], linha["total"]
 
 
 # ==========================================================
 # 🧾 Criar Pedido (Exame ou Consulta) - CORRIGIDO
 # ==========================================================
 def criar_pedido(dados: dict) -> int:
+    with mysql.get_cursor() as (_, cursor):
+        return inserir_pedido(cursor, dados)
+
+
+def inserir_pedido(cursor, dados: dict) -> int:
+    """INSERT do pedido (aguardando triagem) no cursor/transação de quem chama."""
     # Determinar tipo de solicitação baseado nos IDs
     tipo_solicitacao = 'consulta' if dados.get("consulta_id") else 'exame'
     
@@ -27,28 +104,42 @@ def criar_pedido(dados: dict) -> int:
         dados["usuario_criacao"],
         dados.get("observacoes"),
     )
-    with mysql.get_cursor() as (_, cursor):
-        cursor.execute(query, valores)
-        return cursor.lastrowid
+    cursor.execute(query, valores)
+    return cursor.lastrowid
 
 
 # ==========================================================
 # 🛠 Atualizar campos
 # ==========================================================
 def atualizar_campos(pedido_id: int, campos: dict):
+    with mysql.get_cursor() as (_, cursor):
+        gravar_campos(cursor, pedido_id, campos)
+
+
+def gravar_campos(cursor, pedido_id: int, campos: dict) -> None:
+    """atualizar_campos no cursor (transação) de quem chama."""
     set_clause = ", ".join([f"{coluna}=%s" for coluna in campos.keys()])
     valores = list(campos.values())
     valores.append(pedido_id)
     query = f"UPDATE pedidos SET {set_clause}, data_atualizacao=NOW() WHERE id=%s"
-    with mysql.get_cursor() as (_, cursor):
-        cursor.execute(query, tuple(valores))
+    cursor.execute(query, tuple(valores))
 
 
 # ==========================================================
 # 🔎 Obter Pedido por ID
 # ==========================================================
-def obter_por_id(pedido_id: int) -> Optional[dict]:
-    query = """
+def obter_por_id(pedido_id: int, incluir_arquivados: bool = False) -> Optional[dict]:
+    """Busca o pedido; com `incluir_arquivados`, procura também em pedidos_arquivo."""
+    pedido = _obter_por_id_em("pedidos", pedido_id)
+    if pedido is None and incluir_arquivados:
+        pedido = _obter_por_id_em("pedidos_arquivo", pedido_id)
+        if pedido is not None:
+            pedido["arquivado"] = 1
+    return pedido
+
+
+def _obter_por_id_em(tabela: str, pedido_id: int) -> Optional[dict]:
+    query = f"""
         SELECT p.*,
                pa.nome AS paciente_nome,
                pa.cpf AS paciente_cpf,
@@ -68,7 +159,7 @@ def obter_por_id(pedido_id: int) -> Optional[dict]:
                p.entrega_confirmada,
                p.entregue_por_usuario,
                p.data_entrega
-        FROM pedidos p
+        FROM {tabela} p
         JOIN pacientes pa ON pa.id = p.paciente_id
         LEFT JOIN exames e ON e.id = p.exame_id
         LEFT JOIN consultas c ON c.id = p.consulta_id
@@ -79,6 +170,49 @@ def obter_por_id(pedido_id: int) -> Optional[dict]:
         cursor.execute(query, (pedido_id,))
         return cursor.fetchone()
 
+
+def obter_para_impressao(pedido_ids: Sequence[int]) -> List[dict]:
+    """
+    Dados da folha de impressão de vários pedidos em uma consulta, na ordem
+    de `pedido_ids` (ids inexistentes ficam de fora). Inclui o atualizado_em
+    do paciente, que junto com o data_atualizacao do pedido identifica a
+    versão da folha.
+    """
+    ids = list(dict.fromkeys(pedido_ids))
+    if not ids:
+        return []
+    marcadores = ", ".join(["%s"] * len(ids))
+    query = f"""
+        SELECT p.id,
+               p.status,
+               p.prioridade,
+               p.tipo_solicitacao,
+               p.unidade_id,
+               p.data_exame,
+               p.horario_exame,
+               p.local_exame,
+               p.data_atualizacao,
+               pa.nome AS paciente_nome,
+               pa.cpf AS paciente_cpf,
+               pa.data_nascimento,
+               pa.cartao_sus,
+               pa.telefone_principal,
+               pa.atualizado_em AS paciente_atualizado_em,
+               e.nome AS exame_nome,
+               c.especialidade AS consulta_especialidade,
+               un.nome AS unidade_nome
+        FROM pedidos p
+        JOIN pacientes pa ON pa.id = p.paciente_id
+        LEFT JOIN exames e ON e.id = p.exame_id
+        LEFT JOIN consultas c ON c.id = p.consulta_id
+        JOIN unidades_saude un ON un.id = p.unidade_id
+        WHERE p.id IN ({marcadores})
+    """
+    with mysql.get_cursor(dictionary=True) as (_, cursor):
+        cursor.execute(query, tuple(ids))
+        por_id = {pedido["id"]: pedido for pedido in cursor.fetchall()}
+    return [por_id[pedido_id] for pedido_id in ids if pedido_id in por_id]
+
 # ==========================================================
 # 📦 Registrar retirada diretamente no pedido
 # ==========================================================
@@ -198,14 +332,59 @@ def listar_devolvidos_por_unidade(unidade_id: int) -> List[dict]:
 # ==========================================================
 # 📋 Listar todos os pedidos (para admin)
 # ==========================================================
-def listar_todos() -> List[dict]:
-    query = """
+def listar_todos(incluir_arquivados: bool = False) -> List[dict]:
+    select = """
         SELECT p.id,
                p.status,
                p.tipo_regulacao,
                p.prioridade,
                p.tipo_solicitacao,
                p.data_solicitacao,
+               p.data_atualizacao,
+               p.pendente_recepcao,
+               pa.nome AS paciente_nome,
+               pa.cpf AS paciente_cpf,
+               COALESCE(e.nome, c.especialidade) AS nome_solicitacao,
+               un.nome AS unidade_nome,
+               {arquivado} AS arquivado
+        FROM {tabela} p
+        JOIN pacientes pa ON pa.id = p.paciente_id
+        LEFT JOIN exames e ON e.id = p.exame_id
+        LEFT JOIN consultas c ON c.id = p.consulta_id
+        JOIN unidades_saude un ON un.id = p.unidade_id
+    """
+    query = _unir_com_arquivo(select, incluir_arquivados) + " ORDER BY data_atualizacao DESC"
+    with mysql.get_cursor(dictionary=True) as (_, cursor):
+        cursor.execute(query)
+        return cursor.fetchall()
+
+
+# ==========================================================
+# 📋 Listar para recepção da regulação (com filtros)
+# ==========================================================
+def listar_para_regulacao(
+    unidade: Optional[str] = None,
+    categoria: Optional[str] = None,
+    cpf: Optional[str] = None,
+    nome: Optional[str] = None,
+) -> List[dict]:
+    """
+    Sem filtros, lista apenas os pedidos com agendamento confirmado; com
+    qualquer filtro, busca entre todos os pedidos.
+    """
+    filtros, params = _filtros_fila(unidade=unidade, unidade_exata=True, categoria=categoria, cpf=cpf, nome=nome)
+    if not filtros:
+        filtros = " AND p.status = %s"
+        params = [StatusPedido.AGENDAMENTO_CONFIRMADO.value]
+
+    query = f"""
+        SELECT p.id,
+               p.status,
+               p.tipo_regulacao,
+               p.prioridade,
+               p.tipo_solicitacao,
+               p.data_solicitacao,
+               p.data_atualizacao,
                p.pendente_recepcao,
                pa.nome AS paciente_nome,
                pa.cpf AS paciente_cpf,
@@ -216,10 +395,11 @@ def listar_todos() -> List[dict]:
         LEFT JOIN exames e ON e.id = p.exame_id
         LEFT JOIN consultas c ON c.id = p.consulta_id
         JOIN unidades_saude un ON un.id = p.unidade_id
+        WHERE 1 = 1 {filtros}
         ORDER BY p.data_atualizacao DESC
     """
     with mysql.get_cursor(dictionary=True) as (_, cursor):
-        cursor.execute(query)
+        cursor.execute(query, tuple(params))
         return cursor.fetchall()
 
 
@@ -287,8 +467,20 @@ def listar_todos_devolvidos() -> List[dict]:
 # ==========================================================
 # 📦 Listar para Malote - ATUALIZADO
 # ==========================================================
-def listar_para_malote() -> List[dict]:
-    query = """
+STATUS_FILA_MALOTE = (
+    StatusPedido.AGUARDANDO_TRIAGEM.value,
+    StatusPedido.DEVOLVIDO_SEM_CONTATO.value,
+)
+
+
+def listar_para_malote(
+    unidade: Optional[str] = None,
+    categoria: Optional[str] = None,
+    cpf: Optional[str] = None,
+    nome: Optional[str] = None,
+) -> List[dict]:
+    filtros, params_filtros = _filtros_fila(unidade=unidade, categoria=categoria, cpf=cpf, nome=nome)
+    query = f"""
         SELECT p.id,
                p.status,
                p.prioridade,
@@ -304,32 +496,82 @@ def listar_para_malote() -> List[dict]:
         LEFT JOIN exames e ON e.id = p.exame_id
         LEFT JOIN consultas c ON c.id = p.consulta_id
         JOIN unidades_saude un ON un.id = p.unidade_id
-        WHERE p.status IN (%s, %s)
+        WHERE p.status IN (%s, %s) {filtros}
         ORDER BY un.nome, p.data_solicitacao
     """
     with mysql.get_cursor(dictionary=True) as (_, cursor):
-        cursor.execute(
-            query,
-            (
-                StatusPedido.AGUARDANDO_TRIAGEM.value,
-                StatusPedido.DEVOLVIDO_SEM_CONTATO.value,
-            ),
-        )
+        cursor.execute(query, (*STATUS_FILA_MALOTE, *params_filtros))
         return cursor.fetchall()
 
 
 # ==========================================================
 # 🩺 Listar para Médico Regulador
 # ==========================================================
-def listar_para_medico(tipo_regulacao: str) -> List[dict]:
-    if tipo_regulacao not in ("municipal", "estadual"):
-        return []
-    status_esperado = (
+_RESUMO_FILA = """
+    SELECT p.id,
+           p.status,
+           p.tipo_regulacao,
+           p.unidade_id,
+           p.prioridade,
+           p.tipo_solicitacao,
+           p.tentativas_contato,
+           p.data_solicitacao,
+           un.nome AS unidade_nome,
+           pa.nome AS paciente_nome,
+           pa.cpf AS paciente_cpf,
+           COALESCE(e.nome, c.especialidade) AS nome_solicitacao
+    FROM pedidos p
+    JOIN pacientes pa ON pa.id = p.paciente_id
+    LEFT JOIN exames e ON e.id = p.exame_id
+    LEFT JOIN consultas c ON c.id = p.consulta_id
+    JOIN unidades_saude un ON un.id = p.unidade_id
+    WHERE p.id = %s
+"""
+
+
+def obter_resumo_fila(pedido_id: int) -> Optional[dict]:
+    """Campos que as filas mostram de um pedido (usado nos eventos em tempo real)."""
+    with mysql.get_cursor(dictionary=True) as (_, cursor):
+        return ler_resumo_fila(cursor, pedido_id)
+
+
+def ler_resumo_fila(cursor, pedido_id: int, bloquear: bool = False) -> Optional[dict]:
+    """
+    obter_resumo_fila no cursor de quem chama. Com `bloquear`, trava a linha
+    do pedido até o fim da transação (o "antes" de uma transição fica exato).
+    """
+    cursor.execute(_RESUMO_FILA + (" FOR UPDATE OF p" if bloquear else ""), (pedido_id,))
+    return cursor.fetchone()
+
+
+def status_fila_medico(tipo_regulacao: str) -> str:
+    return (
         StatusPedido.AGUARDANDO_ANALISE_MEDICO_MUNICIPAL.value
         if tipo_regulacao == "municipal"
         else StatusPedido.AGUARDANDO_ANALISE_MEDICO_ESTADUAL.value
     )
-    query = """
+
+
+def status_fila_agendador(tipo_regulacao: str) -> tuple:
+    aprovado = (
+        StatusPedido.APROVADO_MUNICIPAL.value if tipo_regulacao == "municipal"
+        else StatusPedido.APROVADO_ESTADUAL.value
+    )
+    return (aprovado, StatusPedido.AGENDAMENTO_EM_ANDAMENTO.value)
+
+
+def listar_para_medico(
+    tipo_regulacao: str,
+    unidade: Optional[str] = None,
+    categoria: Optional[str] = None,
+    cpf: Optional[str] = None,
+    nome: Optional[str] = None,
+) -> List[dict]:
+    if tipo_regulacao not in ("municipal", "estadual"):
+        return []
+    status_esperado = status_fila_medico(tipo_regulacao)
+    filtros, params_filtros = _filtros_fila(unidade=unidade, categoria=categoria, cpf=cpf, nome=nome)
+    query = f"""
         SELECT p.id,
                p.prioridade,
                p.status,
@@ -346,14 +588,57 @@ def listar_para_medico(tipo_regulacao: str) -> List[dict]:
         LEFT JOIN exames e ON e.id = p.exame_id
         LEFT JOIN consultas c ON c.id = p.consulta_id
         JOIN unidades_saude un ON un.id = p.unidade_id
-        WHERE p.status = %s
+        WHERE p.status = %s {filtros}
         ORDER BY p.prioridade ASC, p.data_solicitacao ASC
     """
     with mysql.get_cursor(dictionary=True) as (_, cursor):
-        cursor.execute(query, (status_esperado,))
+        cursor.execute(query, (status_esperado, *params_filtros))
         return cursor.fetchall()
 
 
+def _periodo_solicitacao(ano: Optional[int], mes: Optional[int]) -> tuple[str, list]:
+    """
+    Filtro de ano/mês como intervalo em data_solicitacao, para aproveitar o
+    índice (YEAR()/MONTH() na coluna impediriam o uso dele).
+    """
+    if ano and mes and 1 <= mes <= 12:
+        inicio = date(ano, mes, 1)
+        fim = date(ano + 1, 1, 1) if mes == 12 else date(ano, mes + 1, 1)
+        return " AND p.data_solicitacao >= %s AND p.data_solicitacao < %s", [inicio, fim]
+    if ano:
+        return " AND p.data_solicitacao >= %s AND p.data_solicitacao < %s", [date(ano, 1, 1), date(ano + 1, 1, 1)]
+    if mes:
+        return " AND MONTH(p.data_solicitacao) = %s", [mes]
+    return "", []
+
+
+def _filtros_agendador(
+    tipo_regulacao: str,
+    ano: Optional[int] = None,
+    mes: Optional[int] = None,
+    prioridade: Optional[str] = None,
+    nome: Optional[str] = None,
+    cpf: Optional[str] = None,
+    exame: Optional[str] = None,
+) -> tuple[str, list]:
+    """WHERE da fila de agendamento (status do tipo + filtros da tela)."""
+    sql = " WHERE p.status IN (%s, %s) AND p.tipo_regulacao = %s"
+    params = [*status_fila_agendador(tipo_regulacao), tipo_regulacao]
+
+    periodo, params_periodo = _periodo_solicitacao(ano, mes)
+    sql += periodo
+    params.extend(params_periodo)
+    if prioridade:
+        sql += " AND p.prioridade = %s"
+        params.append(prioridade)
+    if exame:
+        sql += " AND COALESCE(e.nome, c.nome) LIKE %s"
+        params.append(f"%{exame}%")
+
+    filtros, params_filtros = _filtros_fila(cpf=cpf, nome=nome)
+    return sql + filtros, params + params_filtros
+
+
 # ==========================================================
 # 📅 Listar para Agendador (com filtros)
 # ==========================================================
@@ -361,26 +646,22 @@ def listar_para_agendador(
     tipo_regulacao: str,
     ano: Optional[int] = None,
     mes: Optional[int] = None,
-    prioridade: Optional[str] = None
+    prioridade: Optional[str] = None,
+    nome: Optional[str] = None,
+    cpf: Optional[str] = None,
+    exame: Optional[str] = None,
 ) -> List[dict]:
 
     if tipo_regulacao not in ("municipal", "estadual"):
         return []
 
-    status_validos = (
-        StatusPedido.APROVADO_MUNICIPAL.value,
-        StatusPedido.AGENDAMENTO_EM_ANDAMENTO.value,
-    ) if tipo_regulacao == "municipal" else (
-        StatusPedido.APROVADO_ESTADUAL.value,
-        StatusPedido.AGENDAMENTO_EM_ANDAMENTO.value,
-    )
-
     # 👉 SELECT unificado: traz exame OU consulta
     query = """
         SELECT 
             p.id,
             p.status,
             p.tentativas_contato,
+            p.proxima_tentativa_em,
             p.data_solicitacao,
             p.data_exame,
             p.horario_exame,
@@ -405,23 +686,81 @@ def listar_para_agendador(
         LEFT JOIN exames e ON e.id = p.exame_id
         LEFT JOIN consultas c ON c.id = p.consulta_id
         JOIN unidades_saude un ON un.id = p.unidade_id
-        WHERE p.status IN (%s, %s)
-          AND p.tipo_regulacao = %s
     """
 
-    params = [status_validos[0], status_validos[1], tipo_regulacao]
+    filtros, params = _filtros_agendador(tipo_regulacao, ano, mes, prioridade, nome, cpf, exame)
+    query += filtros + " ORDER BY p.prioridade ASC, p.data_solicitacao DESC"
 
-    if ano:
-        query += " AND YEAR(p.data_solicitacao) = %s"
-        params.append(ano)
-    if mes:
-        query += " AND MONTH(p.data_solicitacao) = %s"
-        params.append(mes)
-    if prioridade:
-        query += " AND p.prioridade = %s"
-        params.append(prioridade)
+    with mysql.get_cursor(dictionary=True) as (_, cursor):
+        cursor.execute(query, tuple(params))
+        return cursor.fetchall()
+
+
+def obter_para_ligacao(pedido_id: int) -> Optional[dict]:
+    """Dados do cartão de ligação (mesmos campos da fila de agendamento)."""
+    query = """
+        SELECT p.id,
+               p.status,
+               p.tipo_regulacao,
+               p.prioridade,
+               p.tentativas_contato,
+               p.proxima_tentativa_em,
+               p.data_solicitacao,
+               pa.nome AS paciente_nome,
+               pa.cpf AS paciente_cpf,
+               pa.telefone_principal,
+               pa.telefone_secundario,
+               COALESCE(e.nome, c.nome) AS nome_solicitacao,
+               un.nome AS unidade_nome
+        FROM pedidos p
+        JOIN pacientes pa ON pa.id = p.paciente_id
+        LEFT JOIN exames e ON e.id = p.exame_id
+        LEFT JOIN consultas c ON c.id = p.consulta_id
+        JOIN unidades_saude un ON un.id = p.unidade_id
+        WHERE p.id = %s
+    """
+    with mysql.get_cursor(dictionary=True) as (_, cursor):
+        cursor.execute(query, (pedido_id,))
+        return cursor.fetchone()
+
+
+# ==========================================================
+# 📊 Pivô Exame × Mês × Prioridade (fila de agendamento)
+# ==========================================================
+def pivo_exames_por_mes(
+    tipo_regulacao: str,
+    ano: Optional[int] = None,
+    mes: Optional[int] = None,
+    prioridade: Optional[str] = None,
+    nome: Optional[str] = None,
+    cpf: Optional[str] = None,
+    exame: Optional[str] = None,
+) -> List[dict]:
+    """
+    Contagem dos exames da fila de agendamento agrupada no banco por exame,
+    mês de solicitação e prioridade. Mesmos filtros de listar_para_agendador.
+    """
+    if tipo_regulacao not in ("municipal", "estadual"):
+        return []
+
+    query = """
+        SELECT
+            COALESCE(e.nome, 'Sem Exame') AS exame_nome,
+            YEAR(p.data_solicitacao) AS ano,
+            MONTH(p.data_solicitacao) AS mes,
+            p.prioridade,
+            COUNT(*) AS total
+        FROM pedidos p
+        JOIN pacientes pa ON pa.id = p.paciente_id
+        LEFT JOIN exames e ON e.id = p.exame_id
+        LEFT JOIN consultas c ON c.id = p.consulta_id
+    """
 
-    query += " ORDER BY p.prioridade ASC, p.data_solicitacao DESC"
+    filtros, params = _filtros_agendador(tipo_regulacao, ano, mes, prioridade, nome, cpf, exame)
+    query += filtros + """
+          AND p.exame_id IS NOT NULL
+        GROUP BY e.id, e.nome, YEAR(p.data_solicitacao), MONTH(p.data_solicitacao), p.prioridade
+    """
 
     with mysql.get_cursor(dictionary=True) as (_, cursor):
         cursor.execute(query, tuple(params))
@@ -431,23 +770,58 @@ def listar_para_agendador(
 # ==========================================================
 # 🕓 Histórico de Pedido
 # ==========================================================
-def obter_historico(pedido_id: int) -> list[dict]:
-    query = """
+def obter_historico(pedido_id: int, incluir_arquivados: bool = False) -> list[dict]:
+    select = """
         SELECT h.id,
                h.status,
                h.descricao,
                h.criado_em,
                u.nome AS usuario_nome
-        FROM historico_pedidos h
+        FROM {tabela} h
         JOIN usuarios u ON u.id = h.criado_por
         WHERE h.pedido_id = %s
-        ORDER BY h.criado_em DESC
     """
+    query = select.format(tabela="historico_pedidos")
+    params: tuple = (pedido_id,)
+    if incluir_arquivados:
+        query += " UNION ALL " + select.format(tabela="historico_pedidos_arquivo")
+        params += (pedido_id,)
+    query += " ORDER BY criado_em DESC"
     with mysql.get_cursor(dictionary=True) as (_, cursor):
-        cursor.execute(query, (pedido_id,))
+        cursor.execute(query, params)
         return cursor.fetchall()
 
 
+def obter_historicos(pedido_ids: Sequence[int], incluir_arquivados: bool = False) -> dict[int, list[dict]]:
+    """Histórico de vários pedidos em uma consulta: {pedido_id: [eventos, mais recente primeiro]}."""
+    historicos: dict[int, list[dict]] = {pedido_id: [] for pedido_id in pedido_ids}
+    if not historicos:
+        return historicos
+    marcadores = ", ".join(["%s"] * len(historicos))
+    select = f"""
+        SELECT h.id,
+               h.pedido_id,
+               h.status,
+               h.descricao,
+               h.criado_em,
+               u.nome AS usuario_nome
+        FROM {{tabela}} h
+        JOIN usuarios u ON u.id = h.criado_por
+        WHERE h.pedido_id IN ({marcadores})
+    """
+    query = select.format(tabela="historico_pedidos")
+    params = tuple(historicos)
+    if incluir_arquivados:
+        query += " UNION ALL " + select.format(tabela="historico_pedidos_arquivo")
+        params += tuple(historicos)
+    query += " ORDER BY criado_em DESC"
+    with mysql.get_cursor(dictionary=True) as (_, cursor):
+        cursor.execute(query, params)
+        for evento in cursor.fetchall():
+            historicos[evento["pedido_id"]].append(evento)
+    return historicos
+
+
 # ==========================================================
 # 🔍 Listar por Status
 # ==========================================================
@@ -483,8 +857,32 @@ def listar_por_status(status: str) -> List[dict]:
 # ==========================================================
 # 👤 Listar pedidos de um paciente
 # ==========================================================
-def listar_por_paciente(paciente_id: int) -> list[dict]:
+def resumo_paciente_por_cpf(cpf: str) -> Optional[dict]:
+    """
+    Id do paciente e versão dos seus dados (quantidade de pedidos, última
+    atualização, último registro de histórico e atualização do cadastro), em
+    uma consulta pelos índices de CPF, paciente_id e pedido_id. None se o CPF
+    não existe.
+    """
     query = """
+        SELECT pa.id AS paciente_id,
+               COUNT(DISTINCT p.id) AS total,
+               MAX(p.data_atualizacao) AS atualizado_em,
+               MAX(h.id) AS ultimo_historico,
+               pa.atualizado_em AS paciente_atualizado_em
+        FROM pacientes pa
+        LEFT JOIN pedidos p ON p.paciente_id = pa.id
+        LEFT JOIN historico_pedidos h ON h.pedido_id = p.id
+        WHERE pa.cpf = %s
+        GROUP BY pa.id
+    """
+    with mysql.get_cursor(dictionary=True) as (_, cursor):
+        cursor.execute(query, (cpf,))
+        return cursor.fetchone()
+
+
+def listar_por_paciente(paciente_id: int, incluir_arquivados: bool = False) -> list[dict]:
+    select = """
         SELECT 
             p.id,
             p.status,
@@ -503,18 +901,20 @@ def listar_por_paciente(paciente_id: int) -> list[dict]:
             pac.cpf as paciente_cpf,
             COALESCE(e.nome, c.especialidade) as nome_solicitacao,
             u.nome as unidade_nome,
-            u_criacao.nome as usuario_criacao_nome
-        FROM pedidos p
+            u_criacao.nome as usuario_criacao_nome,
+            {arquivado} as arquivado
+        FROM {tabela} p
         JOIN pacientes pac ON p.paciente_id = pac.id
         LEFT JOIN exames e ON p.exame_id = e.id
         LEFT JOIN consultas c ON c.id = p.consulta_id
         JOIN unidades_saude u ON p.unidade_id = u.id
         JOIN usuarios u_criacao ON p.usuario_criacao = u_criacao.id
         WHERE p.paciente_id = %s
-        ORDER BY p.data_solicitacao DESC
     """
+    query = _unir_com_arquivo(select, incluir_arquivados) + " ORDER BY data_solicitacao DESC"
+    params = (paciente_id, paciente_id) if incluir_arquivados else (paciente_id,)
     with mysql.get_cursor(dictionary=True) as (_, cursor):
-        cursor.execute(query, (paciente_id,))
+        cursor.execute(query, params)
         return cursor.fetchall()
 
 
@@ -548,3 +948,97 @@ def listar_devolvidos_todas_unidades() -> List[dict]:
         cursor.execute(query, ("devolvido_medico_para_recepcao",))
         return cursor.fetchall()
 
+
+
+# ==========================================================
+# 📤 Exportação de pedidos filtrados (streaming)
+# ==========================================================
+COLUNAS_EXPORTACAO = [
+    ("id", "Pedido"),
+    ("data_solicitacao", "Data da solicitação"),
+    ("status", "Status"),
+    ("tipo_solicitacao", "Tipo"),
+    ("nome_solicitacao", "Exame/Consulta"),
+    ("tipo_regulacao", "Regulação"),
+    ("prioridade", "Prioridade"),
+    ("paciente_nome", "Paciente"),
+    ("paciente_cpf", "CPF"),
+    ("telefone_principal", "Telefone"),
+    ("unidade_nome", "Unidade"),
+    ("tentativas_contato", "Tentativas de contato"),
+    ("data_exame", "Data agendada"),
+    ("horario_exame", "Horário"),
+    ("local_exame", "Local"),
+    ("data_atualizacao", "Última atualização"),
+]
+
+
+def iterar_para_exportacao(
+    *,
+    status: Optional[Sequence[str]] = None,
+    tipo_regulacao: Optional[str] = None,
+    unidade_id: Optional[int] = None,
+    unidade_nome: Optional[str] = None,
+    categoria: Optional[str] = None,
+    cpf: Optional[str] = None,
+    nome: Optional[str] = None,
+    exame: Optional[str] = None,
+    ano: Optional[int] = None,
+    mes: Optional[int] = None,
+    prioridade: Optional[str] = None,
+) -> Iterator[dict]:
+    """
+    Percorre os pedidos que atendem aos mesmos filtros das filas (malote,
+    regulador, agendamento e recepção) usando cursor não bufferizado.
+    """
+    query = """
+        SELECT p.id,
+               p.data_solicitacao,
+               p.status,
+               p.tipo_solicitacao,
+               COALESCE(e.nome, c.especialidade) AS nome_solicitacao,
+               p.tipo_regulacao,
+               p.prioridade,
+               pa.nome AS paciente_nome,
+               pa.cpf AS paciente_cpf,
+               pa.telefone_principal,
+               un.nome AS unidade_nome,
+               p.tentativas_contato,
+               p.data_exame,
+               p.horario_exame,
+               p.local_exame,
+               p.data_atualizacao
+        FROM pedidos p
+        JOIN pacientes pa ON pa.id = p.paciente_id
+        LEFT JOIN exames e ON e.id = p.exame_id
+        LEFT JOIN consultas c ON c.id = p.consulta_id
+        JOIN unidades_saude un ON un.id = p.unidade_id
+        WHERE 1 = 1
+    """
+    params: list = []
+
+    if status:
+        query += f" AND p.status IN ({', '.join(['%s'] * len(status))})"
+        params.extend(status)
+    if tipo_regulacao:
+        query += " AND p.tipo_regulacao = %s"
+        params.append(tipo_regulacao)
+    if unidade_id:
+        query += " AND p.unidade_id = %s"
+        params.append(unidade_id)
+    filtros, params_filtros = _filtros_fila(unidade=unidade_nome, categoria=categoria, cpf=cpf, nome=nome)
+    query += filtros
+    params.extend(params_filtros)
+    if exame:
+        query += " AND COALESCE(e.nome, c.nome) LIKE %s"
+        params.append(f"%{exame}%")
+    periodo, params_periodo = _periodo_solicitacao(ano, mes)
+    query += periodo
+    params.extend(params_periodo)
+    if prioridade:
+        query += " AND p.prioridade = %s"
+        params.append(prioridade)
+
+    query += " ORDER BY p.data_solicitacao DESC"
+
+    return mysql.iterar_linhas(query, params)
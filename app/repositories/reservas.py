@@ -0,0 +1,185 @@
+from datetime import datetime
+from typing import List, Optional, Sequence
+
+from app.extensions import mysql
+from app.repositories.pedidos import status_fila_agendador, status_fila_medico
+
+
+# Atribuições avaliadas da esquerda para a direita: expira_em por último
+_RESERVAR = """
+    INSERT INTO reservas_pedidos (pedido_id, usuario_id, tipo_regulacao, reservado_em, expira_em)
+    VALUES (%s, %s, %s, NOW(), DATE_ADD(NOW(), INTERVAL %s SECOND))
+    ON DUPLICATE KEY UPDATE
+        usuario_id = IF(expira_em <= NOW(), VALUES(usuario_id), usuario_id),
+        tipo_regulacao = IF(expira_em <= NOW(), VALUES(tipo_regulacao), tipo_regulacao),
+        reservado_em = IF(expira_em <= NOW(), VALUES(reservado_em), reservado_em),
+        expira_em = IF(expira_em <= NOW(), VALUES(expira_em), expira_em)
+"""
+
+
+def _gravar_reserva(cursor, pedido_id: int, tipo_regulacao: str, usuario_id: int,
+                    duracao_segundos: int) -> Optional[int]:
+    """
+    Grava a reserva do candidato já travado. O INSERT é a garantia final: só
+    sobrescreve uma reserva existente se ela já expirou.
+    """
+    cursor.execute(_RESERVAR, (pedido_id, usuario_id, tipo_regulacao, duracao_segundos))
+    # Leitura atual (não do snapshot): a reserva ficou com este usuário?
+    cursor.execute(
+        "SELECT usuario_id FROM reservas_pedidos WHERE pedido_id = %s FOR SHARE",
+        (pedido_id,),
+    )
+    dono = cursor.fetchone()
+    return pedido_id if dono and dono["usuario_id"] == usuario_id else None
+
+
+def _reservar_candidato(cursor, consulta: str, params: Sequence, tipo_regulacao: str,
+                        usuario_id: int, duracao_segundos: int) -> Optional[int]:
+    """
+    Executa a `consulta` (SELECT p.id ... FOR UPDATE OF p SKIP LOCKED) e grava a
+    reserva do candidato. O SKIP LOCKED trava só a linha escolhida e pula as
+    que outra transação já está reservando, então vários usuários puxam da
+    mesma fila sem esperar uns pelos outros.
+    """
+    cursor.execute(consulta, tuple(params))
+    linha = cursor.fetchone()
+    if not linha:
+        return None
+    return _gravar_reserva(cursor, linha["id"], tipo_regulacao, usuario_id, duracao_segundos)
+
+
+def reservar_proximo(tipo_regulacao: str, usuario_id: int, duracao_segundos: int) -> Optional[int]:
+    """
+    Reserva o próximo pedido livre da fila do médico regulador e retorna o id
+    (None se a fila estiver vazia ou se outro regulador levou o candidato).
+    """
+    consulta = """
+        SELECT p.id
+        FROM pedidos p
+        LEFT JOIN reservas_pedidos r ON r.pedido_id = p.id AND r.expira_em > NOW()
+        WHERE p.status = %s AND r.pedido_id IS NULL
+        ORDER BY p.prioridade ASC, p.data_solicitacao ASC
+        LIMIT 1
+        FOR UPDATE OF p SKIP LOCKED
+    """
+    with mysql.get_cursor(dictionary=True) as (_, cursor):
+        return _reservar_candidato(
+            cursor, consulta, (status_fila_medico(tipo_regulacao),),
+            tipo_regulacao, usuario_id, duracao_segundos,
+        )
+
+
+def reservar_proxima_ligacao(tipo_regulacao: str, usuario_id: int, duracao_segundos: int) -> Optional[int]:
+    """
+    Reserva o próximo pedido da fila de agendamento a ser chamado: P1 antes de
+    P2, mais antigo primeiro, apenas os já liberados para nova tentativa
+    (proxima_tentativa_em vazia ou vencida).
+
+    A fila tem dois status; com "status IN (...)" o MySQL não consegue usar um
+    índice para o ORDER BY e ordenaria a fila inteira a cada reserva. Por isso
+    cada status é consultado à parte: com tipo e status fixos,
+    idx_pedidos_fila_ligacao já entrega as linhas na ordem de prioridade
+    e data, e a busca para no primeiro candidato livre. Fica o melhor dos dois;
+    o outro candidato só continua travado até o commit (os demais o pulam).
+    """
+    consulta = """
+        SELECT p.id, p.prioridade, p.data_solicitacao
+        FROM pedidos p
+        LEFT JOIN reservas_pedidos r ON r.pedido_id = p.id AND r.expira_em > NOW()
+        WHERE p.tipo_regulacao = %s AND p.status = %s
+          AND (p.proxima_tentativa_em IS NULL OR p.proxima_tentativa_em <= NOW())
+          AND r.pedido_id IS NULL
+        ORDER BY p.prioridade ASC, p.data_solicitacao ASC
+        LIMIT 1
+        FOR UPDATE OF p SKIP LOCKED
+    """
+    with mysql.get_cursor(dictionary=True) as (_, cursor):
+        candidatos = []
+        for status in status_fila_agendador(tipo_regulacao):
+            cursor.execute(consulta, (tipo_regulacao, status))
+            linha = cursor.fetchone()
+            if linha:
+                candidatos.append(linha)
+        if not candidatos:
+            return None
+        # Mesma ordem do ORDER BY (NULL antes; ENUM 'P1' < 'P2' também como texto)
+        melhor = min(candidatos, key=lambda c: (
+            c["prioridade"] is not None, c["prioridade"] or "",
+            c["data_solicitacao"] is not None, c["data_solicitacao"] or datetime.min,
+            c["id"],
+        ))
+        return _gravar_reserva(cursor, melhor["id"], tipo_regulacao, usuario_id, duracao_segundos)
+
+
+def obter_ativa_do_usuario(tipo_regulacao: str, usuario_id: int, status: Sequence[str]) -> Optional[int]:
+    """Pedido que o usuário já tem reservado nessa fila (e que continua nela)."""
+    marcadores = ", ".join(["%s"] * len(status))
+    query = f"""
+        SELECT r.pedido_id
+        FROM reservas_pedidos r
+        JOIN pedidos p ON p.id = r.pedido_id
+        WHERE r.usuario_id = %s AND r.tipo_regulacao = %s
+          AND r.expira_em > NOW() AND p.status IN ({marcadores})
+        ORDER BY r.reservado_em DESC
+        LIMIT 1
+    """
+    with mysql.get_cursor(dictionary=True) as (_, cursor):
+        cursor.execute(query, (usuario_id, tipo_regulacao, *status))
+        linha = cursor.fetchone()
+        return linha["pedido_id"] if linha else None
+
+
+def renovar(pedido_id: int, usuario_id: int, duracao_segundos: int) -> bool:
+    """Heartbeat: estende a reserva do próprio usuário, se ainda não expirou."""
+    query = """
+        UPDATE reservas_pedidos
+        SET expira_em = DATE_ADD(NOW(), INTERVAL %s SECOND)
+        WHERE pedido_id = %s AND usuario_id = %s AND expira_em > NOW()
+    """
+    with mysql.get_cursor() as (_, cursor):
+        cursor.execute(query, (duracao_segundos, pedido_id, usuario_id))
+        return cursor.rowcount > 0
+
+
+def remover_do_pedido(cursor, pedido_id: int) -> None:
+    """Remove a reserva do pedido (de qualquer usuário) no cursor de quem chama."""
+    cursor.execute("DELETE FROM reservas_pedidos WHERE pedido_id = %s", (pedido_id,))
+
+
+def liberar(pedido_id: int, usuario_id: Optional[int] = None) -> bool:
+    """Remove a reserva do pedido (apenas a do usuário, se informado)."""
+    query = "DELETE FROM reservas_pedidos WHERE pedido_id = %s"
+    params = [pedido_id]
+    if usuario_id is not None:
+        query += " AND usuario_id = %s"
+        params.append(usuario_id)
+    with mysql.get_cursor() as (_, cursor):
+        cursor.execute(query, tuple(params))
+        return cursor.rowcount > 0
+
+
+def obter(pedido_id: int) -> Optional[dict]:
+    """Reserva ainda válida do pedido, com o nome de quem reservou."""
+    query = """
+        SELECT r.pedido_id, r.usuario_id, u.nome AS usuario_nome, r.tipo_regulacao, r.expira_em
+        FROM reservas_pedidos r
+        JOIN usuarios u ON u.id = r.usuario_id
+        WHERE r.pedido_id = %s AND r.expira_em > NOW()
+    """
+    with mysql.get_cursor(dictionary=True) as (_, cursor):
+        cursor.execute(query, (pedido_id,))
+        return cursor.fetchone()
+
+
+def listar_ativas(tipo_regulacao: str) -> List[dict]:
+    query = """
+        SELECT r.pedido_id, r.usuario_id, u.nome AS usuario_nome, r.expira_em
+        FROM reservas_pedidos r
+        JOIN usuarios u ON u.id = r.usuario_id
+        WHERE r.tipo_regulacao = %s AND r.expira_em > NOW()
+        ORDER BY r.pedido_id
+    """
+    with mysql.get_cursor(dictionary=True) as (_, cursor):
+        cursor.execute(query, (tipo_regulacao,))
+        return cursor.fetchall()
+
@@ -105,6 +105,7 @@ SCHEMA_STATEMENTS = [
         data_entrega DATETIME NULL,
 
         tentativas_contato INT DEFAULT 0,
+        proxima_tentativa_em DATETIME NULL,
 
         FOREIGN KEY (paciente_id) REFERENCES pacientes(id),
         FOREIGN KEY (exame_id) REFERENCES exames(id),
@@ -196,7 +197,102 @@ SCHEMA_STATEMENTS = [
         FOREIGN KEY (user_id) REFERENCES usuarios(id) ON DELETE CASCADE,
         UNIQUE KEY uq_conversation_user (conversation_id, user_id)
     ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """,
+
     """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        tipo VARCHAR(64) NOT NULL,
+        chave_parametros CHAR(64) NOT NULL,
+        -- Igual a chave_parametros enquanto pendente/executando (NULL depois):
+        -- o UNIQUE garante um só job em andamento por tipo + parâmetros
+        chave_pendente CHAR(64) NULL,
+        parametros JSON NULL,
+        status ENUM('pendente', 'executando', 'concluido', 'erro') NOT NULL DEFAULT 'pendente',
+        resultado LONGTEXT NULL,
+        erro TEXT NULL,
+        criado_por INT NULL,
+        criado_em DATETIME DEFAULT CURRENT_TIMESTAMP,
+        iniciado_em DATETIME NULL,
+        -- Sinal de vida do worker que executa o job (renovado periodicamente)
+        sinal_em DATETIME NULL,
+        concluido_em DATETIME NULL,
+        expira_em DATETIME NULL,
+        INDEX idx_jobs_tipo_chave (tipo, chave_parametros, status, expira_em),
+        UNIQUE KEY uq_jobs_chave_pendente (chave_pendente),
+        INDEX idx_jobs_concluido_em (concluido_em),
+        FOREIGN KEY (criado_por) REFERENCES usuarios(id) ON DELETE SET NULL
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """,
 
-    
-]
\ No newline at end of file
+    # Versão por namespace dos caches em memória: cada worker compara a sua
+    # cópia com esta tabela para saber quando descartar (ver cache_service)
+    """
+    CREATE TABLE IF NOT EXISTS cache_versoes (
+        namespace VARCHAR(64) PRIMARY KEY,
+        versao BIGINT UNSIGNED NOT NULL DEFAULT 0,
+        atualizado_em DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """,
+
+    # Reservas temporárias (lease) da fila do médico regulador: quem está
+    # analisando cada pedido e até quando (ver app/repositories/reservas.py)
+    """
+    CREATE TABLE IF NOT EXISTS reservas_pedidos (
+        pedido_id INT PRIMARY KEY,
+        usuario_id INT NOT NULL,
+        tipo_regulacao ENUM('municipal', 'estadual') NOT NULL,
+        reservado_em DATETIME NOT NULL,
+        expira_em DATETIME NOT NULL,
+        INDEX idx_reservas_tipo_expira (tipo_regulacao, expira_em),
+        INDEX idx_reservas_usuario (usuario_id, tipo_regulacao),
+        FOREIGN KEY (pedido_id) REFERENCES pedidos(id) ON DELETE CASCADE,
+        FOREIGN KEY (usuario_id) REFERENCES usuarios(id) ON DELETE CASCADE
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+    """,
+
+    # Tabelas de arquivo: mesma estrutura e índices, sem chaves estrangeiras
+    # (ver app/repositories/arquivamento.py)
+    "CREATE TABLE IF NOT EXISTS pedidos_arquivo LIKE pedidos",
+    "CREATE TABLE IF NOT EXISTS historico_pedidos_arquivo LIKE historico_pedidos",
+    "CREATE TABLE IF NOT EXISTS tentativas_contato_arquivo LIKE tentativas_contato",
+    "CREATE TABLE IF NOT EXISTS messages_arquivo LIKE messages",
+    "CREATE TABLE IF NOT EXISTS attachments_arquivo LIKE attachments",
+]
+
+
+# Colunas acrescentadas depois da criação original das tabelas. O MySQL não
+# suporta "ADD COLUMN IF NOT EXISTS", então cada entrada é conferida em
+# information_schema antes do ALTER TABLE (ver MySQLConnector.ensure_schema).
+# Formato: (tabela, coluna, definição). A tabela de arquivo recebe a mesma
+# coluna para continuar espelhando a original.
+SCHEMA_COLUMNS = [
+    # Fila de ligações do agendador: quando o pedido pode ser chamado de novo
+    ("pedidos", "proxima_tentativa_em", "DATETIME NULL AFTER tentativas_contato"),
+    ("pedidos_arquivo", "proxima_tentativa_em", "DATETIME NULL AFTER tentativas_contato"),
+]
+
+
+# Índices secundários criados após as tabelas. O MySQL não suporta
+# "CREATE INDEX IF NOT EXISTS", então cada entrada é conferida em
+# information_schema antes de ser criada (ver MySQLConnector.ensure_schema).
+# Formato: (tabela, nome_do_indice, definição das colunas[, tipo]),
+# onde o tipo opcional é "FULLTEXT", "UNIQUE" etc.
+SCHEMA_INDEXES = [
+    # Séries do dashboard: janelas por data de solicitação e deltas por atualização
+    ("pedidos", "idx_pedidos_data_solicitacao", "(data_solicitacao)"),
+    ("pedidos", "idx_pedidos_data_atualizacao", "(data_atualizacao)"),
+    # Seleção dos lotes de arquivamento
+    ("pedidos", "idx_pedidos_status_atualizacao", "(status, data_atualizacao)"),
+    ("messages", "idx_messages_created_at", "(created_at)"),
+    # Fila de agendamento e pivô exame × mês: status + tipo + intervalo de datas
+    ("pedidos", "idx_pedidos_fila_agendamento", "(tipo_regulacao, status, data_solicitacao)"),
+    # Fila do médico regulador na ordem de atendimento (listagem e reserva do próximo)
+    ("pedidos", "idx_pedidos_fila_medico", "(status, prioridade, data_solicitacao)"),
+    # Próxima ligação: com tipo e status fixos, já na ordem prioridade + data
+    ("pedidos", "idx_pedidos_fila_ligacao", "(tipo_regulacao, status, prioridade, data_solicitacao)"),
+    # Busca de pacientes por trecho do nome (o CPF usa o índice UNIQUE por prefixo).
+    # Criado sem a lista de stopwords do InnoDB: com ela o ngram descarta todo
+    # bigrama com "a" ou "i" (ma, ar, ri, ia...) e "Maria" não seria encontrada
+    ("pacientes", "ft_pacientes_nome", "(nome) WITH PARSER ngram", "FULLTEXT"),
+]
@@ -0,0 +1,111 @@
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Optional
+
+from flask import current_app
+
+from app.repositories import pedidos as pedidos_repo
+from app.utils.cache import CacheTTL
+from app.utils.rate_limit import LimiteTaxa
+
+# ==========================================================
+# 🔎 Acompanhamento público de pedidos por CPF
+# ==========================================================
+# A página é aberta (sem login). Para aguentar varredura de CPFs:
+#  - limite de consultas por IP (balde de fichas);
+#  - resposta em cache por CPF, validada a cada consulta pela "versão" do
+#    paciente (quantidade de pedidos, última atualização, último histórico e
+#    atualização do cadastro), numa única consulta indexada. Qualquer mudança
+#    nos pedidos, no histórico ou no cadastro do paciente descarta a resposta;
+#    mudanças em pedidos de outros pacientes não mexem no cache deste CPF.
+
+_cache: Optional[CacheTTL] = None
+_limite: Optional[LimiteTaxa] = None
+_metricas: Counter = Counter()
+_lock = threading.Lock()
+
+
+def _contar(evento: str) -> None:
+    with _lock:
+        _metricas[evento] += 1
+
+
+def _cache_respostas() -> CacheTTL:
+    global _cache
+    if _cache is None:
+        config = current_app.config
+        _cache = CacheTTL(
+            max_itens=config["ACOMPANHAMENTO_CACHE_MAX_ITENS"],
+            ttl_segundos=config["ACOMPANHAMENTO_CACHE_TTL"],
+        )
+    return _cache
+
+
+def limite_atingido(ip: str) -> Optional[int]:
+    """Consome uma consulta do IP; retorna os segundos de espera se bloqueado."""
+    global _limite
+    if _limite is None:
+        config = current_app.config
+        _limite = LimiteTaxa(
+            config["ACOMPANHAMENTO_LIMITE_POR_IP"],
+            config["ACOMPANHAMENTO_LIMITE_JANELA_SEGUNDOS"],
+        )
+    if _limite.consumir(ip):
+        return None
+    _contar("bloqueadas")
+    return _limite.segundos_para_liberar(ip)
+
+
+def _hora(valor):
+    """TIME do MySQL chega como timedelta; o template usa strftime."""
+    if isinstance(valor, timedelta):
+        return (datetime.min + valor).time()
+    return valor
+
+
+def _carregar(paciente_id: int, incluir_arquivados: bool) -> list[dict]:
+    pedidos = pedidos_repo.listar_por_paciente(paciente_id, incluir_arquivados=incluir_arquivados)
+    historicos = pedidos_repo.obter_historicos(
+        [pedido["id"] for pedido in pedidos], incluir_arquivados=incluir_arquivados
+    )
+    for pedido in pedidos:
+        pedido["historico"] = historicos.get(pedido["id"], [])
+        pedido["horario_exame"] = _hora(pedido.get("horario_exame"))
+    return pedidos
+
+
+def consultar(cpf: str, incluir_arquivados: bool = False) -> Optional[list[dict]]:
+    """Pedidos do paciente com histórico; None se o CPF não tem cadastro."""
+    _contar("consultas")
+    resumo = pedidos_repo.resumo_paciente_por_cpf(cpf)
+    if not resumo:
+        _contar("cpf_nao_encontrado")
+        return None
+
+    cache = _cache_respostas()
+    chave = (cpf, incluir_arquivados)
+    versao = (
+        resumo["paciente_id"],
+        resumo["total"],
+        resumo["atualizado_em"],
+        resumo["ultimo_historico"],
+        resumo["paciente_atualizado_em"],
+    )
+    guardado = cache.get(chave)
+    if guardado and guardado[0] == versao:
+        _contar("cache_acertos")
+        return guardado[1]
+
+    _contar("cache_falhas")
+    pedidos = _carregar(resumo["paciente_id"], incluir_arquivados)
+    cache.set(chave, (versao, pedidos))
+    return pedidos
+
+
+def metricas() -> dict:
+    """Contadores deste processo (cada worker tem os seus)."""
+    with _lock:
+        dados = dict(_metricas)
+    dados["cache_itens"] = len(_cache) if _cache is not None else 0
+    return dados
@@ -1,11 +1,81 @@
 from datetime import datetime, date, time
 from typing import Optional
 
+from flask import current_app
+
 from app.domain.status import StatusPedido
 from app.extensions import mysql
 from app.repositories import pedidos as pedidos_repo
+from app.utils.cache import CacheTTL
+from . import cache_service, reservas_service
 from .pedidos_service import atualizar_status, registrar_historico
 
+# Pivô por (tipo, filtros); a versão de "pedidos" na chave descarta tudo a
+# cada mudança de status. O TTL só cobre o que não muda status (ex.: nomes).
+_cache_pivo = CacheTTL(max_itens=256, ttl_segundos=300)
+
+
+def pivo_exames_por_mes(tipo_regulacao: str, **filtros) -> tuple[dict, list[str]]:
+    """
+    Contagem P1/P2 dos exames da fila por mês de solicitação, agregada no banco.
+    Retorna ({exame: {"MM/AAAA": {"P1": n, "P2": n}}}, meses em ordem crescente).
+    """
+    chave = (tipo_regulacao, tuple(sorted(filtros.items())))
+    linhas = cache_service.obter_versionado(
+        _cache_pivo,
+        cache_service.PEDIDOS,
+        chave,
+        lambda: pedidos_repo.pivo_exames_por_mes(tipo_regulacao, **filtros),
+    )
+
+    dados: dict = {}
+    periodos = set()
+    for linha in linhas:
+        periodo = (linha["ano"], linha["mes"]) if linha["ano"] else (9999, 99)
+        periodos.add(periodo)
+        mes_label = f"{periodo[1]:02d}/{periodo[0]}" if linha["ano"] else "Sem data"
+        contagem = dados.setdefault(linha["exame_nome"], {}).setdefault(mes_label, {"P1": 0, "P2": 0})
+        prioridade = (linha["prioridade"] or "").upper()
+        if prioridade in contagem:
+            contagem[prioridade] += int(linha["total"])
+
+    meses_ordenados = [
+        f"{mes:02d}/{ano}" if ano != 9999 else "Sem data" for ano, mes in sorted(periodos)
+    ]
+    return dados, meses_ordenados
+
+
+# ==========================================================
+# 📞 Fila de ligações (próximo paciente a chamar)
+# ==========================================================
+def intervalo_nova_tentativa(resultado: str) -> int:
+    """Minutos até o pedido voltar à fila de ligações (0 = sem espera)."""
+    config = current_app.config
+    return {
+        "sem_contato": config["AGENDAMENTO_INTERVALO_SEM_CONTATO_MINUTOS"],
+        "outra": config["AGENDAMENTO_INTERVALO_SEM_CONTATO_MINUTOS"],
+        "recado": config["AGENDAMENTO_INTERVALO_RECADO_MINUTOS"],
+    }.get(resultado, 0)
+
+
+def proxima_ligacao(tipo_regulacao: str, usuario_id: int) -> Optional[dict]:
+    """
+    Reserva para o agendador o próximo paciente a chamar (P1 primeiro, mais
+    antigo primeiro, respeitando o intervalo entre tentativas) e retorna
+    {"reserva": ..., "pedido": ...}, ou None se ninguém pode ser chamado agora.
+    """
+    reserva = reservas_service.reservar_proximo(tipo_regulacao, usuario_id, fila="agendador")
+    if reserva is None:
+        return None
+    pedido = pedidos_repo.obter_para_ligacao(reserva["pedido_id"]) or {}
+    return {
+        "reserva": reservas_service.serializar(reserva),
+        "pedido": {
+            campo: valor.isoformat() if isinstance(valor, datetime) else valor
+            for campo, valor in pedido.items()
+        },
+    }
+
 
 def registrar_tentativa(
     pedido_id: int,
@@ -16,11 +86,32 @@ def registrar_tentativa(
     horario_exame: Optional[time],
     local_exame: Optional[str],
 ):
+    intervalo = intervalo_nova_tentativa(resultado)
+
     with mysql.get_cursor() as (_, cursor):
-        cursor.execute("SELECT status, tentativas_contato, tipo_regulacao FROM pedidos WHERE id = %s", (pedido_id,))
+        # FOR UPDATE: duas tentativas simultâneas no mesmo pedido ficam em fila
+        cursor.execute(
+            """
+            SELECT p.status, p.tentativas_contato, p.tipo_regulacao, p.proxima_tentativa_em,
+                   p.proxima_tentativa_em > NOW() AS em_espera,
+                   r.usuario_id AS reservado_por
+            FROM pedidos p
+            LEFT JOIN reservas_pedidos r ON r.pedido_id = p.id AND r.expira_em > NOW()
+            WHERE p.id = %s
+            FOR UPDATE OF p
+            """,
+            (pedido_id,),
+        )
         pedido = cursor.fetchone()
         if not pedido:
             raise ValueError("Pedido não encontrado.")
+        if pedido["reservado_por"] and pedido["reservado_por"] != usuario_id:
+            raise ValueError("Este paciente está sendo chamado por outro agendador.")
+        # O intervalo vale para novas tentativas sem sucesso; retorno do paciente sempre entra
+        if intervalo and pedido["em_espera"]:
+            raise ValueError(
+                f"Nova tentativa liberada a partir de {pedido['proxima_tentativa_em']:%d/%m/%Y %H:%M}."
+            )
 
         nova_tentativa = (pedido["tentativas_contato"] or 0) + 1
 
@@ -34,8 +125,13 @@ def registrar_tentativa(
         )
 
         cursor.execute(
-            "UPDATE pedidos SET tentativas_contato=%s WHERE id=%s",
-            (nova_tentativa, pedido_id),
+            """
+            UPDATE pedidos
+            SET tentativas_contato = %s,
+                proxima_tentativa_em = IF(%s > 0, DATE_ADD(NOW(), INTERVAL %s MINUTE), NULL)
+            WHERE id = %s
+            """,
+            (nova_tentativa, intervalo, intervalo, pedido_id),
         )
 
     if resultado == "contato_sucesso":
@@ -0,0 +1,292 @@
+import json
+import os
+import tempfile
+from datetime import datetime
+from typing import Callable, Iterable, Optional
+
+from flask import current_app
+
+from app.domain.status import StatusPedido
+from app.extensions import mysql
+
+try:  # Dependência opcional: sem numpy a seção de análises fica oculta
+    import numpy as np
+except ImportError:  # pragma: no cover - depende do ambiente
+    np = None
+
+
+def analytics_disponivel() -> bool:
+    return np is not None
+
+
+# ==========================================================
+# 🗃️ Snapshot colunar (exportação noturna)
+# ==========================================================
+# Os pedidos (inclusive arquivados), o histórico e as tentativas de contato
+# são gravados em um único .npz: uma coluna por array, datas em datetime64[s]
+# e textos com codificação por dicionário (códigos int32 + vocabulário).
+
+_CONSULTAS_SNAPSHOT = {
+    "pedidos": """
+        SELECT p.id, p.status, p.tipo_solicitacao,
+               COALESCE(e.nome, c.especialidade) AS solicitacao,
+               un.nome AS unidade, p.data_solicitacao, p.data_atualizacao
+        FROM {tabela} p
+        LEFT JOIN exames e ON e.id = p.exame_id
+        LEFT JOIN consultas c ON c.id = p.consulta_id
+        LEFT JOIN unidades_saude un ON un.id = p.unidade_id
+    """,
+    "historico": "SELECT pedido_id, status, criado_em FROM {tabela}",
+    "tentativas": "SELECT pedido_id, resultado, data_tentativa FROM {tabela}",
+}
+
+_TABELAS_SNAPSHOT = {
+    "pedidos": ("pedidos", "pedidos_arquivo"),
+    "historico": ("historico_pedidos", "historico_pedidos_arquivo"),
+    "tentativas": ("tentativas_contato", "tentativas_contato_arquivo"),
+}
+
+# Colunas de cada conjunto: (nome, tipo), onde tipo é "id", "data" ou "texto"
+_COLUNAS_SNAPSHOT = {
+    "pedidos": [
+        ("id", "id"), ("status", "texto"), ("tipo", "texto"), ("solicitacao", "texto"),
+        ("unidade", "texto"), ("data_solicitacao", "data"), ("data_atualizacao", "data"),
+    ],
+    "historico": [("pedido_id", "id"), ("status", "texto"), ("criado_em", "data")],
+    "tentativas": [("pedido_id", "id"), ("resultado", "texto"), ("data", "data")],
+}
+
+
+class _Dicionario:
+    """Codificação por dicionário de uma coluna de texto (None vira -1)."""
+
+    def __init__(self):
+        self.codigos: dict = {}
+
+    def codificar(self, valor) -> int:
+        if valor is None:
+            return -1
+        return self.codigos.setdefault(valor, len(self.codigos))
+
+    def vocabulario(self):
+        return np.array(list(self.codigos), dtype=str)
+
+
+def _colunas_de(linhas: Iterable[tuple], colunas: list) -> dict:
+    valores = [[] for _ in colunas]
+    dicionarios = {nome: _Dicionario() for nome, tipo in colunas if tipo == "texto"}
+
+    for linha in linhas:
+        for indice, (nome, tipo) in enumerate(colunas):
+            valor = linha[indice]
+            if tipo == "texto":
+                valor = dicionarios[nome].codificar(valor)
+            valores[indice].append(valor)
+
+    arrays = {}
+    for indice, (nome, tipo) in enumerate(colunas):
+        if tipo == "id":
+            arrays[nome] = np.array(valores[indice], dtype=np.int64)
+        elif tipo == "data":
+            arrays[nome] = np.array(valores[indice], dtype="datetime64[s]")
+        else:
+            arrays[nome] = np.array(valores[indice], dtype=np.int32)
+            arrays[f"{nome}__vocab"] = dicionarios[nome].vocabulario()
+    return arrays
+
+
+def _gravar_atomico(destino: str, escrever: Callable, sufixo: str) -> None:
+    """Grava em arquivo temporário no mesmo diretório e troca pelo destino (rename)."""
+    diretorio = os.path.dirname(os.path.abspath(destino))
+    os.makedirs(diretorio, exist_ok=True)
+    descritor, temporario = tempfile.mkstemp(dir=diretorio, suffix=sufixo)
+    try:
+        with os.fdopen(descritor, "wb") as arquivo:
+            escrever(arquivo)
+        os.replace(temporario, destino)
+    except BaseException:
+        os.unlink(temporario)
+        raise
+
+
+def caminho_metricas(caminho_snapshot: str) -> str:
+    """Métricas já calculadas, gravadas ao lado do snapshot (snapshot.metricas.json)."""
+    return os.path.splitext(caminho_snapshot)[0] + ".metricas.json"
+
+
+def exportar_snapshot(destino: Optional[str] = None) -> dict:
+    """
+    Gera o snapshot colunar lendo as tabelas em streaming e grava de forma
+    atômica (arquivo temporário + rename). Em seguida calcula as métricas e
+    grava o JSON que a página de relatórios lê: o cálculo com numpy fica
+    fora dos workers web. Retorna o total de linhas por conjunto.
+    """
+    if np is None:
+        raise RuntimeError("Snapshot de análises indisponível: instale o pacote numpy.")
+
+    destino = destino or current_app.config["ANALYTICS_SNAPSHOT_PATH"]
+    arrays = {"gerado_em": np.array(datetime.now(), dtype="datetime64[s]")}
+    totais = {}
+
+    for conjunto, consulta in _CONSULTAS_SNAPSHOT.items():
+        query = " UNION ALL ".join(consulta.format(tabela=t) for t in _TABELAS_SNAPSHOT[conjunto])
+        colunas = _colunas_de(mysql.iterar_linhas(query, dictionary=False), _COLUNAS_SNAPSHOT[conjunto])
+        for nome, array in colunas.items():
+            arrays[f"{conjunto}.{nome}"] = array
+        totais[conjunto] = len(colunas[_COLUNAS_SNAPSHOT[conjunto][0][0]])
+
+    _gravar_atomico(destino, lambda arquivo: np.savez_compressed(arquivo, **arrays), ".npz")
+
+    metricas = calcular_metricas(destino)
+    metricas["gerado_em"] = metricas["gerado_em"].isoformat()
+    conteudo = json.dumps(metricas, ensure_ascii=False).encode("utf-8")
+    _gravar_atomico(caminho_metricas(destino), lambda arquivo: arquivo.write(conteudo), ".json")
+    return totais
+
+
+# ==========================================================
+# 📐 Métricas vetorizadas sobre o snapshot
+# ==========================================================
+_cache: dict = {"mtime": None, "metricas": None}
+
+
+def _texto(snapshot, conjunto: str, coluna: str, valor: str) -> int:
+    """Código do valor no vocabulário da coluna (-2 se não existir)."""
+    vocabulario = snapshot[f"{conjunto}.{coluna}__vocab"]
+    posicoes = np.flatnonzero(vocabulario == valor)
+    return int(posicoes[0]) if posicoes.size else -2
+
+
+def _tempo_por_etapa(snapshot) -> list[dict]:
+    """Tempo (horas) entre um evento do histórico e o seguinte, por status de origem."""
+    pedido = snapshot["historico.pedido_id"]
+    criado = snapshot["historico.criado_em"]
+    status = snapshot["historico.status"]
+    vocabulario = snapshot["historico.status__vocab"]
+    if pedido.size < 2:
+        return []
+
+    ordem = np.lexsort((criado, pedido))
+    pedido, criado, status = pedido[ordem], criado[ordem], status[ordem]
+
+    mesmo_pedido = pedido[1:] == pedido[:-1]
+    horas = (criado[1:] - criado[:-1]).astype("timedelta64[s]").astype(np.float64) / 3600
+    validos = mesmo_pedido & ~np.isnat(criado[1:]) & ~np.isnat(criado[:-1]) & (status[:-1] >= 0)
+    etapa, horas = status[:-1][validos], horas[validos]
+    if etapa.size == 0:
+        return []
+
+    # Ordena por (etapa, duração) para extrair a mediana de cada grupo
+    ordem = np.lexsort((horas, etapa))
+    etapa, horas = etapa[ordem], horas[ordem]
+    codigos, inicio, quantidade = np.unique(etapa, return_index=True, return_counts=True)
+    soma = np.add.reduceat(horas, inicio)
+    mediana = horas[inicio + (quantidade - 1) // 2]
+
+    resultado = [
+        {
+            "etapa": str(vocabulario[codigo]),
+            "transicoes": int(qtd),
+            "media_horas": round(float(total / qtd), 1),
+            "mediana_horas": round(float(med), 1),
+        }
+        for codigo, qtd, total, med in zip(codigos, quantidade, soma, mediana)
+    ]
+    return sorted(resultado, key=lambda linha: linha["media_horas"], reverse=True)
+
+
+def _vazao_por_solicitacao_mes(snapshot, meses: int = 12) -> list[dict]:
+    """Pedidos solicitados e agendados por exame/especialidade e mês (últimos `meses`)."""
+    ids = snapshot["pedidos.id"]
+    solicitacao = snapshot["pedidos.solicitacao"]
+    vocabulario = snapshot["pedidos.solicitacao__vocab"]
+    limite = snapshot["gerado_em"].astype("datetime64[M]") - np.timedelta64(meses - 1, "M")
+
+    def _contar(codigos, datas):
+        mes = datas.astype("datetime64[M]")
+        validos = (codigos >= 0) & ~np.isnat(datas) & (mes >= limite)
+        chaves = np.stack([codigos[validos].astype(np.int64), mes[validos].astype(np.int64)])
+        if chaves.shape[1] == 0:
+            return {}
+        unicos, contagem = np.unique(chaves, axis=1, return_counts=True)
+        return {(int(c), int(m)): int(n) for (c, m), n in zip(unicos.T, contagem)}
+
+    solicitados = _contar(solicitacao, snapshot["pedidos.data_solicitacao"])
+
+    # Agendados: eventos de confirmação no histórico, ligados ao pedido por busca binária
+    confirmado = _texto(snapshot, "historico", "status", StatusPedido.AGENDAMENTO_CONFIRMADO.value)
+    eventos = snapshot["historico.status"] == confirmado
+    pedido_evento = snapshot["historico.pedido_id"][eventos]
+    codigos_evento = np.full(pedido_evento.shape, -1, dtype=np.int32)
+    if ids.size:
+        ordem = np.argsort(ids)
+        ids_ordenados, codigos_ordenados = ids[ordem], solicitacao[ordem]
+        posicao = np.searchsorted(ids_ordenados, pedido_evento).clip(max=ids.size - 1)
+        encontrados = ids_ordenados[posicao] == pedido_evento
+        codigos_evento[encontrados] = codigos_ordenados[posicao[encontrados]]
+    agendados = _contar(codigos_evento, snapshot["historico.criado_em"][eventos])
+
+    resultado = []
+    for codigo, mes in sorted(set(solicitados) | set(agendados), key=lambda c: (-c[1], c[0])):
+        resultado.append({
+            "solicitacao": str(vocabulario[codigo]),
+            "mes": str(np.datetime64(mes, "M")),
+            "solicitados": solicitados.get((codigo, mes), 0),
+            "agendados": agendados.get((codigo, mes), 0),
+        })
+    return resultado
+
+
+DIAS_SEMANA = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo"]
+
+
+def _sucesso_por_dia_semana(snapshot) -> list[dict]:
+    """Taxa de contato com sucesso por dia da semana da tentativa."""
+    datas = snapshot["tentativas.data"]
+    validas = ~np.isnat(datas)
+    # 1970-01-01 foi uma quinta-feira: +3 alinha segunda-feira ao índice 0
+    dia = (datas[validas].astype("datetime64[D]").astype(np.int64) + 3) % 7
+    sucesso = snapshot["tentativas.resultado"][validas] == _texto(snapshot, "tentativas", "resultado", "contato_sucesso")
+
+    total = np.bincount(dia, minlength=7)
+    com_sucesso = np.bincount(dia[sucesso], minlength=7)
+    return [
+        {
+            "dia": DIAS_SEMANA[indice],
+            "tentativas": int(total[indice]),
+            "sucesso": int(com_sucesso[indice]),
+            "taxa_sucesso": round(float(com_sucesso[indice]) / float(total[indice]) * 100, 1) if total[indice] else 0.0,
+        }
+        for indice in range(7)
+    ]
+
+
+def calcular_metricas(caminho: str) -> dict:
+    """Métricas do snapshot em `caminho` (cálculo com numpy; roda na exportação)."""
+    with np.load(caminho) as snapshot:
+        return {
+            "gerado_em": snapshot["gerado_em"].item(),
+            "tempo_por_etapa": _tempo_por_etapa(snapshot),
+            "vazao_mensal": _vazao_por_solicitacao_mes(snapshot),
+            "sucesso_dia_semana": _sucesso_por_dia_semana(snapshot),
+        }
+
+
+def obter_metricas(caminho: Optional[str] = None) -> Optional[dict]:
+    """
+    Métricas gravadas pela última exportação, relidas apenas quando o arquivo
+    muda (leitura de um JSON pequeno, sem numpy). None se ainda não houver.
+    """
+    caminho = caminho_metricas(caminho or current_app.config["ANALYTICS_SNAPSHOT_PATH"])
+    try:
+        mtime = os.path.getmtime(caminho)
+    except OSError:
+        return None
+
+    if _cache["mtime"] != mtime:
+        with open(caminho, encoding="utf-8") as arquivo:
+            metricas = json.load(arquivo)
+        metricas["gerado_em"] = datetime.fromisoformat(metricas["gerado_em"])
+        _cache["metricas"] = metricas
+        _cache["mtime"] = mtime
+    return _cache["metricas"]
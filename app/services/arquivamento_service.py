@@ -0,0 +1,59 @@
+import time
+from typing import Callable, Optional
+
+from flask import current_app
+
+from app.domain.status import StatusPedido
+from app.repositories import arquivamento as arquivamento_repo
+from app.services import cache_service
+
+# Pedidos nesses status não voltam mais para nenhuma fila
+STATUS_ENCERRADOS = (
+    StatusPedido.RETIRADO.value,
+    StatusPedido.CANCELADO_RECEPCAO.value,
+    StatusPedido.CANCELADO_MEDICO.value,
+)
+
+
+def _em_lotes(arquivar_lote: Callable[[], int], max_lotes: Optional[int], pausa: float) -> int:
+    """
+    Repete o arquivamento lote a lote até não restar nada (ou até `max_lotes`).
+    Cada lote é uma transação curta; a pausa entre lotes alivia o banco.
+    """
+    total = 0
+    lotes = 0
+    while max_lotes is None or lotes < max_lotes:
+        movidos = arquivar_lote()
+        total += movidos
+        lotes += 1
+        if movidos == 0:
+            break
+        if pausa:
+            time.sleep(pausa)
+    return total
+
+
+def arquivar_pedidos(dias: Optional[int] = None, tamanho_lote: Optional[int] = None, max_lotes: Optional[int] = None) -> int:
+    config = current_app.config
+    dias = dias or config["ARQUIVAMENTO_PEDIDOS_DIAS"]
+    tamanho_lote = tamanho_lote or config["ARQUIVAMENTO_TAMANHO_LOTE"]
+    total = _em_lotes(
+        lambda: arquivamento_repo.arquivar_lote_pedidos(STATUS_ENCERRADOS, dias, tamanho_lote),
+        max_lotes,
+        config["ARQUIVAMENTO_PAUSA_SEGUNDOS"],
+    )
+    if total:
+        # Uma invalidação por execução, não por lote: tira das agregações os pedidos arquivados
+        cache_service.invalidar(cache_service.PEDIDOS)
+    return total
+
+
+def arquivar_mensagens(dias: Optional[int] = None, tamanho_lote: Optional[int] = None, max_lotes: Optional[int] = None) -> int:
+    config = current_app.config
+    dias = dias or config["ARQUIVAMENTO_MENSAGENS_DIAS"]
+    tamanho_lote = tamanho_lote or config["ARQUIVAMENTO_TAMANHO_LOTE"]
+    return _em_lotes(
+        lambda: arquivamento_repo.arquivar_lote_mensagens(dias, tamanho_lote),
+        max_lotes,
+        config["ARQUIVAMENTO_PAUSA_SEGUNDOS"],
+    )
@@ -0,0 +1,36 @@
+from typing import Any, Callable, Hashable
+
+from flask import current_app
+
+from app.repositories import cache_versoes as cache_versoes_repo
+from app.utils.cache import CacheTTL
+
+# Namespaces de invalidação
+PEDIDOS = "pedidos"
+REFERENCIA = "referencia"
+USUARIOS = "usuarios"
+PRESENCA = "presenca"
+
+# Cópia local das versões: evita uma consulta por requisição, ao custo de
+# alguns segundos de defasagem entre workers
+_versoes = CacheTTL(max_itens=64, ttl_segundos=2)
+
+
+def versao(namespace: str) -> int:
+    """Versão atual do namespace (relida do banco no máximo a cada CACHE_VERSAO_TTL)."""
+    return _versoes.get_or_set(
+        namespace,
+        lambda: cache_versoes_repo.obter(namespace),
+        current_app.config.get("CACHE_VERSAO_TTL", 2),
+    )
+
+
+def invalidar(namespace: str) -> None:
+    """Descarta, em todos os workers, os caches versionados pelo namespace."""
+    cache_versoes_repo.incrementar(namespace)
+    _versoes.invalidar(namespace)
+
+
+def obter_versionado(cache: CacheTTL, namespace: str, chave: Hashable, fabrica: Callable[[], Any]) -> Any:
+    """get_or_set em `cache` com a versão do namespace embutida na chave."""
+    return cache.get_or_set((versao(namespace), chave), fabrica)
@@ -0,0 +1,122 @@
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+from flask import current_app
+
+from app.extensions import mysql, socketio
+from app.repositories import pedidos as pedidos_repo
+from app.services import cache_service
+
+# ==========================================================
+# 📡 Avisos em tempo real de mudanças nas filas (Socket.IO)
+# ==========================================================
+# Cada fila tem uma sala. A cada transição de status, comparamos em quais
+# salas o pedido estava antes e em quais está depois, e cada sala recebe só
+# a diferença: "adicionado", "removido" ou "atualizado", com a linha resumida.
+
+EVENTO = "fila_alterada"
+TIPOS_REGULACAO = ("municipal", "estadual")
+
+
+def sala_malote() -> str:
+    return "fila:malote"
+
+
+def sala_regulador(tipo: str) -> str:
+    return f"fila:regulador:{tipo}"
+
+
+def sala_agendador(tipo: str) -> str:
+    return f"fila:agendador:{tipo}"
+
+
+def sala_recepcao(unidade_id: int) -> str:
+    return f"fila:recepcao:{unidade_id}"
+
+
+def salas_do_pedido(resumo: Optional[dict]) -> set:
+    """Salas das filas em que o pedido aparece no estado `resumo`."""
+    if not resumo:
+        return set()
+    status = resumo["status"]
+    tipo = resumo.get("tipo_regulacao")
+    salas = {sala_recepcao(resumo["unidade_id"])}
+    if status in pedidos_repo.STATUS_FILA_MALOTE:
+        salas.add(sala_malote())
+    if tipo in TIPOS_REGULACAO:
+        if status == pedidos_repo.status_fila_medico(tipo):
+            salas.add(sala_regulador(tipo))
+        if status in pedidos_repo.status_fila_agendador(tipo):
+            salas.add(sala_agendador(tipo))
+    return salas
+
+
+def sala_permitida(usuario, fila: str, tipo: Optional[str] = None, unidade_id: Optional[int] = None) -> Optional[str]:
+    """Sala pedida pelo painel, se o papel do usuário pode vê-la (None caso contrário)."""
+    role = usuario.role
+    if fila == "malote" and role in ("malote", "admin"):
+        return sala_malote()
+    if fila == "regulador" and tipo in TIPOS_REGULACAO and role in ("medico_regulador", "malote", "admin"):
+        return sala_regulador(tipo)
+    if fila == "agendador" and tipo in TIPOS_REGULACAO and role in (f"agendador_{tipo}", "admin"):
+        return sala_agendador(tipo)
+    if fila == "recepcao":
+        if role == "admin" and str(unidade_id or "").isdigit():
+            return sala_recepcao(int(unidade_id))
+        if role == "recepcao" and usuario.unidade_id:
+            return sala_recepcao(usuario.unidade_id)
+    return None
+
+
+def _linha(resumo: dict) -> dict:
+    data = resumo.get("data_solicitacao")
+    return {
+        "id": resumo["id"],
+        "status": resumo["status"],
+        "prioridade": resumo.get("prioridade"),
+        "tipo_regulacao": resumo.get("tipo_regulacao"),
+        "tipo_solicitacao": resumo.get("tipo_solicitacao"),
+        "tentativas_contato": resumo.get("tentativas_contato") or 0,
+        "unidade_id": resumo["unidade_id"],
+        "unidade_nome": resumo.get("unidade_nome"),
+        "paciente_nome": resumo.get("paciente_nome"),
+        "paciente_cpf": resumo.get("paciente_cpf"),
+        "nome_solicitacao": resumo.get("nome_solicitacao"),
+        "data_solicitacao": data.isoformat() if data else None,
+    }
+
+
+def notificar(antes: Optional[dict], depois: Optional[dict]) -> None:
+    """Emite o delta do pedido para cada fila afetada (falhas só vão para o log)."""
+    salas_antes, salas_depois = salas_do_pedido(antes), salas_do_pedido(depois)
+    try:
+        for sala in salas_antes - salas_depois:
+            socketio.emit(EVENTO, {"acao": "removido", "pedido_id": antes["id"]}, to=sala)
+        if depois is None:
+            return
+        linha = _linha(depois)
+        for sala in salas_depois:
+            acao = "atualizado" if sala in salas_antes else "adicionado"
+            socketio.emit(EVENTO, {"acao": acao, "pedido_id": depois["id"], "linha": linha}, to=sala)
+    except Exception:  # o aviso é acessório: nunca derruba a transição
+        current_app.logger.exception("Falha ao notificar filas do pedido %s", (depois or antes)["id"])
+
+
+@contextmanager
+def acompanhar(pedido_id: int) -> Iterator[Any]:
+    """
+    Envolve uma alteração do pedido numa única transação: trava o pedido e lê
+    o resumo antes, entrega o cursor para a alteração e lê o resumo depois.
+    Só após o commit descarta os caches de "pedidos" e notifica as filas com
+    a diferença (uma transição concorrente espera a trava, então o delta não
+    mistura estados).
+
+        with filas_tempo_real.acompanhar(pedido_id) as cursor:
+            pedidos_repo.gravar_campos(cursor, pedido_id, campos)
+    """
+    with mysql.get_cursor() as (_, cursor):
+        antes = pedidos_repo.ler_resumo_fila(cursor, pedido_id, bloquear=True)
+        yield cursor
+        depois = pedidos_repo.ler_resumo_fila(cursor, pedido_id)
+    cache_service.invalidar(cache_service.PEDIDOS)
+    notificar(antes, depois)
@@ -0,0 +1,288 @@
+import time
+from datetime import date, datetime
+from typing import IO, Any, Dict, List, Optional, Tuple
+
+from flask import current_app
+from mysql.connector import Error as ErroMySQL
+
+from app.extensions import mysql
+from app.services import pacientes_service, pedidos_service, referencia_service
+from app.utils.importacao import ler_planilha, normalizar_cabecalho
+
+# ==========================================================
+# 📥 Importação de pedidos a partir de planilhas das unidades
+# ==========================================================
+# Para unidades que juntaram pedidos em papel/planilha (ex.: queda do sistema).
+# O arquivo é lido em streaming; cada linha é validada contra os dados de
+# referência em cache (sem consultar o banco) e as válidas são gravadas em
+# lotes de IMPORTACAO_TAMANHO_LOTE, uma transação por lote. Se um lote falha
+# no banco, as linhas dele são regravadas uma a uma para achar a culpada.
+# As linhas recusadas voltam num relatório (linha da planilha + motivos).
+
+# Coluna do pedido -> nomes aceitos no cabeçalho (já normalizados)
+COLUNAS = {
+    "cpf": ("cpf", "cpf_paciente"),
+    "nome": ("nome", "nome_paciente", "paciente"),
+    "data_nascimento": ("data_nascimento", "data_de_nascimento", "nascimento"),
+    "telefone_principal": ("telefone_principal", "telefone", "celular"),
+    "telefone_secundario": ("telefone_secundario", "telefone_2"),
+    "email": ("email", "e_mail"),
+    "cartao_sus": ("cartao_sus", "cns"),
+    "endereco": ("endereco",),
+    "unidade": ("unidade", "unidade_id", "unidade_saude"),
+    "tipo_solicitacao": ("tipo_solicitacao", "tipo"),
+    "exame": ("exame", "exame_id"),
+    "consulta": ("consulta", "consulta_id", "especialidade"),
+    "observacoes": ("observacoes", "observacao"),
+}
+
+# Colunas do relatório de erros (exportacao.gerar_csv)
+COLUNAS_RELATORIO = [("linha", "Linha"), ("cpf", "CPF"), ("nome", "Nome"), ("erros", "Erros")]
+
+
+def _texto(valor: Any) -> str:
+    """Valor da célula como texto (o XLSX devolve números e datas tipados)."""
+    if valor is None:
+        return ""
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return str(valor).strip()
+
+
+def _data(valor: Any) -> Tuple[Optional[str], bool]:
+    """(data em YYYY-MM-DD ou None, válida?) aceitando dd/mm/aaaa e yyyy-mm-dd."""
+    if isinstance(valor, datetime):
+        return valor.date().isoformat(), True
+    if isinstance(valor, date):
+        return valor.isoformat(), True
+    texto = _texto(valor)
+    if not texto:
+        return None, True
+    for formato in ("%d/%m/%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(texto, formato).date().isoformat(), True
+        except ValueError:
+            continue
+    return None, False
+
+
+class _Referencias:
+    """Índices por id e por nome normalizado, montados uma vez por importação."""
+
+    def __init__(self):
+        self.exames = self._indice("exames", "nome")
+        self.consultas = self._indice("consultas", "especialidade")
+        self.unidades = self._indice("unidades", "nome", "codigo")
+
+    @staticmethod
+    def _indice(tipo: str, *campos: str) -> Dict[str, int]:
+        indice = {}
+        for item in referencia_service.listar(tipo):
+            for campo in campos:
+                if item.get(campo):
+                    indice.setdefault(normalizar_cabecalho(item[campo]), item["id"])
+            indice[str(item["id"])] = item["id"]
+        return indice
+
+    @staticmethod
+    def resolver(indice: Dict[str, int], valor: Any) -> Optional[int]:
+        texto = _texto(valor)
+        return indice.get(texto) or indice.get(normalizar_cabecalho(texto))
+
+
+def _campo(linha: Dict[str, Any], nome: str) -> Any:
+    for coluna in COLUNAS[nome]:
+        if coluna in linha and _texto(linha[coluna]):
+            return linha[coluna]
+    return None
+
+
+def _validar_linha(linha: Dict[str, Any], referencias: _Referencias,
+                   unidade_fixa: Optional[int], unidade_padrao: Optional[int]) -> Tuple[Optional[dict], List[str]]:
+    """Monta o item do lote (paciente, pedido, descrição) ou devolve os erros."""
+    erros = []
+
+    cpf_bruto = _campo(linha, "cpf")
+    cpf = "".join(filter(str.isdigit, _texto(cpf_bruto)))
+    if cpf and len(cpf) < 11 and not isinstance(cpf_bruto, str):
+        cpf = cpf.zfill(11)  # célula numérica perde os zeros à esquerda
+    if not cpf:
+        erros.append("CPF do paciente é obrigatório.")
+    elif len(cpf) != 11:
+        erros.append("CPF deve ter 11 dígitos.")
+
+    nome = _texto(_campo(linha, "nome"))
+    if not nome:
+        erros.append("Nome do paciente é obrigatório.")
+
+    data_nascimento, data_valida = _data(_campo(linha, "data_nascimento"))
+    if not data_valida:
+        erros.append("Data de nascimento em formato inválido (use dd/mm/aaaa ou yyyy-mm-dd).")
+
+    unidade_bruta = _campo(linha, "unidade")
+    unidade_id = referencias.resolver(referencias.unidades, unidade_bruta) if unidade_bruta is not None else None
+    if unidade_bruta is not None and unidade_id is None:
+        erros.append(f"Unidade não encontrada ou inativa: {_texto(unidade_bruta)}.")
+    elif unidade_fixa is not None:
+        if unidade_id is not None and unidade_id != unidade_fixa:
+            erros.append("Unidade diferente da unidade do usuário.")
+        unidade_id = unidade_fixa
+    elif unidade_id is None:
+        unidade_id = unidade_padrao
+        if unidade_id is None:
+            erros.append("Informe a unidade do pedido.")
+
+    exame_bruto, consulta_bruta = _campo(linha, "exame"), _campo(linha, "consulta")
+    tipo = normalizar_cabecalho(_texto(_campo(linha, "tipo_solicitacao")))
+    if not tipo:
+        tipo = "consulta" if consulta_bruta is not None and exame_bruto is None else "exame"
+
+    exame_id = consulta_id = None
+    if tipo == "exame":
+        if exame_bruto is None:
+            erros.append("Informe o exame solicitado.")
+        else:
+            exame_id = referencias.resolver(referencias.exames, exame_bruto)
+            if exame_id is None:
+                erros.append(f"Exame não encontrado: {_texto(exame_bruto)}.")
+    elif tipo == "consulta":
+        if consulta_bruta is None:
+            erros.append("Informe a consulta solicitada.")
+        else:
+            consulta_id = referencias.resolver(referencias.consultas, consulta_bruta)
+            if consulta_id is None:
+                erros.append(f"Consulta não encontrada ou inativa: {_texto(consulta_bruta)}.")
+    else:
+        erros.append("Tipo de solicitação deve ser exame ou consulta.")
+
+    if erros:
+        return None, erros
+
+    opcionais = ("telefone_principal", "telefone_secundario", "email", "cartao_sus", "endereco")
+    paciente = {campo: _texto(_campo(linha, campo)) or None for campo in opcionais}
+    paciente.update({"nome": nome, "cpf": cpf, "data_nascimento": data_nascimento, "unidade_id": unidade_id})
+    return {
+        "paciente": paciente,
+        "pedido": {
+            "exame_id": exame_id,
+            "consulta_id": consulta_id,
+            "unidade_id": unidade_id,
+            "observacoes": _texto(_campo(linha, "observacoes")) or None,
+        },
+        "descricao": f"Pedido de {tipo} importado de planilha.",
+    }, []
+
+
+def _erro(numero: int, linha: Dict[str, Any], erros: List[str]) -> dict:
+    return {
+        "linha": numero,
+        "cpf": _texto(_campo(linha, "cpf")),
+        "nome": _texto(_campo(linha, "nome")),
+        "erros": " ".join(erros),
+    }
+
+
+def _gravar_lote(lote: List[Tuple[int, Dict[str, Any], dict]], usuario_id: int) -> Tuple[int, List[dict]]:
+    """Grava o lote numa transação; se o banco recusar, isola as linhas com problema."""
+    try:
+        with mysql.get_cursor() as (_, cursor):
+            pedidos_service.gravar_pedidos_em_lote(cursor, [item for _, _, item in lote], usuario_id)
+        return len(lote), []
+    except ErroMySQL:
+        current_app.logger.warning(
+            "Lote da importação recusado pelo banco; regravando linha a linha",
+            extra={"evento": "importacao.lote_recusado", "linhas": len(lote)},
+        )
+
+    gravados, erros = 0, []
+    for numero, linha, item in lote:
+        try:
+            # Mesmo caminho do lote (upsert que não apaga campos vazios), uma linha por vez
+            with mysql.get_cursor() as (_, cursor):
+                pedidos_service.gravar_pedidos_em_lote(cursor, [item], usuario_id)
+            gravados += 1
+        except ErroMySQL as erro:
+            erros.append(_erro(numero, linha, [f"Falha ao gravar no banco: {erro.msg}"]))
+    return gravados, erros
+
+
+def importar_pedidos(
+    arquivo: IO[bytes],
+    formato: str,
+    usuario_id: int,
+    unidade_fixa: Optional[int] = None,
+    unidade_padrao: Optional[int] = None,
+    tamanho_lote: Optional[int] = None,
+    simular: bool = False,
+) -> dict:
+    """
+    Importa os pedidos da planilha. `unidade_fixa` (recepção) vale para todas
+    as linhas; `unidade_padrao` só para as linhas sem coluna de unidade. Com
+    `simular`, só valida. Arquivo ilegível gera ValueError (os lotes já
+    gravados até ali permanecem).
+
+    Retorna {"linhas", "importados", "erros": [{"linha", "cpf", "nome",
+    "erros"}], "lotes", "segundos", "simulacao"}.
+    """
+    config = current_app.config
+    tamanho_lote = tamanho_lote or config["IMPORTACAO_TAMANHO_LOTE"]
+    max_linhas = config["IMPORTACAO_MAX_LINHAS"]
+    inicio = time.perf_counter()
+
+    referencias = _Referencias()
+    total = importados = lotes = 0
+    erros: List[dict] = []
+    lote: List[Tuple[int, Dict[str, Any], dict]] = []
+
+    def descarregar() -> None:
+        nonlocal importados, lotes
+        if lote and not simular:
+            gravados, erros_lote = _gravar_lote(lote, usuario_id)
+            importados += gravados
+            erros.extend(erros_lote)
+            lotes += 1
+        elif lote:
+            importados += len(lote)
+        lote.clear()
+
+    for numero, linha in ler_planilha(arquivo, formato):
+        if total >= max_linhas:
+            erros.append(_erro(numero, {}, [f"Limite de {max_linhas} linhas por arquivo atingido; o restante não foi importado."]))
+            break
+        total += 1
+        item, erros_linha = _validar_linha(linha, referencias, unidade_fixa, unidade_padrao)
+        if erros_linha:
+            erros.append(_erro(numero, linha, erros_linha))
+            continue
+        lote.append((numero, linha, item))
+        if len(lote) >= tamanho_lote:
+            descarregar()
+    descarregar()
+    erros.sort(key=lambda erro: erro["linha"])  # falhas de banco chegam depois
+
+    if importados and not simular:
+        # Um descarte de cache para a importação inteira, não um por pedido; as
+        # filas mostram os novos pedidos na próxima atualização das telas
+        pacientes_service.apos_gravar_cadastro("atualizado")
+
+    segundos = round(time.perf_counter() - inicio, 2)
+    current_app.logger.info(
+        "Importação de pedidos concluída",
+        extra={
+            "evento": "importacao.pedidos",
+            "linhas": total,
+            "importados": importados,
+            "recusados": len(erros),
+            "lotes": lotes,
+            "segundos": segundos,
+            "simulacao": simular,
+        },
+    )
+    return {
+        "linhas": total,
+        "importados": importados,
+        "erros": erros,
+        "lotes": lotes,
+        "segundos": segundos,
+        "simulacao": simular,
+    }
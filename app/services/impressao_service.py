@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+from typing import Iterator, Sequence
+
+from flask import render_template, request
+
+from app.repositories import pedidos as pedidos_repo
+from app.services import cache_service
+from app.utils.pdf import gerar_pdf
+
+# ==========================================================
+# 🖨️ Folhas de agendamento em lote (um PDF para vários pedidos)
+# ==========================================================
+# Os pedidos vêm numa consulta só (já com paciente, exame/consulta e unidade).
+# O HTML de cada folha sai do cache de fragmentos (por versão: data_atualizacao
+# do pedido, atualizado_em do paciente, versão das referências e dia da
+# impressão); o lote inteiro é diagramado numa passada só. Páginas diagramadas
+# não ficam em cache: o Document do WeasyPrint não tem tamanho previsível.
+
+
+def carregar_folhas(pedido_ids: Sequence[int]) -> list[dict]:
+    """Pedidos prontos para a folha, na ordem pedida (inexistentes ficam de fora)."""
+    pedidos = pedidos_repo.obter_para_impressao(pedido_ids)
+    for pedido in pedidos:
+        if isinstance(pedido.get("horario_exame"), timedelta):
+            pedido["horario_exame"] = (datetime.min + pedido["horario_exame"]).time()
+    return pedidos
+
+
+def versao_folha(pedido: dict) -> list:
+    """O que muda o conteúdo da folha: pedido, cadastro do paciente e nomes de referência."""
+    return [
+        pedido["data_atualizacao"],
+        pedido["paciente_atualizado_em"],
+        cache_service.versao(cache_service.REFERENCIA),
+    ]
+
+
+def _data_impressao() -> str:
+    return datetime.now().strftime("%d/%m/%Y")
+
+
+def renderizar_html(pedidos: Sequence[dict], pdf_indisponivel: bool = False, modo_pdf: bool = False) -> str:
+    """Todas as folhas numa página só (para o navegador ou para o PDF)."""
+    return render_template(
+        "reception/folhas_lote.html",
+        pedidos=pedidos,
+        data_impressao=_data_impressao(),
+        versao_folha=versao_folha,
+        modo_pdf=modo_pdf,
+        pdf_indisponivel=pdf_indisponivel,
+    )
+
+
+def gerar_pdf_folhas(pedidos: Sequence[dict]) -> Iterator[bytes]:
+    """
+    Monta o HTML do lote e devolve o PDF em blocos. Layout e escrita
+    acontecem durante o streaming.
+    """
+    return gerar_pdf(renderizar_html(pedidos, modo_pdf=True), request.url_root)
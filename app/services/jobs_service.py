@@ -0,0 +1,220 @@
+import hashlib
+import json
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Iterable, Optional
+
+import gevent
+from flask import current_app
+from gevent.pool import Pool
+
+from app.repositories import jobs as jobs_repo
+
+# Funções executáveis em segundo plano, registradas por tipo de job.
+# Cada função recebe o dicionário de parâmetros e devolve um resultado
+# serializável (dict/list com tipos do MySQL).
+_REGISTRO: dict[str, Callable[[dict], Any]] = {}
+# Parâmetros aceitos por tipo: o que vier fora da lista é recusado, para que
+# a chave de reaproveitamento não dependa de JSON arbitrário do cliente
+_PARAMETROS: dict[str, frozenset[str]] = {}
+# Valores aceitos nos parâmetros (nada de listas/objetos aninhados)
+_TIPOS_VALOR = (str, int, float, bool, type(None))
+
+_pool: Optional[Pool] = None
+
+
+class FilaDeJobsCheia(RuntimeError):
+    """Todos os slots do pool de jobs deste worker estão ocupados."""
+
+
+def registrar_tipo(tipo: str, funcao: Callable[[dict], Any], parametros: Iterable[str] = ()) -> None:
+    _REGISTRO[tipo] = funcao
+    _PARAMETROS[tipo] = frozenset(parametros)
+
+
+def tipos_registrados() -> set[str]:
+    return set(_REGISTRO)
+
+
+def validar_parametros(tipo: str, parametros: dict) -> dict:
+    """Confere os parâmetros contra a lista do tipo; ValueError se houver algo fora dela."""
+    if not isinstance(parametros, dict):
+        raise ValueError("Os parâmetros do job devem ser um objeto JSON.")
+    desconhecidos = set(parametros) - _PARAMETROS.get(tipo, frozenset())
+    if desconhecidos:
+        raise ValueError(f"Parâmetros não aceitos para {tipo}: {', '.join(sorted(map(str, desconhecidos)))}")
+    invalidos = [nome for nome, valor in parametros.items() if not isinstance(valor, _TIPOS_VALOR)]
+    if invalidos:
+        raise ValueError(f"Valores inválidos para: {', '.join(sorted(invalidos))}")
+    return parametros
+
+
+def _obter_pool() -> Pool:
+    """Pool de greenlets limitado: no máximo JOBS_MAX_WORKERS jobs simultâneos por worker."""
+    global _pool
+    if _pool is None:
+        _pool = Pool(current_app.config.get("JOBS_MAX_WORKERS", 2))
+    return _pool
+
+
+# ==========================================================
+# 🔁 Serialização do resultado (preserva datas e decimais)
+# ==========================================================
+def _codificar(valor: Any) -> Any:
+    if isinstance(valor, datetime):
+        return {"__tipo__": "datetime", "valor": valor.isoformat()}
+    if isinstance(valor, date):
+        return {"__tipo__": "date", "valor": valor.isoformat()}
+    if isinstance(valor, time):
+        return {"__tipo__": "time", "valor": valor.isoformat()}
+    if isinstance(valor, timedelta):
+        return {"__tipo__": "timedelta", "valor": valor.total_seconds()}
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (bytes, bytearray)):
+        return valor.decode("utf-8", errors="replace")
+    raise TypeError(f"Tipo não serializável: {type(valor)!r}")
+
+
+def _decodificar(objeto: dict) -> Any:
+    tipo = objeto.get("__tipo__")
+    if tipo == "datetime":
+        return datetime.fromisoformat(objeto["valor"])
+    if tipo == "date":
+        return date.fromisoformat(objeto["valor"])
+    if tipo == "time":
+        return time.fromisoformat(objeto["valor"])
+    if tipo == "timedelta":
+        return timedelta(seconds=objeto["valor"])
+    return objeto
+
+
+def serializar_resultado(resultado: Any) -> str:
+    return json.dumps(resultado, default=_codificar, ensure_ascii=False)
+
+
+def desserializar_resultado(texto: Optional[str]) -> Any:
+    if not texto:
+        return None
+    return json.loads(texto, object_hook=_decodificar)
+
+
+def chave_parametros(tipo: str, parametros: dict) -> str:
+    bruto = json.dumps({"tipo": tipo, "parametros": parametros}, sort_keys=True, default=str)
+    return hashlib.sha256(bruto.encode("utf-8")).hexdigest()
+
+
+# ==========================================================
+# 🚀 Submissão e execução
+# ==========================================================
+def submeter(tipo: str, parametros: Optional[dict] = None, usuario_id: Optional[int] = None, *, forcar: bool = False) -> dict:
+    """
+    Agenda um job. Se já houver um resultado válido (não expirado) ou um job
+    em andamento para os mesmos parâmetros, ele é reaproveitado; `forcar`
+    ignora só o resultado pronto, nunca dispara um segundo job em andamento.
+    Parâmetros fora da lista do tipo geram ValueError e, com o pool do worker
+    lotado, FilaDeJobsCheia (nada é criado nem fica esperando vaga).
+    """
+    if tipo not in _REGISTRO:
+        raise ValueError(f"Tipo de job desconhecido: {tipo}")
+
+    parametros = validar_parametros(tipo, parametros or {})
+    chave = chave_parametros(tipo, parametros)
+    timeout = current_app.config.get("JOBS_TIMEOUT_SEGUNDOS", 900)
+    # Job de um worker que morreu não bloqueia a chave até o timeout
+    jobs_repo.expirar_travados(_sem_sinal_segundos(current_app), timeout, chave_parametros=chave)
+
+    pool = _obter_pool()
+    if not forcar:
+        existente = jobs_repo.obter_reaproveitavel(tipo, chave, timeout)
+        if existente:
+            return existente
+        if pool.full():
+            raise FilaDeJobsCheia("Muitos jobs em execução; tente novamente em instantes.")
+
+    job_id = jobs_repo.criar_job(tipo, chave, parametros, usuario_id)
+    if job_id is None:
+        # Outra requisição criou o mesmo job entre a conferência e o INSERT
+        existente = jobs_repo.obter_reaproveitavel(tipo, chave, timeout)
+        if existente:
+            return existente
+        raise FilaDeJobsCheia("Job com os mesmos parâmetros em andamento; tente novamente em instantes.")
+
+    # O INSERT cede o loop: o pool pode ter lotado enquanto isso, e spawn()
+    # bloquearia a requisição até abrir vaga
+    if pool.full():
+        jobs_repo.registrar_erro(job_id, "Fila de jobs cheia")
+        raise FilaDeJobsCheia("Muitos jobs em execução; tente novamente em instantes.")
+
+    app = current_app._get_current_object()
+    pool.spawn(_executar, app, job_id, tipo, parametros)
+    return {"id": job_id, "tipo": tipo, "status": "pendente", "resultado": None, "erro": None}
+
+
+def _sem_sinal_segundos(app) -> int:
+    """Sem sinal de vida por três intervalos seguidos, o job é dado como interrompido."""
+    return 3 * app.config.get("JOBS_SINAL_SEGUNDOS", 30)
+
+
+def _manter_sinal(app, job_id: int) -> None:
+    intervalo = app.config.get("JOBS_SINAL_SEGUNDOS", 30)
+    with app.app_context():
+        while True:
+            gevent.sleep(intervalo)
+            try:
+                jobs_repo.registrar_sinal(job_id)
+            except Exception:  # noqa: BLE001 - tenta de novo no próximo intervalo
+                app.logger.exception("Falha ao renovar o sinal do job %s", job_id)
+
+
+def _executar(app, job_id: int, tipo: str, parametros: dict) -> None:
+    with app.app_context():
+        sinal = gevent.spawn(_manter_sinal, app, job_id)
+        try:
+            jobs_repo.marcar_executando(job_id)
+            resultado = _REGISTRO[tipo](parametros)
+            jobs_repo.concluir(
+                job_id,
+                serializar_resultado(resultado),
+                app.config.get("RELATORIOS_CACHE_TTL", 600),
+            )
+        except Exception as exc:  # noqa: BLE001 - o erro fica registrado no job
+            app.logger.exception("Falha ao executar job %s (%s)", job_id, tipo)
+            jobs_repo.registrar_erro(job_id, str(exc))
+        finally:
+            sinal.kill(block=False)
+        _remover_antigos(app)
+
+
+def _remover_antigos(app) -> None:
+    """Cada resultado expirado vira uma linha nova: apaga os finalizados além da retenção."""
+    try:
+        removidos = jobs_repo.remover_antigos(app.config.get("JOBS_RETENCAO_DIAS", 1))
+        if removidos:
+            app.logger.info("%s job(s) antigo(s) removido(s)", removidos)
+    except Exception:  # noqa: BLE001 - limpeza acessória, tenta de novo no próximo job
+        app.logger.exception("Falha ao remover jobs antigos")
+
+
+def obter_status(job_id: int) -> Optional[dict]:
+    """Status público do job, com o resultado já desserializado quando concluído."""
+    job = jobs_repo.obter_por_id(job_id)
+    if not job:
+        return None
+    if job["status"] in ("pendente", "executando"):
+        # Quem consulta o status de um job órfão recebe o erro, não "gerando…" para sempre
+        config = current_app.config
+        if jobs_repo.expirar_travados(
+            _sem_sinal_segundos(current_app), config.get("JOBS_TIMEOUT_SEGUNDOS", 900), job_id=job_id
+        ):
+            job = jobs_repo.obter_por_id(job_id)
+    return {
+        "id": job["id"],
+        "tipo": job["tipo"],
+        "status": job["status"],
+        "erro": job["erro"],
+        "criado_em": job["criado_em"],
+        "concluido_em": job["concluido_em"],
+        "expira_em": job["expira_em"],
+        "resultado": desserializar_resultado(job["resultado"]) if job["status"] == "concluido" else None,
+    }
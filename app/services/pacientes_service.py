@@ -0,0 +1,35 @@
+from flask import current_app
+
+from app.repositories import pacientes as pacientes_repo
+from app.services import cache_service
+from app.utils.cache import CacheTTL
+
+# Resultados do autocomplete; o TTL curto limita a defasagem entre workers
+_cache_busca = CacheTTL(max_itens=2048, ttl_segundos=30)
+
+
+def buscar_para_autocomplete(termo: str, limit: int = 10) -> list[dict]:
+    termo = (termo or "").strip()
+    chave = (termo.lower(), limit)
+    return _cache_busca.get_or_set(
+        chave,
+        lambda: pacientes_repo.buscar_para_autocomplete(termo, limit),
+        current_app.config.get("PACIENTES_BUSCA_CACHE_TTL", 30),
+    )
+
+
+def apos_gravar_cadastro(situacao: str) -> None:
+    """Descarta os caches afetados depois do commit de um upsert de paciente."""
+    if situacao == "inalterado":
+        return
+    _cache_busca.limpar()
+    if situacao == "atualizado":
+        cache_service.invalidar(cache_service.PEDIDOS)
+
+
+def atualizar_paciente(paciente_id: int, dados: dict) -> None:
+    """Atualiza o cadastro e descarta o que mostra dados do paciente em cache
+    (autocomplete e fragmentos das filas)."""
+    pacientes_repo.atualizar_paciente(paciente_id, dados)
+    _cache_busca.limpar()
+    cache_service.invalidar(cache_service.PEDIDOS)
@@ -1,23 +1,83 @@
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Sequence
 
 from app.domain.status import StatusPedido
 from app.extensions import mysql
+from app.repositories import pacientes as pacientes_repo
 from app.repositories import pedidos as pedidos_repo
+from app.repositories import reservas as reservas_repo
+from app.services import cache_service, filas_tempo_real, pacientes_service
+
+_INSERIR_HISTORICO = """
+    INSERT INTO historico_pedidos (pedido_id, status, descricao, criado_por, criado_em)
+    VALUES (%s, %s, %s, %s, NOW())
+"""
 
 
 def registrar_historico(pedido_id: int, status: StatusPedido, descricao: Optional[str], usuario_id: int):
-    query = """
-        INSERT INTO historico_pedidos (pedido_id, status, descricao, criado_por, criado_em)
-        VALUES (%s, %s, %s, %s, NOW())
-    """
     with mysql.get_cursor() as (_, cursor):
         cursor.execute(
-            query,
+            _INSERIR_HISTORICO,
             (pedido_id, status.value, descricao, usuario_id),  # ✅ REMOVIDO datetime.utcnow()
         )
 
 
+# ==========================================================
+# 🆕 Criação do pedido com o cadastro do paciente (uma transação)
+# ==========================================================
+def gravar_pedido_completo(cursor, paciente: dict, pedido: dict, usuario_id: int,
+                           descricao: Optional[str] = None) -> dict:
+    """
+    Upsert do paciente (pelo CPF) + pedido aguardando triagem + histórico
+    inicial, no cursor de quem chama: tudo entra ou nada entra. Não mexe em
+    cache nem avisa as filas (isso é feito após o commit).
+    """
+    paciente_id, situacao = pacientes_repo.upsert_paciente(cursor, paciente)
+    pedido_id = pedidos_repo.inserir_pedido(
+        cursor, {**pedido, "paciente_id": paciente_id, "usuario_criacao": usuario_id}
+    )
+    cursor.execute(
+        _INSERIR_HISTORICO,
+        (pedido_id, StatusPedido.AGUARDANDO_TRIAGEM.value, descricao, usuario_id),
+    )
+    return {"paciente_id": paciente_id, "pedido_id": pedido_id, "paciente": situacao}
+
+
+def gravar_pedidos_em_lote(cursor, itens: Sequence[dict], usuario_id: int) -> list[int]:
+    """
+    Versão em lote do gravar_pedido_completo (importação de planilhas): um
+    INSERT de várias linhas para os pacientes e outro para o histórico; os
+    pedidos saem um a um porque cada histórico precisa do id gerado. Cada
+    item traz "paciente", "pedido" e "descricao". Retorna os ids dos pedidos.
+    """
+    ids_pacientes = pacientes_repo.upsert_pacientes_em_lote(cursor, [item["paciente"] for item in itens])
+    pedidos_ids, historico = [], []
+    for item in itens:
+        paciente_id = ids_pacientes["".join(filter(str.isdigit, item["paciente"]["cpf"]))]
+        pedido_id = pedidos_repo.inserir_pedido(
+            cursor, {**item["pedido"], "paciente_id": paciente_id, "usuario_criacao": usuario_id}
+        )
+        pedidos_ids.append(pedido_id)
+        historico.append((pedido_id, StatusPedido.AGUARDANDO_TRIAGEM.value, item.get("descricao"), usuario_id))
+    cursor.executemany(_INSERIR_HISTORICO, historico)
+    return pedidos_ids
+
+
+def criar_pedido_completo(paciente: dict, pedido: dict, usuario_id: int,
+                          descricao: Optional[str] = None) -> dict:
+    """
+    Cria o pedido (e cria/atualiza o paciente) numa única transação e conexão.
+    `pedido` traz exame_id ou consulta_id, unidade_id e observacoes. Retorna
+    {"paciente_id", "pedido_id", "paciente": "criado"|"atualizado"|"inalterado"}.
+    """
+    with mysql.get_cursor() as (_, cursor):
+        resultado = gravar_pedido_completo(cursor, paciente, pedido, usuario_id, descricao)
+
+    pacientes_service.apos_gravar_cadastro(resultado["paciente"])
+    filas_tempo_real.notificar(None, pedidos_repo.obter_resumo_fila(resultado["pedido_id"]))
+    return resultado
+
+
 def atualizar_status(
     pedido_id: int,
     status: StatusPedido,
@@ -32,14 +92,28 @@ def atualizar_status(
     }
     if extra_campos:
         campos.update(extra_campos)
-    pedidos_repo.atualizar_campos(pedido_id, campos)
-    registrar_historico(pedido_id, status, descricao, usuario_id)
+    # Status, histórico e reserva numa transação só: ou a transição entra
+    # inteira ou nada muda. Cache e filas são avisados depois do commit.
+    with filas_tempo_real.acompanhar(pedido_id) as cursor:
+        pedidos_repo.gravar_campos(cursor, pedido_id, campos)
+        cursor.execute(_INSERIR_HISTORICO, (pedido_id, status.value, descricao, usuario_id))
+        # Pedido tratado: a reserva do regulador (se houver) deixa de fazer sentido
+        reservas_repo.remover_do_pedido(cursor, pedido_id)
+
+
+def versao_fila(status: Sequence[str], tipo_regulacao: Optional[str] = None) -> str:
+    """
+    Versão dos dados de uma fila para o cache de fragmentos: resumo da fila no
+    banco + versão de "pedidos" (cobre duas mudanças no mesmo segundo).
+    """
+    atualizado_em, total = pedidos_repo.resumo_fila(status, tipo_regulacao)
+    return f"{cache_service.versao(cache_service.PEDIDOS)}:{atualizado_em}:{total}"
+
 
 # ==========================================================
 # 📥 Serviço que registra a retirada (antes da impressão)
 # ==========================================================
 def registrar_retirada_service(pedido_id: int, nome_retirante: str, cpf_retirante: str, usuario_id: int):
-    print(">>> REPO LOADED FROM:", pedidos_repo.__file__)
     """
     Registra no pedido quem retirou (nome, cpf e timestamp).
     Não altera o status do pedido — apenas armazena os dados.
@@ -53,10 +127,8 @@ def registrar_retirada_service(pedido_id: int, nome_retirante: str, cpf_retirant
 def confirmar_entrega_service(pedido_id: int, usuario_id: int, descricao: Optional[str] = None):
     """
     Marca o pedido como 'retirado', define data_entrega/entregue_por_usuario,
-    e registra histórico.
+    e registra histórico (na mesma transação).
     """
-    from app.domain.status import StatusPedido
-
     query = """
         UPDATE pedidos
         SET 
@@ -67,13 +139,42 @@ def confirmar_entrega_service(pedido_id: int, usuario_id: int, descricao: Option
             data_atualizacao = NOW()
         WHERE id = %s
     """
-    with mysql.get_cursor() as (_, cursor):
+    with filas_tempo_real.acompanhar(pedido_id) as cursor:
         cursor.execute(query, (usuario_id, StatusPedido.RETIRADO.value, pedido_id))
+        cursor.execute(
+            _INSERIR_HISTORICO,
+            (
+                pedido_id,
+                StatusPedido.RETIRADO.value,
+                descricao or "Pedido retirado e confirmado pela recepção.",
+                usuario_id,
+            ),
+        )
 
-    # Registrar no histórico
-    registrar_historico(
-        pedido_id,
-        StatusPedido.RETIRADO,
-        descricao or "Pedido retirado e confirmado pela recepção.",
-        usuario_id
-    )
+
+# ==========================================================
+# ↩️ Pedido devolvido pelo médico: tratativa e volta à triagem
+# ==========================================================
+def reenviar_para_triagem(pedido_id: int, descricao_tratativa: str, usuario_id: int):
+    """
+    Registra a tratativa da devolução e devolve o pedido à triagem, limpando
+    a regulação anterior. Histórico e status entram na mesma transação.
+    """
+    campos = {
+        "status": StatusPedido.AGUARDANDO_TRIAGEM.value,
+        "tipo_regulacao": None,
+        "prioridade": None,
+        "pendente_recepcao": 0,
+        "motivo_devolucao": None,
+        "usuario_atualizacao": usuario_id,
+    }
+    with filas_tempo_real.acompanhar(pedido_id) as cursor:
+        cursor.execute(
+            _INSERIR_HISTORICO,
+            (pedido_id, StatusPedido.DEVOLVIDO_PELO_MEDICO.value, descricao_tratativa, usuario_id),
+        )
+        pedidos_repo.gravar_campos(cursor, pedido_id, campos)
+        cursor.execute(
+            _INSERIR_HISTORICO,
+            (pedido_id, StatusPedido.AGUARDANDO_TRIAGEM.value, "Pedido reenviado à triagem após tratativa.", usuario_id),
+        )
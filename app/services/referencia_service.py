@@ -0,0 +1,60 @@
+from typing import Optional
+
+from app.repositories import consultas as consultas_repo
+from app.repositories import exames as exames_repo
+from app.repositories import unidades as unidades_repo
+from app.services import cache_service
+
+# ==========================================================
+# 📚 Dados de referência (exames, consultas e unidades ativas)
+# ==========================================================
+# Mudam raramente e são lidos em quase todo formulário. Cada worker guarda
+# uma cópia completa e só recarrega quando a versão do namespace muda
+# (as rotas de administração chamam invalidar()).
+
+_CARREGADORES = {
+    "exames": exames_repo.listar_exames,
+    "consultas": consultas_repo.listar_ativas,
+    "unidades": unidades_repo.listar_unidades_ativas,
+}
+
+# Trocado inteiro numa atribuição só: quem já pegou o estado antigo continua
+# com listas e índices coerentes entre si. Sem lock de propósito: o lock nativo
+# seria criado antes do monkey patch do gevent e, segurado durante a consulta,
+# travaria o worker; no pior caso dois greenlets recarregam a mesma versão.
+_estado: dict = {"versao": None, "listas": {}, "por_id": {}}
+
+
+def _carregar(versao: int) -> dict:
+    listas = {tipo: list(carregar()) for tipo, carregar in _CARREGADORES.items()}
+    por_id = {tipo: {item["id"]: item for item in itens} for tipo, itens in listas.items()}
+    return {"versao": versao, "listas": listas, "por_id": por_id}
+
+
+def _atual() -> dict:
+    global _estado
+    estado = _estado
+    versao = cache_service.versao(cache_service.REFERENCIA)
+    if estado["versao"] != versao:
+        estado = _carregar(versao)
+        _estado = estado
+    return estado
+
+
+def aquecer() -> None:
+    """Carrega os dados na inicialização do worker, antes da primeira requisição."""
+    _atual()
+
+
+def invalidar() -> None:
+    cache_service.invalidar(cache_service.REFERENCIA)
+
+
+def listar(tipo: str) -> list[dict]:
+    """Lista em cache: "exames", "consultas" (ativas) ou "unidades" (ativas)."""
+    return _atual()["listas"][tipo]
+
+
+def obter_por_id(tipo: str, item_id: Optional[int]) -> Optional[dict]:
+    """Item do cache pelo ID, sem consultar o banco (None se inexistente/inativo)."""
+    return _atual()["por_id"][tipo].get(item_id)
@@ -0,0 +1,110 @@
+from typing import Iterator
+
+from app.extensions import mysql
+from app.services import jobs_service
+
+
+# ==========================================================
+# 📊 Seções da página de relatórios
+# ==========================================================
+# Cada seção define a consulta e as colunas usadas tanto na renderização
+# da página quanto na exportação CSV/XLSX.
+SECOES_RELATORIO = {
+    "pedidos_periodo": {
+        "titulo": "Pedidos por período",
+        "query": """
+            SELECT
+                DATE_FORMAT(data_solicitacao, '%Y-%m') as mes,
+                tipo_solicitacao,
+                status,
+                COUNT(*) as total,
+                AVG(TIMESTAMPDIFF(DAY, data_solicitacao, data_atualizacao)) as tempo_medio_dias
+            FROM pedidos
+            WHERE data_solicitacao >= DATE_SUB(NOW(), INTERVAL 12 MONTH)
+            GROUP BY DATE_FORMAT(data_solicitacao, '%Y-%m'), tipo_solicitacao, status
+            ORDER BY mes DESC
+        """,
+        "colunas": [
+            ("mes", "Mês"),
+            ("tipo_solicitacao", "Tipo"),
+            ("status", "Status"),
+            ("total", "Total"),
+            ("tempo_medio_dias", "Tempo médio (dias)"),
+        ],
+    },
+    "performance_unidades": {
+        "titulo": "Performance por unidade",
+        "query": """
+            SELECT
+                u.nome as unidade,
+                COUNT(p.id) as total_pedidos,
+                AVG(DATEDIFF(p.data_atualizacao, p.data_solicitacao)) as tempo_medio_dias,
+                COUNT(CASE WHEN p.status LIKE '%AGENDADO%' THEN 1 END) as agendados,
+                COUNT(CASE WHEN p.status LIKE '%CANCELADO%' THEN 1 END) as cancelados,
+                ROUND((COUNT(CASE WHEN p.status LIKE '%AGENDADO%' THEN 1 END) / COUNT(p.id)) * 100, 1) as taxa_sucesso
+            FROM unidades_saude u
+            LEFT JOIN pedidos p ON u.id = p.unidade_id
+                AND p.data_solicitacao >= DATE_SUB(NOW(), INTERVAL 3 MONTH)
+            WHERE u.ativo = 1
+            GROUP BY u.id, u.nome
+            ORDER BY total_pedidos DESC
+        """,
+        "colunas": [
+            ("unidade", "Unidade"),
+            ("total_pedidos", "Total"),
+            ("agendados", "Agendados"),
+            ("cancelados", "Cancelados"),
+            ("taxa_sucesso", "Taxa de sucesso (%)"),
+            ("tempo_medio_dias", "Tempo médio (dias)"),
+        ],
+    },
+    "usuarios_ativos": {
+        "titulo": "Usuários mais ativos",
+        "query": """
+            SELECT
+                u.nome,
+                u.role,
+                COUNT(h.id) as acoes_realizadas,
+                MAX(u.last_seen) as ultimo_acesso,
+                COUNT(DISTINCT p.id) as pedidos_criados
+            FROM usuarios u
+            LEFT JOIN historico_pedidos h ON u.id = h.criado_por
+                AND h.criado_em >= DATE_SUB(NOW(), INTERVAL 30 DAY)
+            LEFT JOIN pedidos p ON u.id = p.usuario_criacao
+                AND p.data_solicitacao >= DATE_SUB(NOW(), INTERVAL 30 DAY)
+            WHERE u.ativo = 1
+            GROUP BY u.id
+            ORDER BY acoes_realizadas DESC
+            LIMIT 20
+        """,
+        "colunas": [
+            ("nome", "Nome"),
+            ("role", "Perfil"),
+            ("acoes_realizadas", "Ações realizadas"),
+            ("pedidos_criados", "Pedidos criados"),
+            ("ultimo_acesso", "Último acesso"),
+        ],
+    },
+}
+
+
+def calcular_relatorios() -> dict:
+    """Executa todas as seções usando uma única conexão do pool."""
+    relatorios = {}
+    with mysql.get_cursor(dictionary=True) as (_, cursor):
+        for nome, secao in SECOES_RELATORIO.items():
+            cursor.execute(secao["query"])
+            relatorios[nome] = cursor.fetchall()
+    return relatorios
+
+
+def iterar_secao(nome: str) -> Iterator[dict]:
+    """Percorre as linhas de uma seção em streaming (para exportação)."""
+    return mysql.iterar_linhas(SECOES_RELATORIO[nome]["query"])
+
+
+def _job_relatorios(_parametros: dict) -> dict:
+    return calcular_relatorios()
+
+
+jobs_service.registrar_tipo("relatorios", _job_relatorios)
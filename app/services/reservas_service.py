@@ -0,0 +1,111 @@
+from typing import List, Optional
+
+from flask import current_app
+
+from app.extensions import socketio
+from app.repositories import pedidos as pedidos_repo
+from app.repositories import reservas as reservas_repo
+from app.services import filas_tempo_real
+
+# ==========================================================
+# 🔒 Reserva do "próximo pedido" nas filas de trabalho
+# ==========================================================
+# Cada usuário pede o próximo pedido e recebe uma reserva com prazo. A página
+# renova a reserva enquanto estiver aberta (heartbeat); se o usuário sair sem
+# liberar, a reserva expira e o pedido volta a ficar disponível. Mudança de
+# status também libera. Filas: "regulador" (análise do médico) e "agendador"
+# (fila de ligações, que respeita o intervalo entre tentativas).
+
+EVENTO = "reserva_alterada"
+
+# fila -> (status da fila, reserva do próximo no banco, sala, config da duração)
+_FILAS = {
+    "regulador": (
+        lambda tipo: [pedidos_repo.status_fila_medico(tipo)],
+        reservas_repo.reservar_proximo,
+        filas_tempo_real.sala_regulador,
+        "REGULACAO_RESERVA_SEGUNDOS",
+    ),
+    "agendador": (
+        pedidos_repo.status_fila_agendador,
+        reservas_repo.reservar_proxima_ligacao,
+        filas_tempo_real.sala_agendador,
+        "AGENDAMENTO_LIGACAO_RESERVA_SEGUNDOS",
+    ),
+}
+
+
+def duracao_segundos(fila: str) -> int:
+    return current_app.config[_FILAS[fila][3]]
+
+
+def serializar(reserva: dict) -> dict:
+    return {
+        "pedido_id": reserva["pedido_id"],
+        "usuario_id": reserva["usuario_id"],
+        "usuario_nome": reserva["usuario_nome"],
+        "expira_em": reserva["expira_em"].isoformat(),
+    }
+
+
+def _avisar(fila: str, tipo: str, acao: str, pedido_id: int, reserva: Optional[dict] = None) -> None:
+    evento = {"acao": acao, "pedido_id": pedido_id}
+    if reserva:
+        evento["reserva"] = serializar(reserva)
+    try:
+        socketio.emit(EVENTO, evento, to=_FILAS[fila][2](tipo))
+    except Exception:  # o aviso é acessório: nunca derruba a reserva
+        current_app.logger.exception("Falha ao avisar reserva do pedido %s", pedido_id)
+
+
+def reservar_proximo(tipo_regulacao: str, usuario_id: int, fila: str = "regulador") -> Optional[dict]:
+    """
+    Reserva para o usuário o próximo pedido livre da fila. Se ele já tem uma
+    reserva válida nessa fila, devolve a mesma (renovada) em vez de pegar outra.
+    Retorna None quando não há pedido livre.
+    """
+    status_da_fila, reservar_no_banco, _, _ = _FILAS[fila]
+    duracao = duracao_segundos(fila)
+
+    atual = reservas_repo.obter_ativa_do_usuario(tipo_regulacao, usuario_id, status_da_fila(tipo_regulacao))
+    if atual and reservas_repo.renovar(atual, usuario_id, duracao):
+        return reservas_repo.obter(atual)
+
+    # Com SKIP LOCKED, None quer dizer que não há candidato livre (os travados
+    # por outros já foram pulados): não adianta repetir a consulta
+    pedido_id = reservar_no_banco(tipo_regulacao, usuario_id, duracao)
+    if pedido_id is None:
+        return None
+    reserva = reservas_repo.obter(pedido_id)
+    _avisar(fila, tipo_regulacao, "reservado", pedido_id, reserva)
+    return reserva
+
+
+def renovar(pedido_id: int, usuario_id: int, fila: str = "regulador") -> Optional[dict]:
+    """Heartbeat da página. None se a reserva expirou ou não é do usuário."""
+    if not reservas_repo.renovar(pedido_id, usuario_id, duracao_segundos(fila)):
+        return None
+    return reservas_repo.obter(pedido_id)
+
+
+def liberar(pedido_id: int, usuario_id: int, fila: str = "regulador") -> bool:
+    """Devolve o pedido à fila (apenas quem reservou pode liberar)."""
+    reserva = reservas_repo.obter(pedido_id)
+    if not reserva or reserva["usuario_id"] != usuario_id:
+        return False
+    if reservas_repo.liberar(pedido_id, usuario_id):
+        _avisar(fila, reserva["tipo_regulacao"], "liberado", pedido_id)
+        return True
+    return False
+
+
+def reservado_por_outro(pedido_id: int, usuario_id: int) -> Optional[dict]:
+    """Reserva válida de outro usuário sobre o pedido, se houver."""
+    reserva = reservas_repo.obter(pedido_id)
+    if reserva and reserva["usuario_id"] != usuario_id:
+        return reserva
+    return None
+
+
+def ativas(tipo_regulacao: str) -> List[dict]:
+    return [serializar(reserva) for reserva in reservas_repo.listar_ativas(tipo_regulacao)]
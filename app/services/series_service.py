@@ -0,0 +1,193 @@
+from datetime import datetime
+from typing import Optional
+
+from app.extensions import mysql
+
+# Janelas (em dias) de cada série exibida no dashboard
+JANELA_DIARIA_DIAS = 7
+JANELA_HORARIA_DIAS = 7
+JANELA_UNIDADES_DIAS = 30
+
+
+# ==========================================================
+# 📈 Séries do dashboard com atualização incremental (delta)
+# ==========================================================
+# Cada função recebe `desde` (o `gerado_em` devolvido na chamada anterior).
+# Sem `desde`, a série completa é devolvida. Com `desde`, apenas os buckets
+# afetados por pedidos criados/alterados depois desse instante (ou que saíram
+# da janela) são recalculados e devolvidos. As consultas usam os índices de
+# pedidos.data_solicitacao e pedidos.data_atualizacao (ver SCHEMA_INDEXES).
+#
+# `gerado_em` vem do NOW() do banco, lido antes das consultas, para que o
+# relógio do servidor de aplicação não interfira e nenhuma alteração feita
+# durante o cálculo se perca na próxima chamada.
+
+
+def _resposta(referencia: dict, buckets: list, desde: Optional[datetime]) -> dict:
+    """Monta a resposta já em tipos JSON (datas em ISO 8601)."""
+    return {
+        "gerado_em": referencia["agora"].isoformat(),
+        "janela_inicio": referencia["inicio"].isoformat(),
+        "completo": desde is None,
+        "buckets": buckets,
+    }
+
+
+def serie_diaria(desde: Optional[datetime] = None) -> dict:
+    """Pedidos por dia (total, exames, consultas, P1) nos últimos 7 dias."""
+    with mysql.get_cursor(dictionary=True) as (_, cursor):
+        cursor.execute(
+            "SELECT NOW() AS agora, DATE_SUB(CURDATE(), INTERVAL %s DAY) AS inicio",
+            (JANELA_DIARIA_DIAS,),
+        )
+        referencia = cursor.fetchone()
+        inicio = referencia["inicio"]
+
+        dias_alterados = None
+        if desde is not None:
+            cursor.execute(
+                """
+                SELECT DISTINCT DATE(data_solicitacao) AS dia
+                FROM pedidos
+                WHERE data_atualizacao >= %s
+                  AND data_solicitacao >= %s
+                """,
+                (desde, inicio),
+            )
+            dias_alterados = {linha["dia"] for linha in cursor.fetchall()}
+            if not dias_alterados:
+                return _resposta(referencia, [], desde)
+            inicio = min(dias_alterados)
+
+        cursor.execute(
+            """
+            SELECT
+                DATE(data_solicitacao) as data,
+                COUNT(*) as total,
+                COUNT(CASE WHEN tipo_solicitacao = 'exame' THEN 1 END) as exames,
+                COUNT(CASE WHEN tipo_solicitacao = 'consulta' THEN 1 END) as consultas,
+                COUNT(CASE WHEN prioridade = 'P1' THEN 1 END) as urgentes
+            FROM pedidos
+            WHERE data_solicitacao >= %s
+            GROUP BY DATE(data_solicitacao)
+            ORDER BY data DESC
+            """,
+            (inicio,),
+        )
+        buckets = [
+            {**linha, "data": linha["data"].isoformat()}
+            for linha in cursor.fetchall()
+            if dias_alterados is None or linha["data"] in dias_alterados
+        ]
+
+    return _resposta(referencia, buckets, desde)
+
+
+def serie_horaria(desde: Optional[datetime] = None) -> dict:
+    """Pedidos por hora do dia (0–23) nos últimos 7 dias."""
+    with mysql.get_cursor(dictionary=True) as (_, cursor):
+        cursor.execute(
+            "SELECT NOW() AS agora, DATE_SUB(NOW(), INTERVAL %s DAY) AS inicio",
+            (JANELA_HORARIA_DIAS,),
+        )
+        referencia = cursor.fetchone()
+        inicio = referencia["inicio"]
+
+        horas_alteradas = None
+        if desde is not None:
+            # Horas com pedidos novos/alterados + horas de pedidos que saíram da janela
+            cursor.execute(
+                """
+                SELECT HOUR(data_solicitacao) AS hora
+                FROM pedidos
+                WHERE data_atualizacao >= %s AND data_solicitacao >= %s
+                UNION
+                SELECT HOUR(data_solicitacao) AS hora
+                FROM pedidos
+                WHERE data_solicitacao >= DATE_SUB(%s, INTERVAL %s DAY)
+                  AND data_solicitacao < %s
+                """,
+                (desde, inicio, desde, JANELA_HORARIA_DIAS, inicio),
+            )
+            horas_alteradas = {linha["hora"] for linha in cursor.fetchall()}
+            if not horas_alteradas:
+                return _resposta(referencia, [], desde)
+
+        cursor.execute(
+            """
+            SELECT HOUR(data_solicitacao) as hora, COUNT(*) as total
+            FROM pedidos
+            WHERE data_solicitacao >= %s
+            GROUP BY HOUR(data_solicitacao)
+            ORDER BY hora
+            """,
+            (inicio,),
+        )
+        totais = {linha["hora"]: linha["total"] for linha in cursor.fetchall()}
+
+    horas = sorted(horas_alteradas) if horas_alteradas is not None else range(24)
+    buckets = [{"hora": hora, "total": totais.get(hora, 0)} for hora in horas]
+    return _resposta(referencia, buckets, desde)
+
+
+def serie_unidades(desde: Optional[datetime] = None) -> dict:
+    """Pedidos, pendentes e taxa de sucesso por unidade ativa nos últimos 30 dias."""
+    with mysql.get_cursor(dictionary=True) as (_, cursor):
+        cursor.execute(
+            "SELECT NOW() AS agora, DATE_SUB(NOW(), INTERVAL %s DAY) AS inicio",
+            (JANELA_UNIDADES_DIAS,),
+        )
+        referencia = cursor.fetchone()
+        inicio = referencia["inicio"]
+
+        filtro_unidades = ""
+        params: list = [inicio]
+        if desde is not None:
+            cursor.execute(
+                """
+                SELECT unidade_id
+                FROM pedidos
+                WHERE data_atualizacao >= %s AND data_solicitacao >= %s
+                UNION
+                SELECT unidade_id
+                FROM pedidos
+                WHERE data_solicitacao >= DATE_SUB(%s, INTERVAL %s DAY)
+                  AND data_solicitacao < %s
+                """,
+                (desde, inicio, desde, JANELA_UNIDADES_DIAS, inicio),
+            )
+            unidades_alteradas = [linha["unidade_id"] for linha in cursor.fetchall() if linha["unidade_id"]]
+            if not unidades_alteradas:
+                return _resposta(referencia, [], desde)
+            filtro_unidades = f"AND u.id IN ({', '.join(['%s'] * len(unidades_alteradas))})"
+            params.extend(unidades_alteradas)
+
+        cursor.execute(
+            f"""
+            SELECT
+                u.id as unidade_id,
+                u.nome as unidade,
+                COUNT(p.id) as total_pedidos,
+                COUNT(CASE WHEN p.status LIKE '%AGUARDANDO%' THEN 1 END) as pendentes,
+                ROUND((COUNT(CASE WHEN p.status LIKE '%AGENDADO%' THEN 1 END) / COUNT(p.id)) * 100, 1) as taxa_sucesso
+            FROM unidades_saude u
+            LEFT JOIN pedidos p ON u.id = p.unidade_id AND p.data_solicitacao >= %s
+            WHERE u.ativo = 1 {filtro_unidades}
+            GROUP BY u.id, u.nome
+            ORDER BY total_pedidos DESC
+            """,
+            params,
+        )
+        buckets = [
+            {**linha, "taxa_sucesso": float(linha["taxa_sucesso"] or 0)}
+            for linha in cursor.fetchall()
+        ]
+
+    return _resposta(referencia, buckets, desde)
+
+
+SERIES = {
+    "diaria": serie_diaria,
+    "horaria": serie_horaria,
+    "unidades": serie_unidades,
+}
@@ -0,0 +1,34 @@
+from typing import Any, Optional
+
+from flask import current_app
+
+from app.models.usuario import Usuario
+from app.repositories import usuarios as usuarios_repo
+from app.services import cache_service
+from app.utils.cache import CacheTTL
+
+# Linhas de usuário lidas pelo load_user (uma por requisição e por evento do
+# Socket.IO). A versão de "usuarios" na chave propaga a invalidação entre workers.
+_cache_usuarios = CacheTTL(max_itens=4096, ttl_segundos=60)
+
+
+def carregar_usuario(usuario_id: int) -> Optional[Usuario]:
+    linha = _cache_usuarios.get_or_set(
+        (cache_service.versao(cache_service.USUARIOS), usuario_id),
+        lambda: usuarios_repo.obter_por_id(usuario_id),
+        current_app.config.get("USUARIOS_CACHE_TTL", 60),
+    )
+    # Instância nova a cada requisição: o cache guarda só a linha do banco
+    return Usuario.from_row(linha) if linha else None
+
+
+def invalidar() -> None:
+    """Descarta os usuários em cache em todos os workers (ex.: unidade renomeada)."""
+    cache_service.invalidar(cache_service.USUARIOS)
+
+
+def atualizar_usuario(usuario_id: int, **campos: Any) -> None:
+    """Atualiza o cadastro e invalida o cache, para que a mudança (inclusive
+    a desativação) valha em poucos segundos para sessões já abertas."""
+    usuarios_repo.atualizar_usuario(usuario_id, **campos)
+    invalidar()
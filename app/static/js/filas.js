@@ -0,0 +1,126 @@
+// ==========================================================
+// 📡 Filas em tempo real
+// ==========================================================
+// Recebe os eventos "fila_alterada" do servidor e aplica o delta na página:
+//  - removido:   some a linha/cartão [data-pedido-id]
+//  - atualizado: reescreve os campos [data-campo] da linha
+//  - adicionado: clona o <template> de linha (se houver e sem filtros ativos)
+//                ou mostra um aviso para recarregar
+(function () {
+  "use strict";
+
+  function formatar(campo, valor) {
+    if (valor === null || valor === undefined || valor === "") return "—";
+    if (campo === "data_solicitacao") {
+      var data = new Date(valor);
+      return isNaN(data) ? valor : data.toLocaleDateString("pt-BR");
+    }
+    return String(valor);
+  }
+
+  function preencher(elemento, linha) {
+    elemento.querySelectorAll("[data-campo]").forEach(function (alvo) {
+      var campo = alvo.dataset.campo;
+      if (Object.prototype.hasOwnProperty.call(linha, campo)) {
+        alvo.textContent = formatar(campo, linha[campo]);
+      }
+    });
+  }
+
+  function trocarId(elemento, pedidoId) {
+    [elemento].concat(Array.from(elemento.querySelectorAll("*"))).forEach(function (no) {
+      Array.from(no.attributes).forEach(function (atributo) {
+        if (atributo.value.indexOf("__ID__") !== -1) {
+          no.setAttribute(atributo.name, atributo.value.split("__ID__").join(pedidoId));
+        }
+      });
+    });
+  }
+
+  function ajustarContador(delta) {
+    var contador = document.getElementById("contador-pedidos");
+    if (!contador) return;
+    var atual = parseInt(contador.textContent, 10) || 0;
+    contador.textContent = Math.max(0, atual + delta);
+  }
+
+  function mostrarAviso() {
+    var aviso = document.getElementById("aviso-fila-alterada");
+    if (aviso) {
+      aviso.classList.remove("hidden");
+      return;
+    }
+    aviso = document.createElement("div");
+    aviso.id = "aviso-fila-alterada";
+    aviso.className = "fixed bottom-4 right-4 z-50 bg-sky-600 text-white text-sm rounded-lg shadow-lg px-4 py-3 flex items-center gap-3";
+    aviso.innerHTML = '<span>Há pedidos novos nesta fila.</span>' +
+      '<button type="button" class="underline font-semibold">Atualizar</button>';
+    aviso.querySelector("button").addEventListener("click", function () {
+      window.location.reload();
+    });
+    document.body.appendChild(aviso);
+  }
+
+  /**
+   * opcoes: {
+   *   fila: "malote" | "regulador" | "agendador" | "recepcao",
+   *   tipo: "municipal" | "estadual",   (regulador/agendador)
+   *   unidade_id: 3,                     (recepcao, apenas admin)
+   *   container: "#linhas-fila",         onde ficam os [data-pedido-id]
+   *   modelo: "#modelo-linha-fila",      <template> para linhas novas (opcional)
+   *   filtrada: true                     filtros ativos: linhas novas só com aviso
+   * }
+   * Retorna o socket, para a página ouvir outros eventos da mesma conexão.
+   */
+  window.iniciarFilaTempoReal = function (opcoes) {
+    if (typeof io === "undefined") return null;
+
+    var socket = io();
+    socket.on("connect", function () {
+      socket.emit("entrar_fila", {
+        fila: opcoes.fila,
+        tipo: opcoes.tipo,
+        unidade_id: opcoes.unidade_id
+      });
+    });
+
+    socket.on("fila_alterada", function (evento) {
+      var container = opcoes.container ? document.querySelector(opcoes.container) : null;
+      var existente = container
+        ? container.querySelector('[data-pedido-id="' + evento.pedido_id + '"]')
+        : null;
+
+      if (evento.acao === "removido") {
+        if (existente) {
+          existente.remove();
+          ajustarContador(-1);
+        }
+        return;
+      }
+
+      if (existente) {
+        preencher(existente, evento.linha);
+        return;
+      }
+
+      if (evento.acao !== "adicionado") return;
+
+      var modelo = opcoes.modelo ? document.querySelector(opcoes.modelo) : null;
+      if (!container || !modelo || opcoes.filtrada) {
+        mostrarAviso();
+        return;
+      }
+
+      var novo = modelo.content.firstElementChild.cloneNode(true);
+      trocarId(novo, evento.pedido_id);
+      preencher(novo, evento.linha);
+      container.querySelectorAll("[data-fila-vazia]").forEach(function (vazia) {
+        vazia.remove();
+      });
+      container.appendChild(novo);
+      ajustarContador(1);
+    });
+
+    return socket;
+  };
+})();
@@ -0,0 +1,46 @@
+// ==========================================================
+// 🔒 Reserva de pedido (lease) mantida pela página
+// ==========================================================
+// Enquanto a página estiver aberta, renova a reserva a cada terço da duração
+// (heartbeat). Se o servidor responder 409, a reserva foi perdida (expirou ou
+// outro usuário a assumiu). Ao sair da página, devolve o pedido à fila sem
+// esperar a expiração.
+(function () {
+  "use strict";
+
+  /**
+   * opcoes: {
+   *   urlRenovar: "/.../renovar",
+   *   urlLiberar: "/.../liberar",
+   *   duracaoSegundos: 300,
+   *   aoPerder: function () {}   chamada quando a renovação falha com 409
+   * }
+   * Retorna { parar: function () {} } para encerrar sem liberar.
+   */
+  window.manterReserva = function (opcoes) {
+    var ativa = true;
+    var intervalo = setInterval(function () {
+      fetch(opcoes.urlRenovar, { method: "POST" }).then(function (resposta) {
+        if (resposta.status === 409 && ativa) {
+          parar();
+          if (opcoes.aoPerder) opcoes.aoPerder();
+        }
+      });
+    }, Math.max(5000, opcoes.duracaoSegundos * 1000 / 3));
+
+    function liberar() {
+      if (ativa && navigator.sendBeacon) {
+        navigator.sendBeacon(opcoes.urlLiberar);
+      }
+    }
+
+    function parar() {
+      ativa = false;
+      clearInterval(intervalo);
+      window.removeEventListener("pagehide", liberar);
+    }
+
+    window.addEventListener("pagehide", liberar);
+    return { parar: parar };
+  };
+})();
@@ -0,0 +1,60 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+_AUSENTE = object()
+
+
+class CacheTTL:
+    """
+    Cache em memória (por processo) com expiração por tempo e descarte LRU
+    quando atinge `max_itens`. Seguro para uso concorrente entre greenlets/threads.
+    """
+
+    def __init__(self, max_itens: int = 1024, ttl_segundos: float = 60):
+        self.max_itens = max_itens
+        self.ttl_segundos = ttl_segundos
+        self._itens: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def get(self, chave: Hashable, padrao: Any = None) -> Any:
+        with self._lock:
+            item = self._itens.get(chave, _AUSENTE)
+            if item is _AUSENTE or item[0] < time.monotonic():
+                if item is not _AUSENTE:
+                    del self._itens[chave]
+                self.falhas += 1
+                return padrao
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return item[1]
+
+    def set(self, chave: Hashable, valor: Any, ttl_segundos: Optional[float] = None) -> None:
+        expira_em = time.monotonic() + (self.ttl_segundos if ttl_segundos is None else ttl_segundos)
+        with self._lock:
+            self._itens[chave] = (expira_em, valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def get_or_set(self, chave: Hashable, fabrica: Callable[[], Any], ttl_segundos: Optional[float] = None) -> Any:
+        """Retorna o valor em cache ou calcula com `fabrica()` e guarda."""
+        valor = self.get(chave, _AUSENTE)
+        if valor is _AUSENTE:
+            valor = fabrica()
+            self.set(chave, valor, ttl_segundos)
+        return valor
+
+    def invalidar(self, chave: Hashable) -> None:
+        with self._lock:
+            self._itens.pop(chave, None)
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._itens.clear()
+
+    def __len__(self) -> int:
+        return len(self._itens)
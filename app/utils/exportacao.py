@@ -0,0 +1,118 @@
+import csv
+import io
+import os
+import tempfile
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any, Iterable, Iterator, Sequence, Tuple
+
+from flask import Response, stream_with_context
+
+# (chave na linha, título da coluna)
+Coluna = Tuple[str, str]
+
+FORMATOS_SUPORTADOS = ("csv", "xlsx")
+TAMANHO_BLOCO = 64 * 1024
+
+
+def _formatar_valor(valor: Any) -> Any:
+    """Converte tipos do MySQL para valores legíveis em planilhas."""
+    if valor is None:
+        return ""
+    if isinstance(valor, datetime):
+        return valor.strftime("%d/%m/%Y %H:%M")
+    if isinstance(valor, date):
+        return valor.strftime("%d/%m/%Y")
+    if isinstance(valor, timedelta):
+        return (datetime.min + valor).time().strftime("%H:%M")
+    if isinstance(valor, time):
+        return valor.strftime("%H:%M")
+    if isinstance(valor, Decimal):
+        return float(valor)
+    return valor
+
+
+def gerar_csv(linhas: Iterable[dict], colunas: Sequence[Coluna]) -> Iterator[bytes]:
+    """
+    Gera o CSV em blocos, linha a linha, sem acumular o resultado em memória.
+    Usa ';' e BOM UTF-8 para abrir corretamente no Excel em pt-BR.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=";")
+
+    yield "\ufeff".encode("utf-8")
+    writer.writerow([titulo for _, titulo in colunas])
+
+    for linha in linhas:
+        writer.writerow([_formatar_valor(linha.get(chave)) for chave, _ in colunas])
+        if buffer.tell() >= TAMANHO_BLOCO:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def gerar_xlsx(linhas: Iterable[dict], colunas: Sequence[Coluna], titulo: str = "Dados") -> Iterator[bytes]:
+    """
+    Gera o XLSX com o XlsxWriter em modo constant_memory (cada linha é gravada
+    em disco assim que escrita) e devolve o arquivo final em blocos.
+    """
+    import xlsxwriter
+
+    descritor, caminho = tempfile.mkstemp(suffix=".xlsx")
+    os.close(descritor)
+    try:
+        workbook = xlsxwriter.Workbook(caminho, {"constant_memory": True, "tmpdir": tempfile.gettempdir()})
+        planilha = workbook.add_worksheet(titulo[:31])
+        negrito = workbook.add_format({"bold": True})
+
+        for indice, (_, nome_coluna) in enumerate(colunas):
+            planilha.write(0, indice, nome_coluna, negrito)
+
+        for numero, linha in enumerate(linhas, start=1):
+            for indice, (chave, _) in enumerate(colunas):
+                planilha.write(numero, indice, _formatar_valor(linha.get(chave)))
+
+        workbook.close()
+
+        with open(caminho, "rb") as arquivo:
+            while True:
+                bloco = arquivo.read(TAMANHO_BLOCO)
+                if not bloco:
+                    break
+                yield bloco
+    finally:
+        os.remove(caminho)
+
+
+def xlsx_disponivel() -> bool:
+    try:
+        import xlsxwriter  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def resposta_exportacao(
+    linhas: Iterable[dict],
+    colunas: Sequence[Coluna],
+    nome_base: str,
+    formato: str,
+) -> Response:
+    """Monta a resposta HTTP em streaming para o formato solicitado."""
+    carimbo = datetime.now().strftime("%Y%m%d_%H%M")
+    nome_arquivo = f"{nome_base}_{carimbo}.{formato}"
+
+    if formato == "xlsx":
+        corpo = gerar_xlsx(linhas, colunas, titulo=nome_base)
+        mimetype = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    else:
+        corpo = gerar_csv(linhas, colunas)
+        mimetype = "text/csv; charset=utf-8"
+
+    resposta = Response(stream_with_context(corpo), mimetype=mimetype)
+    resposta.headers["Content-Disposition"] = f'attachment; filename="{nome_arquivo}"'
+    resposta.headers["X-Accel-Buffering"] = "no"
+    return resposta
@@ -0,0 +1,81 @@
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from flask import current_app
+from markupsafe import Markup
+
+
+class CacheFragmentos:
+    """
+    HTML renderizado por chave, com descarte LRU quando o total de caracteres
+    guardados passa de `max_bytes` (aproximação suficiente para o limite).
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.tamanho = 0
+        self._itens: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def get(self, chave: str) -> Optional[str]:
+        with self._lock:
+            html = self._itens.get(chave)
+            if html is None:
+                self.falhas += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return html
+
+    def set(self, chave: str, html: str) -> None:
+        if len(html) > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self._itens.pop(chave, None)
+            if anterior is not None:
+                self.tamanho -= len(anterior)
+            self._itens[chave] = html
+            self.tamanho += len(html)
+            while self.tamanho > self.max_bytes:
+                _, removido = self._itens.popitem(last=False)
+                self.tamanho -= len(removido)
+
+    def limpar(self) -> None:
+        with self._lock:
+            self._itens.clear()
+            self.tamanho = 0
+
+
+_cache: Optional[CacheFragmentos] = None
+
+
+def _cache_fragmentos() -> CacheFragmentos:
+    global _cache
+    if _cache is None:
+        _cache = CacheFragmentos(current_app.config.get("FRAGMENTOS_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+    return _cache
+
+
+def fragmento(nome: str, versao: Any, *partes: Any, caller: Callable[[], str]) -> Markup:
+    """
+    Helper de template para cachear um trecho já renderizado:
+
+        {% call fragmento("malote", versao_fila, filtros) %} ... {% endcall %}
+
+    `versao` identifica o estado dos dados; `partes` é tudo o mais que muda o
+    HTML (filtros, página). Sem versão (None), o trecho é renderizado sempre.
+    """
+    if versao is None:
+        return Markup(caller())
+
+    chave = json.dumps([nome, versao, *partes], sort_keys=True, default=str)
+    cache = _cache_fragmentos()
+    html = cache.get(chave)
+    if html is None:
+        html = str(caller())
+        cache.set(chave, html)
+    return Markup(html)
@@ -0,0 +1,49 @@
+import hashlib
+import json
+from typing import Any, Callable
+
+from datetime import date
+
+from flask import make_response, request, session
+from flask_login import current_user
+
+from app.services import cache_service
+
+
+def resposta_condicional(partes: Any, gerar: Callable[[], Any], fraca: bool = True):
+    """
+    GET condicional: o ETag vem de `partes` (sondas baratas de versão, como
+    MAX(data_atualizacao) da fila). Se o cliente já tem essa versão, devolve
+    304 sem chamar `gerar()`, que faz as consultas pesadas e o render.
+
+    ETags fracos por padrão: o conteúdo é equivalente, não idêntico byte a
+    byte (ex.: "há 3 min" muda sem mudar os dados).
+    """
+    # Mensagens flash só aparecem quando a página é renderizada de novo
+    if session.get("_flashes"):
+        return make_response(gerar())
+
+    etag = hashlib.sha1(json.dumps(partes, sort_keys=True, default=str).encode()).hexdigest()[:32]
+    if request.if_none_match.contains_weak(etag):
+        resposta = make_response("", 304)
+    else:
+        resposta = make_response(gerar())
+    resposta.set_etag(etag, weak=fraca)
+    # Páginas por usuário: o navegador guarda, mas sempre revalida
+    resposta.headers["Cache-Control"] = "private, no-cache"
+    return resposta
+
+
+def partes_pagina(versao_dados: Any) -> tuple:
+    """
+    Partes do ETag de uma página HTML: versão dos dados, rota + query string e
+    o que o layout mostra do usuário logado (nome/unidade, data).
+    """
+    return (
+        request.endpoint,
+        sorted(request.args.items(multi=True)),
+        versao_dados,
+        current_user.get_id(),
+        cache_service.versao(cache_service.USUARIOS),
+        date.today(),
+    )
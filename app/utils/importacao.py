@@ -0,0 +1,92 @@
+import codecs
+import csv
+import io
+import re
+import unicodedata
+import zipfile
+from typing import IO, Any, Dict, Iterator, Tuple
+
+FORMATOS_IMPORTACAO = ("csv", "xlsx")
+TAMANHO_AMOSTRA = 64 * 1024
+
+
+def normalizar_cabecalho(titulo: Any) -> str:
+    """'Data de Nascimento' -> 'data_de_nascimento' (sem acentos, minúsculo)."""
+    texto = unicodedata.normalize("NFKD", str(titulo or "")).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]+", "_", texto.lower()).strip("_")
+
+
+def _linhas_para_dicts(linhas: Iterator[Tuple[Any, ...]]) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Usa a primeira linha não vazia como cabeçalho e devolve (número da linha
+    na planilha, {coluna: valor}) para as demais, pulando linhas em branco.
+    """
+    cabecalho = None
+    for numero, valores in enumerate(linhas, start=1):
+        if not any(valor not in (None, "") and str(valor).strip() for valor in valores):
+            continue
+        if cabecalho is None:
+            cabecalho = [normalizar_cabecalho(valor) for valor in valores]
+            continue
+        yield numero, {
+            coluna: valor for coluna, valor in zip(cabecalho, valores) if coluna
+        }
+    if cabecalho is None:
+        raise ValueError("Planilha vazia: nenhuma linha de cabeçalho encontrada.")
+
+
+def _ler_csv(arquivo: IO[bytes]) -> Iterator[Tuple[Any, ...]]:
+    # A amostra decide codificação (UTF-8 ou o cp1252 do Excel em pt-BR) e
+    # separador; depois o arquivo é lido linha a linha
+    amostra = arquivo.read(TAMANHO_AMOSTRA)
+    arquivo.seek(0)
+    codificacao = "utf-8-sig"
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(amostra, final=False)
+    except UnicodeDecodeError:
+        codificacao = "cp1252"
+    primeira_linha = amostra.split(b"\n", 1)[0]
+    delimitador = ";" if primeira_linha.count(b";") >= primeira_linha.count(b",") else ","
+
+    texto = io.TextIOWrapper(arquivo, encoding=codificacao, newline="")
+    try:
+        yield from csv.reader(texto, delimiter=delimitador)
+    finally:
+        texto.detach()  # quem abriu o arquivo é quem fecha
+
+
+def _ler_xlsx(arquivo: IO[bytes]) -> Iterator[Tuple[Any, ...]]:
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise RuntimeError("Importação de XLSX indisponível: instale o pacote openpyxl.") from None
+
+    # read_only lê a planilha em streaming, sem montar todas as células
+    workbook = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def xlsx_importacao_disponivel() -> bool:
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def ler_planilha(arquivo: IO[bytes], formato: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Lê um CSV (';' ou ',', UTF-8 ou cp1252) ou XLSX em streaming. Cada item é
+    (número da linha, {cabeçalho normalizado: valor}). Arquivos ilegíveis
+    geram ValueError.
+    """
+    if formato not in FORMATOS_IMPORTACAO:
+        raise ValueError(f"Formato não suportado: {formato}")
+    leitor = _ler_xlsx if formato == "xlsx" else _ler_csv
+    try:
+        yield from _linhas_para_dicts(leitor(arquivo))
+    except (csv.Error, UnicodeDecodeError, zipfile.BadZipFile) as erro:
+        raise ValueError(f"Não foi possível ler o arquivo: {erro}") from erro
@@ -0,0 +1,213 @@
+import atexit
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from flask import Flask, g, has_request_context, request
+from flask.logging import default_handler
+
+try:  # gevent só está ativo quando o servidor sobe via run.py (monkey.patch_all)
+    from gevent import monkey as gevent_monkey
+except ImportError:  # pragma: no cover - depende do ambiente
+    gevent_monkey = None
+
+# ==========================================================
+# 📝 Logs estruturados fora do caminho da requisição
+# ==========================================================
+# O handler e os eventos de socket só enfileiram o registro (QueueHandler);
+# uma thread nativa (QueueListener) formata e escreve no stdout. Assim a
+# escrita nunca trava o loop do gevent. Eventos de alta frequência (mensagens
+# do chat, conexões, entrada em salas) passam por amostragem configurável.
+#
+# Uso: current_app.logger.info("texto", extra={"evento": "chat.mensagem",
+#                                               "pedido_id": 10, ...})
+# request_id e usuario_id entram sozinhos a partir da requisição atual.
+
+CABECALHO_REQUEST_ID = "X-Request-ID"
+
+# Atributos que todo LogRecord tem; o resto veio do extra= e vai para o JSON
+_ATRIBUTOS_PADRAO = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_ouvinte: Optional[QueueListener] = None
+
+
+def _gevent_ativo() -> bool:
+    return gevent_monkey is not None and gevent_monkey.is_module_patched("threading")
+
+
+def request_id_atual() -> Optional[str]:
+    if not has_request_context():
+        return None
+    if "request_id" not in g:
+        g.request_id = request.headers.get(CABECALHO_REQUEST_ID) or uuid.uuid4().hex
+    return g.request_id
+
+
+class FiltroContexto(logging.Filter):
+    """
+    Anota o registro com request_id, usuario_id e pedido_id. Roda na thread de
+    quem loga (antes de enfileirar), onde a requisição ainda existe.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "request_id", None) is None:
+            record.request_id = request_id_atual()
+        if getattr(record, "usuario_id", None) is None:
+            # Só o usuário já carregado na requisição: não dispara o load_user
+            usuario = g.get("_login_user") if has_request_context() else None
+            record.usuario_id = usuario.id if usuario is not None and usuario.is_authenticated else None
+        if getattr(record, "pedido_id", None) is None:
+            record.pedido_id = None
+            if has_request_context() and request.view_args:
+                record.pedido_id = request.view_args.get("pedido_id")
+        return True
+
+
+class FiltroAmostragem(logging.Filter):
+    """
+    Mantém só uma fração dos registros de eventos frequentes (atributo
+    `evento`). Avisos e erros nunca são descartados.
+    """
+
+    def __init__(self, taxas: Dict[str, float]):
+        super().__init__()
+        self.taxas = taxas
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        evento = getattr(record, "evento", None)
+        if evento is None or record.levelno >= logging.WARNING:
+            return True
+        taxa = self.taxas.get(evento, 1.0)
+        if taxa >= 1.0:
+            return True
+        if random.random() >= taxa:
+            return False
+        record.amostragem = taxa
+        return True
+
+
+class FormatadorJSON(logging.Formatter):
+    """Uma linha JSON por registro, com os campos do extra= no topo."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        dados = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for chave, valor in vars(record).items():
+            if chave not in _ATRIBUTOS_PADRAO and valor is not None:
+                dados[chave] = valor
+        if record.exc_text:
+            dados["exc"] = record.exc_text
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class _HandlerFila(QueueHandler):
+    """
+    Enfileira uma cópia já resolvida do registro (mensagem montada, traceback
+    em texto), mantendo os campos do extra= para o formatador JSON.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        copia = copy.copy(record)
+        copia.msg = record.getMessage()
+        copia.args = None
+        if record.exc_info:
+            copia.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+        copia.exc_info = None
+        copia.stack_info = None
+        return copia
+
+
+class _OuvinteFila(QueueListener):
+    """
+    Com gevent ativo, threading.Thread vira greenlet: a escrita voltaria para
+    o loop. Nesse caso a leitura da fila roda numa thread nativa de verdade.
+    """
+
+    def start(self) -> None:
+        if not _gevent_ativo():
+            super().start()
+            return
+        iniciar_thread = gevent_monkey.get_original("_thread", "start_new_thread")
+        iniciar_thread(self._monitor, ())
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            super().stop()
+            return
+        self.enqueue_sentinel()  # thread nativa: encerra sem join
+
+
+def _fila():
+    if _gevent_ativo():
+        return gevent_monkey.get_original("queue", "SimpleQueue")()
+    return queue.SimpleQueue()
+
+
+def taxas_amostragem(texto: str) -> Dict[str, float]:
+    """'chat.mensagem=0.1,socket.conexao=0.5' -> {evento: fração mantida}"""
+    taxas = {}
+    for parte in (texto or "").split(","):
+        evento, _, taxa = parte.partition("=")
+        if evento.strip() and taxa.strip():
+            taxas[evento.strip()] = max(0.0, min(1.0, float(taxa)))
+    return taxas
+
+
+def configurar_logs(app: Flask) -> None:
+    """
+    Troca o handler padrão do Flask por QueueHandler -> QueueListener(stdout).
+    O logger da aplicação ("app") cobre também os módulos do pacote.
+    """
+    global _ouvinte
+    config = app.config
+
+    saida = logging.StreamHandler(sys.stdout)
+    if config.get("LOG_FORMATO", "json") == "json":
+        saida.setFormatter(FormatadorJSON())
+    else:
+        saida.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+        ))
+
+    fila = _fila()
+    handler = _HandlerFila(fila)
+    handler.addFilter(FiltroAmostragem(taxas_amostragem(config.get("LOG_AMOSTRAGEM", ""))))
+    handler.addFilter(FiltroContexto())
+
+    app.logger.removeHandler(default_handler)
+    for antigo in [h for h in app.logger.handlers if isinstance(h, _HandlerFila)]:
+        app.logger.removeHandler(antigo)
+    app.logger.addHandler(handler)
+    app.logger.setLevel(config.get("LOG_NIVEL", "INFO"))
+    app.logger.propagate = False
+
+    if _ouvinte is not None:
+        _ouvinte.stop()
+    _ouvinte = _OuvinteFila(fila, saida, respect_handler_level=True)
+    _ouvinte.start()
+
+    @app.after_request
+    def devolver_request_id(resposta):
+        request_id = request_id_atual()
+        if request_id:
+            resposta.headers.setdefault(CABECALHO_REQUEST_ID, request_id)
+        return resposta
+
+
+def _encerrar() -> None:
+    if _ouvinte is not None:
+        _ouvinte.stop()
+
+
+atexit.register(_encerrar)
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import threading
+from typing import Any, Callable, Iterator
+
+from flask import current_app, has_app_context
+
+try:  # gevent só está ativo quando o servidor sobe via run.py (monkey.patch_all)
+    from gevent import monkey as gevent_monkey
+    from gevent.threadpool import ThreadPool
+except ImportError:  # pragma: no cover - depende do ambiente
+    gevent_monkey = None
+    ThreadPool = None
+
+# ==========================================================
+# 📄 Geração de PDF no servidor (WeasyPrint, opcional)
+# ==========================================================
+# Layout e escrita do PDF são CPU puro: com gevent ativo rodam num pool
+# pequeno de threads nativas, para não parar o loop (chat, filas) enquanto
+# um lote de folhas é montado. O PDF vai para um arquivo temporário, não
+# para a memória do worker.
+
+TAMANHO_BLOCO = 64 * 1024
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def pdf_disponivel() -> bool:
+    try:
+        import weasyprint  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _pool_pdf():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                tamanho = current_app.config.get("PDF_THREADPOOL_TAMANHO", 2) if has_app_context() else 2
+                _pool = ThreadPool(maxsize=tamanho)
+    return _pool
+
+
+def _executar(funcao: Callable, *args: Any) -> Any:
+    if gevent_monkey is not None and gevent_monkey.is_module_patched("threading"):
+        return _pool_pdf().apply(funcao, args)
+    return funcao(*args)
+
+
+def _gravar(html: str, base_url: str, caminho: str) -> None:
+    from weasyprint import HTML
+
+    HTML(string=html, base_url=base_url).write_pdf(caminho)
+
+
+def gerar_pdf(html: str, base_url: str) -> Iterator[bytes]:
+    """
+    Diagrama o HTML e grava o PDF em arquivo temporário, devolvido em
+    blocos (o PDF só fica válido no fim).
+    """
+    descritor, caminho = tempfile.mkstemp(suffix=".pdf")
+    os.close(descritor)
+    try:
+        _executar(_gravar, html, base_url, caminho)
+        with open(caminho, "rb") as arquivo:
+            while True:
+                bloco = arquivo.read(TAMANHO_BLOCO)
+                if not bloco:
+                    break
+                yield bloco
+    finally:
+        os.remove(caminho)
@@ -0,0 +1,284 @@
+import importlib
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional
+
+from flask import Flask, current_app, g, request
+from flask_login import current_user
+
+from .logs import request_id_atual
+
+try:  # gevent só está ativo quando o servidor sobe via run.py (monkey.patch_all)
+    from gevent import monkey as gevent_monkey
+    from greenlet import getcurrent, settrace
+except ImportError:  # pragma: no cover - depende do ambiente
+    gevent_monkey = None
+    getcurrent = None
+    settrace = None
+
+# ==========================================================
+# 🔬 Perfil por amostragem de uma requisição (sob demanda)
+# ==========================================================
+# Um admin liga o perfil de uma requisição com ?_perfil=1 ou o cabeçalho
+# X-Perfilar: 1. Uma thread nativa fotografa a pilha da requisição a cada
+# PERFIL_INTERVALO_MS e, no fim, grava as pilhas no formato "collapsed"
+# (uma linha "raiz;...;folha N"), aceito por flamegraph.pl e speedscope.
+# Com gevent, se o greenlet da requisição estiver parado (esperando banco ou
+# outra I/O), a amostra termina em "(aguardando)": separa Python de espera.
+# Se outro greenlet estiver com a thread, a amostra é descartada (a pilha
+# da thread seria a dele, não a da requisição).
+# Requisições sem o pedido de perfil só pagam duas consultas de dicionário.
+
+PARAMETRO = "_perfil"
+CABECALHO = "X-Perfilar"
+FOLHA_ESPERA = "(aguardando)"
+
+_NOME_VALIDO = re.compile(r"^[\w.-]+$")
+
+
+def _gevent_ativo() -> bool:
+    return gevent_monkey is not None and gevent_monkey.is_module_patched("threading")
+
+
+def _original(modulo: str, nome: str):
+    """Função da biblioteca padrão sem o patch do gevent (thread nativa)."""
+    if _gevent_ativo():
+        return gevent_monkey.get_original(modulo, nome)
+    return getattr(importlib.import_module(modulo), nome)
+
+
+# Greenlet que está rodando em cada thread, atualizado a cada troca por um
+# gancho do greenlet (settrace), ligado só enquanto houver perfil ativo
+_greenlet_rodando: dict = {}
+_gancho = {"ativos": 0, "anterior": None, "ident": None}
+
+
+def _rastrear_troca(evento, argumentos):
+    origem, destino = argumentos
+    if evento in ("switch", "throw"):
+        _greenlet_rodando[_gancho["ident"]()] = destino
+    anterior = _gancho["anterior"]
+    if anterior is not None:
+        anterior(evento, argumentos)
+
+
+def _ligar_rastreio() -> None:
+    """Chamado no greenlet da requisição (mesma thread do hub)."""
+    if _gancho["ativos"] == 0:
+        _gancho["ident"] = _original("_thread", "get_ident")
+        _gancho["anterior"] = settrace(_rastrear_troca)
+    _gancho["ativos"] += 1
+    _greenlet_rodando[_gancho["ident"]()] = getcurrent()
+
+
+def _desligar_rastreio() -> None:
+    _gancho["ativos"] -= 1
+    if _gancho["ativos"] == 0:
+        settrace(_gancho["anterior"])
+        _gancho["anterior"] = None
+        _greenlet_rodando.clear()
+
+
+def _nome_frame(frame) -> str:
+    modulo = frame.f_globals.get("__name__", "?")
+    return f"{modulo}:{frame.f_code.co_name}"
+
+
+class AmostradorPilhas:
+    """Amostra a pilha da thread (ou greenlet) que o criou até `parar()`."""
+
+    def __init__(self, intervalo_segundos: float, limite_segundos: float):
+        self.intervalo = intervalo_segundos
+        self.limite = limite_segundos
+        self.pilhas: Counter = Counter()
+        self.amostras = 0
+        self.amostras_espera = 0
+        self._thread_id = _original("_thread", "get_ident")()
+        self._greenlet = getcurrent() if _gevent_ativo() else None
+        self._ativo = False
+        self._rastreando = False
+        self._terminou = _original("_thread", "allocate_lock")()
+
+    def _frame_alvo(self):
+        if self._greenlet is not None:
+            frame = self._greenlet.gr_frame
+            if frame is not None:  # greenlet suspenso: esperando I/O ou a vez
+                return frame, True
+            if _greenlet_rodando.get(self._thread_id) is not self._greenlet:
+                return None, False  # a thread está com outro greenlet
+        return sys._current_frames().get(self._thread_id), False
+
+    def _amostrar(self) -> None:
+        frame, esperando = self._frame_alvo()
+        if frame is None:
+            return
+        nomes = []
+        while frame is not None:
+            nomes.append(_nome_frame(frame))
+            frame = frame.f_back
+        nomes.reverse()
+        if esperando:
+            nomes.append(FOLHA_ESPERA)
+            self.amostras_espera += 1
+        self.pilhas[";".join(nomes)] += 1
+        self.amostras += 1
+
+    def _executar(self) -> None:
+        dormir = _original("time", "sleep")
+        fim = time.monotonic() + self.limite
+        try:
+            while self._ativo and time.monotonic() < fim:
+                self._amostrar()
+                dormir(self.intervalo)
+        finally:
+            self._terminou.release()
+
+    def iniciar(self) -> None:
+        self._rastreando = self._greenlet is not None
+        if self._rastreando:
+            _ligar_rastreio()
+        self._ativo = True
+        self._terminou.acquire()
+        self.inicio = time.perf_counter()
+        _original("_thread", "start_new_thread")(self._executar, ())
+
+    def parar(self) -> float:
+        """Encerra a amostragem e retorna a duração da requisição (ms)."""
+        duracao_ms = (time.perf_counter() - self.inicio) * 1000
+        self._ativo = False
+        # Espera a última amostra sem ceder o greenlet (trava nativa, curta)
+        self._terminou.acquire()
+        self._terminou.release()
+        if self._rastreando:
+            self._rastreando = False
+            _desligar_rastreio()
+        return duracao_ms
+
+    def collapsed(self) -> str:
+        return "".join(f"{pilha} {total}\n" for pilha, total in self.pilhas.most_common())
+
+
+# ==========================================================
+# 💾 Perfis gravados em disco
+# ==========================================================
+def diretorio_perfis() -> str:
+    diretorio = current_app.config["PERFIL_DIR"]
+    if not os.path.isabs(diretorio):
+        diretorio = os.path.join(os.path.dirname(current_app.root_path), diretorio)
+    return diretorio
+
+
+def _gravar(amostrador: AmostradorPilhas, status: int, duracao_ms: float) -> str:
+    diretorio = diretorio_perfis()
+    os.makedirs(diretorio, exist_ok=True)
+    agora = datetime.now()
+    # O request_id pode vir do cliente: só letras, dígitos, "_" e "-"
+    sufixo = re.sub(r"[^\w-]", "", request_id_atual() or "")[:40] or str(os.getpid())
+    nome = f"{agora:%Y%m%d-%H%M%S}_{sufixo}"
+    meta = {
+        "nome": nome,
+        "criado_em": agora.isoformat(timespec="seconds"),
+        "metodo": request.method,
+        "caminho": request.path,
+        "endpoint": request.endpoint,
+        "status": status,
+        "duracao_ms": round(duracao_ms, 1),
+        "amostras": amostrador.amostras,
+        "amostras_espera": amostrador.amostras_espera,
+        "intervalo_ms": round(amostrador.intervalo * 1000, 1),
+        "usuario_id": current_user.id,
+    }
+    with open(os.path.join(diretorio, f"{nome}.folded"), "w", encoding="utf-8") as arquivo:
+        arquivo.write(amostrador.collapsed())
+    with open(os.path.join(diretorio, f"{nome}.json"), "w", encoding="utf-8") as arquivo:
+        json.dump(meta, arquivo, ensure_ascii=False)
+    _podar(diretorio, current_app.config["PERFIL_MAX_ARQUIVOS"])
+    return nome
+
+
+def _podar(diretorio: str, maximo: int) -> None:
+    """Mantém só os `maximo` perfis mais recentes."""
+    nomes = sorted(arquivo[:-5] for arquivo in os.listdir(diretorio) if arquivo.endswith(".json"))
+    for nome in nomes[:-maximo] if maximo > 0 else []:
+        for extensao in (".json", ".folded"):
+            try:
+                os.remove(os.path.join(diretorio, nome + extensao))
+            except FileNotFoundError:
+                pass
+
+
+def listar_perfis() -> List[dict]:
+    diretorio = diretorio_perfis()
+    if not os.path.isdir(diretorio):
+        return []
+    perfis = []
+    for arquivo in sorted(os.listdir(diretorio), reverse=True):
+        if arquivo.endswith(".json"):
+            with open(os.path.join(diretorio, arquivo), encoding="utf-8") as entrada:
+                perfis.append(json.load(entrada))
+    return perfis
+
+
+def obter_perfil(nome: str, limite: int = 25) -> Optional[dict]:
+    """Metadados + funções com mais amostras (próprias e incluindo chamadas)."""
+    if not _NOME_VALIDO.match(nome):
+        return None
+    base = os.path.join(diretorio_perfis(), nome)
+    if not os.path.exists(base + ".json") or not os.path.exists(base + ".folded"):
+        return None
+    with open(base + ".json", encoding="utf-8") as entrada:
+        perfil = json.load(entrada)
+
+    proprias, inclusivas = Counter(), Counter()
+    with open(base + ".folded", encoding="utf-8") as entrada:
+        for linha in entrada:
+            pilha, _, total = linha.rstrip("\n").rpartition(" ")
+            frames = pilha.split(";")
+            proprias[frames[-1]] += int(total)
+            for frame in set(frames):
+                inclusivas[frame] += int(total)
+    perfil["proprias"] = proprias.most_common(limite)
+    perfil["inclusivas"] = inclusivas.most_common(limite)
+    return perfil
+
+
+# ==========================================================
+# 🔌 Ganchos da requisição
+# ==========================================================
+def _pedido_de_perfil() -> bool:
+    return request.args.get(PARAMETRO) == "1" or request.headers.get(CABECALHO) == "1"
+
+
+def configurar_perfilador(app: Flask) -> None:
+    @app.before_request
+    def iniciar_perfil():
+        if not _pedido_de_perfil():
+            return
+        if not current_user.is_authenticated or current_user.role != "admin":
+            return
+        config = current_app.config
+        g.perfil = AmostradorPilhas(config["PERFIL_INTERVALO_MS"] / 1000, config["PERFIL_MAX_SEGUNDOS"])
+        g.perfil.iniciar()
+
+    @app.after_request
+    def gravar_perfil(resposta):
+        amostrador = g.pop("perfil", None)
+        if amostrador is not None:
+            duracao_ms = amostrador.parar()
+            try:
+                resposta.headers["X-Perfil"] = _gravar(amostrador, resposta.status_code, duracao_ms)
+            except OSError:
+                current_app.logger.exception("Falha ao gravar o perfil da requisição")
+        return resposta
+
+    @app.teardown_request
+    def encerrar_perfil(_erro):
+        # Exceção não tratada pula o after_request: só para a amostragem
+        amostrador = g.pop("perfil", None)
+        if amostrador is not None:
+            amostrador.parar()
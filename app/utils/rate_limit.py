@@ -0,0 +1,50 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+from flask import request
+
+
+class LimiteTaxa:
+    """
+    Balde de fichas por chave (IP, CPF...): até `capacidade` eventos de uma vez,
+    repostos à razão de `capacidade` por `janela_segundos`. Em memória, por
+    processo; as chaves mais antigas são descartadas acima de `max_chaves`.
+    """
+
+    def __init__(self, capacidade: int, janela_segundos: float, max_chaves: int = 10000):
+        self.capacidade = capacidade
+        self.taxa = capacidade / janela_segundos
+        self.max_chaves = max_chaves
+        self._baldes: "OrderedDict[Hashable, tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _fichas(self, chave: Hashable, agora: float) -> float:
+        fichas, atualizado = self._baldes.get(chave, (self.capacidade, agora))
+        return min(self.capacidade, fichas + (agora - atualizado) * self.taxa)
+
+    def consumir(self, chave: Hashable) -> bool:
+        """Gasta uma ficha; retorna False se o limite da chave foi atingido."""
+        agora = time.monotonic()
+        with self._lock:
+            fichas = self._fichas(chave, agora)
+            permitido = fichas >= 1
+            self._baldes[chave] = (fichas - 1 if permitido else fichas, agora)
+            self._baldes.move_to_end(chave)
+            while len(self._baldes) > self.max_chaves:
+                self._baldes.popitem(last=False)
+            return permitido
+
+    def segundos_para_liberar(self, chave: Hashable) -> int:
+        with self._lock:
+            fichas = self._fichas(chave, time.monotonic())
+        return 0 if fichas >= 1 else int((1 - fichas) / self.taxa) + 1
+
+
+def ip_cliente() -> str:
+    """
+    IP usado como chave dos limites. Atrás de proxy reverso, o ProxyFix
+    (PROXIES_CONFIAVEIS) já trocou remote_addr pelo IP real do cliente.
+    """
+    return request.remote_addr or "-"
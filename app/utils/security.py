@@ -1,9 +1,46 @@
+import threading
+from typing import Any, Callable
+
+from flask import current_app, has_app_context
 from werkzeug.security import generate_password_hash, check_password_hash
 
+try:  # gevent só está ativo quando o servidor sobe via run.py (monkey.patch_all)
+    from gevent import monkey as gevent_monkey
+    from gevent.threadpool import ThreadPool
+except ImportError:  # pragma: no cover - depende do ambiente
+    gevent_monkey = None
+    ThreadPool = None
+
+# ==========================================================
+# 🔐 Hash de senha fora do loop do gevent
+# ==========================================================
+# pbkdf2/scrypt são puro CPU: rodando no greenlet, travariam todos os outros
+# (chat, filas) do worker. Com gevent ativo, o cálculo vai para um pool
+# limitado de threads nativas; o hashlib libera o GIL durante o hash.
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _pool_hash():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                tamanho = current_app.config.get("HASH_THREADPOOL_TAMANHO", 4) if has_app_context() else 4
+                _pool = ThreadPool(maxsize=tamanho)
+    return _pool
+
+
+def _executar(funcao: Callable, *args: Any, **kwargs: Any):
+    if gevent_monkey is not None and gevent_monkey.is_module_patched("threading"):
+        return _pool_hash().apply(funcao, args, kwargs)
+    return funcao(*args, **kwargs)
+
 
-def hash_password(password: str) -> str:
-    return generate_password_hash(password.strip())
+def hash_password(password: str, **opcoes: Any) -> str:
+    return _executar(generate_password_hash, password.strip(), **opcoes)
 
 
 def verify_password(password: str, hashed: str) -> bool:
-    return check_password_hash(hashed, password.strip())
\ No newline at end of file
+    return _executar(check_password_hash, hashed, password.strip())
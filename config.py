@@ -11,6 +11,9 @@ class Config:
     FLASK_ENV = os.getenv("FLASK_ENV", "production")
     SESSION_COOKIE_SECURE = False
     PERMANENT_SESSION_LIFETIME = timedelta(hours=6)
+    # Proxies reversos (nginx etc.) à frente da aplicação cujo X-Forwarded-For
+    # é confiável; 0 usa o IP da conexão (sem proxy). Vale para os limites por IP
+    PROXIES_CONFIAVEIS = int(os.getenv("PROXIES_CONFIAVEIS", "0"))
 
     MYSQL_HOST = os.getenv("MYSQL_HOST", "localhost")
     MYSQL_PORT = int(os.getenv("MYSQL_PORT", "3307"))
@@ -19,4 +22,83 @@ class Config:
     MYSQL_DATABASE = os.getenv("MYSQL_DATABASE", "")
     MYSQL_POOL_NAME = "central_reg_pool"
     MYSQL_POOL_SIZE = int(os.getenv("MYSQL_POOL_SIZE", "8"))
-    MYSQL_POOL_RESET_SESSION = True
\ No newline at end of file
+    MYSQL_POOL_RESET_SESSION = True
+
+    # Jobs em segundo plano (relatórios pesados)
+    JOBS_MAX_WORKERS = int(os.getenv("JOBS_MAX_WORKERS", "2"))
+    JOBS_TIMEOUT_SEGUNDOS = int(os.getenv("JOBS_TIMEOUT_SEGUNDOS", "900"))
+    # Intervalo do sinal de vida do job em execução (3 sem sinal = interrompido)
+    JOBS_SINAL_SEGUNDOS = int(os.getenv("JOBS_SINAL_SEGUNDOS", "30"))
+    # Dias que jobs finalizados (e seus resultados) ficam na tabela
+    JOBS_RETENCAO_DIAS = int(os.getenv("JOBS_RETENCAO_DIAS", "1"))
+    RELATORIOS_CACHE_TTL = int(os.getenv("RELATORIOS_CACHE_TTL", "600"))
+
+    # Arquivamento de dados antigos (scripts/arquivar.py)
+    ARQUIVAMENTO_PEDIDOS_DIAS = int(os.getenv("ARQUIVAMENTO_PEDIDOS_DIAS", "365"))
+    ARQUIVAMENTO_MENSAGENS_DIAS = int(os.getenv("ARQUIVAMENTO_MENSAGENS_DIAS", "180"))
+    ARQUIVAMENTO_TAMANHO_LOTE = int(os.getenv("ARQUIVAMENTO_TAMANHO_LOTE", "500"))
+    ARQUIVAMENTO_PAUSA_SEGUNDOS = float(os.getenv("ARQUIVAMENTO_PAUSA_SEGUNDOS", "0.5"))
+
+    # Snapshot colunar para análises (scripts/exportar_snapshot.py, execução noturna)
+    ANALYTICS_SNAPSHOT_PATH = os.getenv("ANALYTICS_SNAPSHOT_PATH", "instance/analytics/snapshot.npz")
+
+    # Autocomplete de pacientes no formulário de pedidos
+    PACIENTES_BUSCA_CACHE_TTL = int(os.getenv("PACIENTES_BUSCA_CACHE_TTL", "30"))
+
+    # Intervalo máximo (s) para um worker perceber a invalidação feita por outro
+    CACHE_VERSAO_TTL = float(os.getenv("CACHE_VERSAO_TTL", "2"))
+    # Tempo máximo (s) que o load_user reaproveita os dados do usuário
+    USUARIOS_CACHE_TTL = int(os.getenv("USUARIOS_CACHE_TTL", "60"))
+
+    # Login: threads nativas para o hash de senha e limite de tentativas
+    HASH_THREADPOOL_TAMANHO = int(os.getenv("HASH_THREADPOOL_TAMANHO", "4"))
+    LOGIN_LIMITE_POR_IP = int(os.getenv("LOGIN_LIMITE_POR_IP", "30"))
+    LOGIN_LIMITE_POR_CPF = int(os.getenv("LOGIN_LIMITE_POR_CPF", "5"))
+    LOGIN_LIMITE_JANELA_SEGUNDOS = int(os.getenv("LOGIN_LIMITE_JANELA_SEGUNDOS", "60"))
+
+    # Templates: cache de bytecode em disco ("" desativa) e compilação na subida
+    JINJA_BYTECODE_CACHE_DIR = os.getenv("JINJA_BYTECODE_CACHE_DIR", "instance/jinja_cache")
+    JINJA_AQUECER_TEMPLATES = os.getenv("JINJA_AQUECER_TEMPLATES", "0") == "1"
+    # Limite do cache de trechos de HTML das filas (LRU, por worker)
+    FRAGMENTOS_CACHE_MAX_BYTES = int(os.getenv("FRAGMENTOS_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+    # Reserva (lease) de pedidos na fila do médico regulador: duração
+    REGULACAO_RESERVA_SEGUNDOS = int(os.getenv("REGULACAO_RESERVA_SEGUNDOS", "300"))
+
+    # Fila de ligações do agendador: reserva do paciente em atendimento e
+    # intervalo mínimo até a próxima tentativa, por resultado do contato
+    AGENDAMENTO_LIGACAO_RESERVA_SEGUNDOS = int(os.getenv("AGENDAMENTO_LIGACAO_RESERVA_SEGUNDOS", "600"))
+    AGENDAMENTO_INTERVALO_SEM_CONTATO_MINUTOS = int(os.getenv("AGENDAMENTO_INTERVALO_SEM_CONTATO_MINUTOS", "120"))
+    AGENDAMENTO_INTERVALO_RECADO_MINUTOS = int(os.getenv("AGENDAMENTO_INTERVALO_RECADO_MINUTOS", "240"))
+
+    # Acompanhamento público por CPF: limite por IP e cache das respostas
+    ACOMPANHAMENTO_LIMITE_POR_IP = int(os.getenv("ACOMPANHAMENTO_LIMITE_POR_IP", "20"))
+    ACOMPANHAMENTO_LIMITE_JANELA_SEGUNDOS = int(os.getenv("ACOMPANHAMENTO_LIMITE_JANELA_SEGUNDOS", "60"))
+    ACOMPANHAMENTO_CACHE_TTL = int(os.getenv("ACOMPANHAMENTO_CACHE_TTL", "600"))
+    ACOMPANHAMENTO_CACHE_MAX_ITENS = int(os.getenv("ACOMPANHAMENTO_CACHE_MAX_ITENS", "5000"))
+
+    # Logs: nível, formato ("json" ou "texto") e fração mantida dos eventos
+    # frequentes ("evento=taxa,..."; avisos e erros nunca são amostrados)
+    LOG_NIVEL = os.getenv("LOG_NIVEL", "INFO")
+    LOG_FORMATO = os.getenv("LOG_FORMATO", "json")
+    LOG_AMOSTRAGEM = os.getenv(
+        "LOG_AMOSTRAGEM", "chat.mensagem=0.1,socket.conexao=0.2,socket.desconexao=0.2,socket.entrar_sala=0.05"
+    )
+
+    # Perfil sob demanda (admin, ?_perfil=1 ou X-Perfilar: 1): intervalo entre
+    # amostras, duração máxima, onde gravar e quantos perfis manter
+    PERFIL_INTERVALO_MS = float(os.getenv("PERFIL_INTERVALO_MS", "5"))
+    PERFIL_MAX_SEGUNDOS = int(os.getenv("PERFIL_MAX_SEGUNDOS", "60"))
+    PERFIL_DIR = os.getenv("PERFIL_DIR", "instance/perfis")
+    PERFIL_MAX_ARQUIVOS = int(os.getenv("PERFIL_MAX_ARQUIVOS", "50"))
+
+    # Importação de pedidos por planilha (recepção e scripts/importar_pedidos.py):
+    # linhas gravadas por transação e máximo de linhas por arquivo
+    IMPORTACAO_TAMANHO_LOTE = int(os.getenv("IMPORTACAO_TAMANHO_LOTE", "500"))
+    IMPORTACAO_MAX_LINHAS = int(os.getenv("IMPORTACAO_MAX_LINHAS", "20000"))
+
+    # Impressão de folhas em lote (PDF via WeasyPrint, opcional): máximo de
+    # pedidos por lote (o lote é diagramado de uma vez) e threads nativas
+    # para o layout
+    IMPRESSAO_MAX_PEDIDOS = int(os.getenv("IMPRESSAO_MAX_PEDIDOS", "150"))
+    PDF_THREADPOOL_TAMANHO = int(os.getenv("PDF_THREADPOOL_TAMANHO", "2"))
@@ -0,0 +1,30 @@
+import argparse
+
+from app import create_app
+from app.services import arquivamento_service
+
+app = create_app()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Arquiva pedidos encerrados antigos (com histórico e tentativas) e mensagens antigas do chat."
+    )
+    parser.add_argument("--dias-pedidos", type=int, help="Idade mínima, em dias, dos pedidos encerrados.")
+    parser.add_argument("--dias-mensagens", type=int, help="Idade mínima, em dias, das mensagens do chat.")
+    parser.add_argument("--tamanho-lote", type=int, help="Registros movidos por transação.")
+    parser.add_argument("--max-lotes", type=int, help="Interrompe após N lotes (útil para janelas curtas).")
+    parser.add_argument("--somente", choices=["pedidos", "mensagens"])
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.somente in (None, "pedidos"):
+            total = arquivamento_service.arquivar_pedidos(args.dias_pedidos, args.tamanho_lote, args.max_lotes)
+            print(f"Pedidos arquivados: {total}.")
+        if args.somente in (None, "mensagens"):
+            total = arquivamento_service.arquivar_mensagens(args.dias_mensagens, args.tamanho_lote, args.max_lotes)
+            print(f"Mensagens arquivadas: {total}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import argparse
+import http.cookiejar
+import json
+import random
+import statistics
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# ==========================================================
+# ⏱️ Benchmark HTTP das páginas e APIs principais
+# ==========================================================
+# Mede latência (p50/p95/p99) e vazão de cada endpoint contra um servidor já
+# rodando (python run.py) sobre a base do scripts/benchmark_popular.py, e grava
+# um relatório JSON para comparar versões (--comparar relatorio_anterior.json).
+# Não importa a aplicação: pode rodar de outra máquina, só com a biblioteca
+# padrão. Para medir o acompanhamento público, suba o servidor com um
+# ACOMPANHAMENTO_LIMITE_POR_IP alto; senão os 429 aparecem como erros.
+
+# nome -> (perfil logado ou None, método, caminho, formulário);
+# "{cpf}" e "{conversa}" são sorteados do manifesto a cada requisição
+ENDPOINTS = {
+    "reception.listar_pedidos": ("recepcao", "GET", "/recepcao/pedidos", None),
+    "malote.listar": ("malote", "GET", "/malote/pedidos", None),
+    "regulator.painel": ("medico_regulador", "GET", "/regulador/painel", None),
+    "scheduling.lista": ("agendador_municipal", "GET", "/agendamento/municipal", None),
+    "dashboards.home": ("admin", "GET", "/", None),
+    "dashboards.relatorios": ("admin", "GET", "/relatorios", None),
+    "reception.acompanhar_pedido": (None, "POST", "/recepcao/acompanhamento", {"cpf": "{cpf}"}),
+    "chat.list_conversations": ("admin", "GET", "/chat/conversas", None),
+    "chat.get_users": ("admin", "GET", "/chat/usuarios", None),
+    "chat.get_messages": ("admin", "GET", "/chat/mensagens/{conversa}", None),
+}
+
+
+class Cliente:
+    """Sessão HTTP (cookies) de um perfil; compartilhada entre as threads."""
+
+    def __init__(self, base_url: str, timeout: float):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+
+    def requisitar(self, metodo: str, caminho: str, dados: dict | None = None) -> tuple[int, int, str]:
+        """Retorna (status, bytes do corpo, url final)."""
+        corpo = urllib.parse.urlencode(dados).encode() if dados is not None else None
+        pedido = urllib.request.Request(self.base_url + caminho, data=corpo, method=metodo)
+        try:
+            with self.opener.open(pedido, timeout=self.timeout) as resposta:
+                return resposta.status, len(resposta.read()), resposta.geturl()
+        except urllib.error.HTTPError as erro:
+            return erro.code, len(erro.read() or b""), erro.geturl()
+
+    def login(self, cpf: str, senha: str) -> None:
+        status, _, url_final = self.requisitar("POST", "/login", {"cpf": cpf, "senha": senha})
+        if status != 200 or urllib.parse.urlparse(url_final).path.rstrip("/").endswith("/login"):
+            raise SystemExit(f"Falha no login do CPF {cpf} (status {status}).")
+
+
+def _sortear(modelo: str, manifesto: dict, rng: random.Random) -> str:
+    if "{conversa}" in modelo:
+        modelo = modelo.replace("{conversa}", str(rng.choice(manifesto["conversas_admin"])))
+    if "{cpf}" in modelo:
+        modelo = modelo.replace("{cpf}", rng.choice(manifesto["pacientes_cpf"]))
+    return modelo
+
+
+def _percentis(latencias: list[float]) -> dict:
+    if len(latencias) < 2:
+        valor = round(latencias[0], 2) if latencias else None
+        return {"p50": valor, "p95": valor, "p99": valor, "media": valor, "max": valor}
+    cortes = statistics.quantiles(latencias, n=100, method="inclusive")
+    return {
+        "p50": round(cortes[49], 2),
+        "p95": round(cortes[94], 2),
+        "p99": round(cortes[98], 2),
+        "media": round(statistics.fmean(latencias), 2),
+        "max": round(max(latencias), 2),
+    }
+
+
+def medir(cliente: Cliente, nome: str, manifesto: dict, requisicoes: int,
+          concorrencia: int, aquecimento: int, semente: int) -> dict:
+    _, metodo, modelo, formulario = ENDPOINTS[nome]
+    rng = random.Random(semente)
+    rng_lock = threading.Lock()
+    latencias, status, tamanhos = [], Counter(), []
+
+    def uma(registrar: bool) -> None:
+        with rng_lock:
+            caminho = _sortear(modelo, manifesto, rng)
+            dados = {chave: _sortear(valor, manifesto, rng) for chave, valor in formulario.items()} if formulario else None
+        inicio = time.perf_counter()
+        codigo, tamanho, _ = cliente.requisitar(metodo, caminho, dados)
+        decorrido_ms = (time.perf_counter() - inicio) * 1000
+        if registrar:
+            status[codigo] += 1
+            if codigo < 400:
+                latencias.append(decorrido_ms)
+                tamanhos.append(tamanho)
+
+    for _ in range(aquecimento):
+        uma(False)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        for futuro in [executor.submit(uma, True) for _ in range(requisicoes)]:
+            futuro.result()
+    duracao = time.perf_counter() - inicio
+
+    return {
+        "requisicoes": requisicoes,
+        "erros": sum(total for codigo, total in status.items() if codigo >= 400),
+        "status": {str(codigo): total for codigo, total in sorted(status.items())},
+        "latencia_ms": _percentis(latencias),
+        "vazao_rps": round(len(latencias) / duracao, 2) if duracao else None,
+        "bytes_medio": round(statistics.fmean(tamanhos)) if tamanhos else None,
+    }
+
+
+def _commit_atual() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _variacao(atual, anterior) -> str:
+    if not atual or not anterior:
+        return "—"
+    return f"{(atual - anterior) / anterior * 100:+.1f}%"
+
+
+def imprimir(relatorio: dict, anterior: dict | None) -> None:
+    print(f"\n{'endpoint':30} {'p50':>9} {'p95':>9} {'p99':>9} {'req/s':>9} {'erros':>6}")
+    for nome, resultado in relatorio["endpoints"].items():
+        latencia = resultado["latencia_ms"]
+        print(
+            f"{nome:30} {latencia['p50'] or 0:9.1f} {latencia['p95'] or 0:9.1f} {latencia['p99'] or 0:9.1f} "
+            f"{resultado['vazao_rps'] or 0:9.1f} {resultado['erros']:6d}"
+        )
+        base = (anterior or {}).get("endpoints", {}).get(nome)
+        if base:
+            print(
+                f"{'  vs. ' + (anterior['versao'].get('commit') or '?'):30} "
+                f"{_variacao(latencia['p50'], base['latencia_ms']['p50']):>9} "
+                f"{_variacao(latencia['p95'], base['latencia_ms']['p95']):>9} "
+                f"{_variacao(latencia['p99'], base['latencia_ms']['p99']):>9} "
+                f"{_variacao(resultado['vazao_rps'], base['vazao_rps']):>9}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Mede latência (p50/p95/p99) e vazão dos endpoints principais e grava um relatório JSON."
+    )
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="Servidor em execução.")
+    parser.add_argument("--manifesto", default="benchmark_manifesto.json", help="Gerado pelo benchmark_popular.py.")
+    parser.add_argument("--requisicoes", type=int, default=200, help="Requisições medidas por endpoint.")
+    parser.add_argument("--concorrencia", type=int, default=8)
+    parser.add_argument("--aquecimento", type=int, default=10, help="Requisições descartadas antes de medir.")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--somente", nargs="+", choices=sorted(ENDPOINTS), help="Mede só estes endpoints.")
+    parser.add_argument("--rotulo", help="Identifica a execução no relatório (ex.: nome do branch).")
+    parser.add_argument("--saida", default=None, help="Arquivo do relatório (padrão: benchmark_<data>.json).")
+    parser.add_argument("--comparar", help="Relatório anterior para mostrar a variação.")
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    with open(args.manifesto, encoding="utf-8") as arquivo:
+        manifesto = json.load(arquivo)
+
+    clientes = {}
+    nomes = args.somente or list(ENDPOINTS)
+    for nome in nomes:
+        perfil = ENDPOINTS[nome][0]
+        if perfil not in clientes:
+            clientes[perfil] = Cliente(args.url, args.timeout)
+            if perfil is not None:
+                clientes[perfil].login(manifesto["usuarios"][perfil], manifesto["senha"])
+
+    agora = datetime.now()
+    relatorio = {
+        "versao": {"commit": _commit_atual(), "rotulo": args.rotulo},
+        "gerado_em": agora.isoformat(timespec="seconds"),
+        "url": args.url,
+        "parametros": {
+            "requisicoes": args.requisicoes,
+            "concorrencia": args.concorrencia,
+            "aquecimento": args.aquecimento,
+            "volumes": manifesto.get("volumes"),
+        },
+        "endpoints": {},
+    }
+    for nome in nomes:
+        print(f"Medindo {nome}...", flush=True)
+        relatorio["endpoints"][nome] = medir(
+            clientes[ENDPOINTS[nome][0]], nome, manifesto,
+            args.requisicoes, args.concorrencia, args.aquecimento, args.semente,
+        )
+
+    saida = args.saida or f"benchmark_{agora:%Y%m%d-%H%M%S}.json"
+    with open(saida, "w", encoding="utf-8") as arquivo:
+        json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+
+    anterior = None
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as arquivo:
+            anterior = json.load(arquivo)
+    imprimir(relatorio, anterior)
+    print(f"\nRelatório gravado em {saida}.")
+
+
+if __name__ == "__main__":
+    main()
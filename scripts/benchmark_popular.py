@@ -0,0 +1,394 @@
+import argparse
+import json
+import random
+import sys
+import time
+from array import array
+from datetime import datetime, timedelta
+
+from app import create_app
+from app.domain.status import StatusPedido
+from app.extensions import mysql
+from app.services import cache_service
+from app.utils.security import hash_password
+
+app = create_app()
+
+# ==========================================================
+# 🌱 Base de benchmark com volumes realistas
+# ==========================================================
+# Popula um MySQL LOCAL (nunca o de produção) com unidades, pacientes, pedidos,
+# histórico e mensagens do chat em INSERTs de várias linhas, e grava um
+# manifesto (usuários por perfil, CPFs e conversas de amostra) usado pelos
+# scripts/benchmark_http.py e scripts/benchmark_socketio.py. Os ids são atribuídos aqui, a partir do maior id
+# de cada tabela, para o histórico e as mensagens apontarem para eles sem
+# consultas extras. Pode ser executado de novo: acrescenta mais dados.
+# Só roda com MYSQL_HOST local ou com --confirmar-base igual ao nome da base.
+
+HOSTS_LOCAIS = {"localhost", "127.0.0.1", "::1"}
+
+# Usuários do benchmark: CPF fixo por perfil (99 + 9 dígitos)
+USUARIOS_BENCHMARK = [
+    ("admin", "99000000001"),
+    ("recepcao", "99000000002"),
+    ("malote", "99000000003"),
+    ("medico_regulador", "99000000004"),
+    ("agendador_municipal", "99000000005"),
+    ("agendador_estadual", "99000000006"),
+]
+
+# Distribuição dos status (pesos): a maior parte já encerrada, como em produção
+PESOS_STATUS = [
+    (StatusPedido.RECEBIDO, 2),
+    (StatusPedido.AGUARDANDO_TRIAGEM, 3),
+    (StatusPedido.CANCELADO_RECEPCAO, 2),
+    (StatusPedido.AGUARDANDO_ANALISE_MEDICO_MUNICIPAL, 4),
+    (StatusPedido.AGUARDANDO_ANALISE_MEDICO_ESTADUAL, 2),
+    (StatusPedido.DEVOLVIDO_PELO_MEDICO, 1),
+    (StatusPedido.CANCELADO_MEDICO, 2),
+    (StatusPedido.APROVADO_MUNICIPAL, 5),
+    (StatusPedido.APROVADO_ESTADUAL, 3),
+    (StatusPedido.AGENDAMENTO_EM_ANDAMENTO, 3),
+    (StatusPedido.AGENDAMENTO_CONFIRMADO, 15),
+    (StatusPedido.DEVOLVIDO_SEM_CONTATO, 2),
+    (StatusPedido.RETIRADO, 56),
+]
+STATUS_ENCERRADOS = {
+    StatusPedido.RETIRADO,
+    StatusPedido.CANCELADO_RECEPCAO,
+    StatusPedido.CANCELADO_MEDICO,
+    StatusPedido.AGENDAMENTO_CONFIRMADO,
+}
+STATUS_SEM_REGULACAO = {
+    StatusPedido.RECEBIDO,
+    StatusPedido.AGUARDANDO_TRIAGEM,
+    StatusPedido.CANCELADO_RECEPCAO,
+}
+# Caminho típico de um pedido, usado para montar o histórico
+PERCURSO = [
+    StatusPedido.RECEBIDO,
+    StatusPedido.AGUARDANDO_TRIAGEM,
+    StatusPedido.AGUARDANDO_ANALISE_MEDICO_MUNICIPAL,
+    StatusPedido.APROVADO_MUNICIPAL,
+    StatusPedido.AGENDAMENTO_EM_ANDAMENTO,
+    StatusPedido.AGENDAMENTO_CONFIRMADO,
+    StatusPedido.RETIRADO,
+]
+
+PALAVRAS = (
+    "paciente pedido exame consulta agenda amanhã hoje confirmado retorno unidade "
+    "ligação telefone documento guia regulação prioridade ok obrigado favor verificar"
+).split()
+
+
+def _inserir(tabela: str, colunas: list[str], linhas: list[tuple]) -> None:
+    """Um único INSERT com todas as linhas do lote, numa transação."""
+    if not linhas:
+        return
+    grupo = "(" + ", ".join(["%s"] * len(colunas)) + ")"
+    query = f"INSERT INTO {tabela} ({', '.join(colunas)}) VALUES " + ", ".join([grupo] * len(linhas))
+    valores = [valor for linha in linhas for valor in linha]
+    with mysql.get_cursor(dictionary=False) as (_, cursor):
+        # Os ids gerados aqui já são consistentes: dispensa as checagens por linha
+        cursor.execute("SET SESSION foreign_key_checks = 0, unique_checks = 0")
+        cursor.execute(query, valores)
+
+
+def _em_lotes(tabela: str, colunas: list[str], linhas, total: int, tamanho_lote: int) -> None:
+    lote = []
+    inseridas = 0
+    inicio = time.monotonic()
+    for linha in linhas:
+        lote.append(linha)
+        if len(lote) >= tamanho_lote:
+            _inserir(tabela, colunas, lote)
+            inseridas += len(lote)
+            lote = []
+            decorrido = time.monotonic() - inicio
+            print(f"\r  {tabela}: {inseridas}/{total} ({inseridas / decorrido:,.0f} linhas/s)", end="", flush=True)
+    _inserir(tabela, colunas, lote)
+    inseridas += len(lote)
+    print(f"\r  {tabela}: {inseridas}/{total} em {time.monotonic() - inicio:.1f}s" + " " * 20)
+
+
+def _proximo_id(tabela: str) -> int:
+    with mysql.get_cursor() as (_, cursor):
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) + 1 AS proximo FROM {tabela}")
+        return cursor.fetchone()["proximo"]
+
+
+def _ids(tabela: str) -> list[int]:
+    with mysql.get_cursor() as (_, cursor):
+        cursor.execute(f"SELECT id FROM {tabela} ORDER BY id")
+        return [linha["id"] for linha in cursor.fetchall()]
+
+
+def _garantir_referencias(rng: random.Random) -> tuple[list[int], list[int]]:
+    """Exames e especialidades suficientes para variar os pedidos."""
+    exames, consultas = _ids("exames"), _ids("consultas")
+    if len(exames) < 40:
+        _inserir("exames", ["nome"], [(f"Exame benchmark {i}",) for i in range(len(exames), 40)])
+    if len(consultas) < 15:
+        _inserir(
+            "consultas", ["nome", "especialidade"],
+            [(f"Consulta benchmark {i}", rng.choice(["Cardiologia", "Ortopedia", "Neurologia"]))
+             for i in range(len(consultas), 15)],
+        )
+    return _ids("exames"), _ids("consultas")
+
+
+def _criar_unidades(quantidade: int) -> list[int]:
+    inicio = _proximo_id("unidades_saude")
+    _inserir(
+        "unidades_saude", ["id", "nome", "codigo", "telefone"],
+        [(inicio + i, f"Unidade Benchmark {inicio + i}", f"BM{inicio + i:05d}", "6130000000")
+         for i in range(quantidade)],
+    )
+    return _ids("unidades_saude")
+
+
+def _criar_usuarios(senha: str, unidade_id: int, extras: int) -> tuple[dict, dict]:
+    """Usuários de cada perfil (CPF fixo) e `extras` usuários para o chat."""
+    senha_hash = hash_password(senha)
+    query = """
+        INSERT INTO usuarios (nome, cpf, senha_hash, role, unidade_id, tipo_agendador, ativo)
+        VALUES (%s, %s, %s, %s, %s, %s, 1)
+        ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id), senha_hash = VALUES(senha_hash), ativo = 1
+    """
+    por_perfil = {}
+    with mysql.get_cursor() as (_, cursor):
+        for role, cpf in USUARIOS_BENCHMARK:
+            tipo_agendador = "exame" if role.startswith("agendador") else None
+            unidade = unidade_id if role == "recepcao" else None
+            cursor.execute(query, (f"Benchmark {role}", cpf, senha_hash, role, unidade, tipo_agendador))
+            por_perfil[role] = {"id": cursor.lastrowid, "cpf": cpf}
+        chat = {}  # id -> cpf
+        for i in range(extras):
+            cpf = f"98{i:09d}"
+            cursor.execute(query, (f"Benchmark chat {i}", cpf, senha_hash, "recepcao_regulacao", None, None))
+            chat[cursor.lastrowid] = cpf
+    return por_perfil, chat
+
+
+def _pedidos(rng, inicio_id, total, pacientes, unidades, exames, consultas, usuario_id, datas, agora):
+    status_lista = [status for status, _ in PESOS_STATUS]
+    pesos = [peso for _, peso in PESOS_STATUS]
+    for i in range(total):
+        status = rng.choices(status_lista, pesos)[0]
+        # Pedidos ainda em andamento são recentes; os encerrados, de até 2 anos
+        dias = rng.uniform(0, 730 if status in STATUS_ENCERRADOS else 60)
+        data = agora - timedelta(days=dias)
+        datas.append(data.timestamp())
+
+        valor = status.value
+        if status in STATUS_SEM_REGULACAO:
+            tipo_regulacao, prioridade = None, None
+        else:
+            if "municipal" in valor:
+                tipo_regulacao = "municipal"
+            elif "estadual" in valor:
+                tipo_regulacao = "estadual"
+            else:
+                tipo_regulacao = "municipal" if rng.random() < 0.7 else "estadual"
+            prioridade = "P1" if rng.random() < 0.2 else "P2"
+
+        e_consulta = rng.random() < 0.2
+        agendado = status in (StatusPedido.AGENDAMENTO_CONFIRMADO, StatusPedido.RETIRADO)
+        yield (
+            inicio_id + i,
+            rng.choice(pacientes),
+            None if e_consulta else rng.choice(exames),
+            rng.choice(consultas) if e_consulta else None,
+            rng.choice(unidades),
+            "consulta" if e_consulta else "exame",
+            valor,
+            tipo_regulacao,
+            prioridade,
+            data,
+            data + timedelta(days=min(dias, rng.uniform(0, 20))),
+            usuario_id,
+            usuario_id,
+            (data + timedelta(days=rng.randint(10, 90))).date() if agendado else None,
+            f"{rng.randint(7, 17):02d}:{rng.choice(['00', '30'])}:00" if agendado else None,
+            "Hospital Regional" if agendado else None,
+            rng.randint(0, 3) if status == StatusPedido.AGENDAMENTO_EM_ANDAMENTO else 0,
+            1 if status == StatusPedido.RETIRADO else 0,
+        )
+
+
+def _historico(rng, inicio_pedido, datas, total, usuario_id):
+    """Distribui `total` eventos pelos pedidos, seguindo o percurso típico."""
+    quantidade_pedidos = len(datas)
+    base, sobra = divmod(total, quantidade_pedidos)
+    for indice in range(quantidade_pedidos):
+        eventos = base + (1 if indice < sobra else 0)
+        data = datetime.fromtimestamp(datas[indice])
+        for passo in range(eventos):
+            status = PERCURSO[min(passo, len(PERCURSO) - 1)]
+            yield (
+                inicio_pedido + indice,
+                status.value,
+                "Evento gerado para benchmark",
+                usuario_id,
+                data + timedelta(hours=passo * rng.randint(1, 48)),
+            )
+
+
+def _mensagens(rng, conversas, total, agora):
+    for _ in range(total):
+        conversa_id, participantes = rng.choice(conversas)
+        texto = " ".join(rng.choices(PALAVRAS, k=rng.randint(2, 18)))
+        yield (conversa_id, rng.choice(participantes), texto, agora - timedelta(minutes=rng.uniform(0, 525600)))
+
+
+def _conferir_base(confirmar_base: str | None) -> None:
+    """Recusa popular uma base remota que não foi confirmada pelo nome."""
+    host = app.config["MYSQL_HOST"]
+    with mysql.get_cursor() as (_, cursor):
+        cursor.execute("SELECT DATABASE() AS base")
+        base = cursor.fetchone()["base"]
+    if host in HOSTS_LOCAIS or (confirmar_base and confirmar_base == base):
+        print(f"Populando a base {base} em {host}.")
+        return
+    print(
+        f"MYSQL_HOST={host} não é local. Se a base {base} é mesmo a de benchmark, "
+        f"rode de novo com --confirmar-base {base}."
+    )
+    sys.exit(2)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Popula um banco LOCAL com volumes realistas para o benchmark HTTP."
+    )
+    parser.add_argument("--unidades", type=int, default=50)
+    parser.add_argument("--pacientes", type=int, default=200_000)
+    parser.add_argument("--pedidos", type=int, default=1_000_000)
+    parser.add_argument("--historico", type=int, default=5_000_000, help="Linhas de historico_pedidos.")
+    parser.add_argument("--mensagens", type=int, default=1_000_000, help="Mensagens do chat.")
+    parser.add_argument("--usuarios-chat", type=int, default=100, help="Usuários extras que conversam no chat.")
+    parser.add_argument("--escala", type=float, default=1.0, help="Multiplica todos os volumes (ex.: 0.01).")
+    parser.add_argument("--tamanho-lote", type=int, default=2000, help="Linhas por INSERT.")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--senha", required=True, help="Senha dos usuários do benchmark.")
+    parser.add_argument(
+        "--confirmar-base", help="Nome da base, obrigatório quando MYSQL_HOST não é local."
+    )
+    parser.add_argument("--manifesto", default="benchmark_manifesto.json")
+    args = parser.parse_args()
+
+    def escalar(valor: int) -> int:
+        return max(1, int(valor * args.escala))
+
+    rng = random.Random(args.semente)
+    agora = datetime.now().replace(microsecond=0)
+    lote = args.tamanho_lote
+
+    with app.app_context():
+        _conferir_base(args.confirmar_base)
+        exames, consultas = _garantir_referencias(rng)
+        unidades = _criar_unidades(escalar(args.unidades))
+        usuarios, usuarios_chat = _criar_usuarios(args.senha, unidades[-1], escalar(args.usuarios_chat))
+        recepcao_id = usuarios["recepcao"]["id"]
+        print(f"Unidades: {len(unidades)}, usuários do benchmark: {len(usuarios) + len(usuarios_chat)}.")
+
+        total = escalar(args.pacientes)
+        inicio_paciente = _proximo_id("pacientes")
+        _em_lotes(
+            "pacientes",
+            ["id", "nome", "cpf", "data_nascimento", "telefone_principal", "unidade_id"],
+            (
+                (
+                    inicio_paciente + i,
+                    f"Paciente Benchmark {inicio_paciente + i}",
+                    f"7{inicio_paciente + i:010d}",
+                    (agora - timedelta(days=rng.randint(365, 32000))).date(),
+                    f"619{rng.randint(10000000, 99999999)}",
+                    rng.choice(unidades),
+                )
+                for i in range(total)
+            ),
+            total, lote,
+        )
+        pacientes = range(inicio_paciente, inicio_paciente + total)
+
+        total = escalar(args.pedidos)
+        inicio_pedido = _proximo_id("pedidos")
+        datas = array("d")
+        _em_lotes(
+            "pedidos",
+            [
+                "id", "paciente_id", "exame_id", "consulta_id", "unidade_id", "tipo_solicitacao",
+                "status", "tipo_regulacao", "prioridade", "data_solicitacao", "data_atualizacao",
+                "usuario_criacao", "usuario_atualizacao", "data_exame", "horario_exame",
+                "local_exame", "tentativas_contato", "entrega_confirmada",
+            ],
+            _pedidos(rng, inicio_pedido, total, pacientes, unidades, exames, consultas, recepcao_id, datas, agora),
+            total, lote,
+        )
+
+        total = escalar(args.historico)
+        _em_lotes(
+            "historico_pedidos",
+            ["pedido_id", "status", "descricao", "criado_por", "criado_em"],
+            _historico(rng, inicio_pedido, datas, total, recepcao_id),
+            total, lote,
+        )
+
+        # Conversas privadas entre usuários do chat; o admin participa de parte delas
+        admin_id = usuarios["admin"]["id"]
+        pessoas = list(usuarios_chat) + [dados["id"] for dados in usuarios.values()]
+        quantidade = max(1, escalar(args.mensagens) // 2000)
+        inicio_conversa = _proximo_id("conversations")
+        conversas = []
+        for i in range(quantidade):
+            primeiro = admin_id if i % 10 == 0 else rng.choice(pessoas)
+            segundo = rng.choice([pessoa for pessoa in pessoas if pessoa != primeiro])
+            conversas.append((inicio_conversa + i, (primeiro, segundo)))
+        _inserir(
+            "conversations", ["id", "room", "created_at"],
+            [(conversa_id, f"benchmark_{conversa_id}", agora - timedelta(days=365)) for conversa_id, _ in conversas],
+        )
+        _inserir(
+            "conversation_participants", ["conversation_id", "user_id"],
+            [(conversa_id, pessoa) for conversa_id, dupla in conversas for pessoa in dupla],
+        )
+        total = escalar(args.mensagens)
+        _em_lotes(
+            "messages",
+            ["conversation_id", "user_id", "message", "created_at"],
+            _mensagens(rng, conversas, total, agora),
+            total, lote,
+        )
+
+        print("Atualizando estatísticas das tabelas...")
+        with mysql.get_cursor() as (_, cursor):
+            cursor.execute("ANALYZE TABLE pacientes, pedidos, historico_pedidos, messages, conversation_participants")
+            cursor.fetchall()
+        for namespace in (cache_service.PEDIDOS, cache_service.REFERENCIA, cache_service.USUARIOS):
+            cache_service.invalidar(namespace)
+
+    manifesto = {
+        "gerado_em": agora.isoformat(),
+        "senha": args.senha,
+        "usuarios": {role: dados["cpf"] for role, dados in usuarios.items()},
+        "pacientes_cpf": [f"7{rng.choice(pacientes):010d}" for _ in range(min(500, len(pacientes)))],
+        "conversas_admin": [conversa_id for conversa_id, dupla in conversas if admin_id in dupla][:200],
+        # Para o scripts/benchmark_socketio.py: quem pode logar e salas existentes
+        "usuarios_chat": list(usuarios_chat.values()),
+        "conversas": [[conversa_id, f"benchmark_{conversa_id}"] for conversa_id, _ in conversas[:500]],
+        "volumes": {
+            "unidades": escalar(args.unidades),
+            "pacientes": escalar(args.pacientes),
+            "pedidos": escalar(args.pedidos),
+            "historico": escalar(args.historico),
+            "mensagens": escalar(args.mensagens),
+        },
+    }
+    with open(args.manifesto, "w", encoding="utf-8") as arquivo:
+        json.dump(manifesto, arquivo, ensure_ascii=False, indent=2)
+    print(f"Manifesto gravado em {args.manifesto}.")
+
+
+if __name__ == "__main__":
+    main()
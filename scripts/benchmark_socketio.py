@@ -0,0 +1,387 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import mysql.connector
+
+from config import Config
+
+try:  # cliente Socket.IO: pip install "python-socketio[client]" (requests + websocket-client)
+    import requests
+    import socketio
+except ImportError:  # pragma: no cover - depende do ambiente
+    requests = None
+    socketio = None
+
+# ==========================================================
+# 📡 Teste de carga do chat e da presença (Socket.IO)
+# ==========================================================
+# Abre N clientes autenticados contra o servidor local (python run.py) sobre a
+# base do scripts/benchmark_popular.py. Cada cliente entra na sala de uma
+# conversa, envia mensagens a uma taxa configurável (com anexos opcionais) e
+# manda heartbeats. Mede:
+#  - latência de conexão;
+#  - latência ponta a ponta de cada entrega (envio -> evento "message" em cada
+#    cliente da sala; tudo no mesmo processo, então o relógio é o mesmo);
+#  - consultas ao banco por mensagem (SHOW GLOBAL STATUS antes/depois: inclui
+#    heartbeats e qualquer outro tráfego; use --heartbeat 0 para isolar);
+#  - CPU e RSS do processo do servidor, lidos de /proc (Linux).
+# O login tem limite por IP (LOGIN_LIMITE_POR_IP): os clientes dividem as
+# sessões de --usuarios contas; suba o limite no servidor se precisar de mais.
+
+MARCADOR = "carga"
+
+
+def _percentis(valores: list[float]) -> dict:
+    if len(valores) < 2:
+        valor = round(valores[0], 2) if valores else None
+        return {"p50": valor, "p95": valor, "p99": valor, "media": valor, "max": valor}
+    cortes = statistics.quantiles(valores, n=100, method="inclusive")
+    return {
+        "p50": round(cortes[49], 2),
+        "p95": round(cortes[94], 2),
+        "p99": round(cortes[98], 2),
+        "media": round(statistics.fmean(valores), 2),
+        "max": round(max(valores), 2),
+    }
+
+
+# ==========================================================
+# 🖥️ Processo do servidor e contadores do MySQL
+# ==========================================================
+def _localizar_servidor() -> int | None:
+    """PID do `python run.py` local, procurando em /proc."""
+    for entrada in os.listdir("/proc"):
+        if not entrada.isdigit() or int(entrada) == os.getpid():
+            continue
+        try:
+            with open(f"/proc/{entrada}/cmdline", "rb") as arquivo:
+                argumentos = arquivo.read().split(b"\0")
+        except OSError:
+            continue
+        if any(argumento.endswith(b"run.py") for argumento in argumentos):
+            return int(entrada)
+    return None
+
+
+class MonitorProcesso:
+    """Amostra CPU (%) e RSS (MB) de um processo a cada segundo."""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.cpu, self.rss = [], []
+        self._ativo = False
+        self._ticks = os.sysconf("SC_CLK_TCK")
+
+    def _tempo_cpu(self) -> float:
+        with open(f"/proc/{self.pid}/stat") as arquivo:
+            campos = arquivo.read().rpartition(")")[2].split()
+        return (int(campos[11]) + int(campos[12])) / self._ticks  # utime + stime
+
+    def _rss_mb(self) -> float:
+        with open(f"/proc/{self.pid}/status") as arquivo:
+            for linha in arquivo:
+                if linha.startswith("VmRSS:"):
+                    return int(linha.split()[1]) / 1024
+        return 0.0
+
+    def _executar(self) -> None:
+        anterior, instante = self._tempo_cpu(), time.monotonic()
+        while self._ativo:
+            time.sleep(1)
+            try:
+                atual, agora = self._tempo_cpu(), time.monotonic()
+                self.cpu.append(100 * (atual - anterior) / (agora - instante))
+                self.rss.append(self._rss_mb())
+            except OSError:  # o servidor caiu durante o teste
+                break
+            anterior, instante = atual, agora
+
+    def iniciar(self) -> None:
+        self._ativo = True
+        self.rss.append(self._rss_mb())
+        threading.Thread(target=self._executar, daemon=True).start()
+
+    def parar(self) -> dict:
+        self._ativo = False
+        return {
+            "pid": self.pid,
+            "cpu_percentual_medio": round(statistics.fmean(self.cpu), 1) if self.cpu else None,
+            "cpu_percentual_max": round(max(self.cpu), 1) if self.cpu else None,
+            "rss_mb_inicio": round(self.rss[0], 1) if self.rss else None,
+            "rss_mb_max": round(max(self.rss), 1) if self.rss else None,
+            "rss_mb_fim": round(self.rss[-1], 1) if self.rss else None,
+        }
+
+
+def _status_mysql() -> dict | None:
+    """Contadores globais de comandos do MySQL (None se não conectar)."""
+    try:
+        conexao = mysql.connector.connect(
+            host=Config.MYSQL_HOST, port=Config.MYSQL_PORT, user=Config.MYSQL_USER,
+            password=Config.MYSQL_PASSWORD, database=Config.MYSQL_DATABASE,
+        )
+    except mysql.connector.Error:
+        return None
+    try:
+        cursor = conexao.cursor()
+        cursor.execute(
+            "SHOW GLOBAL STATUS WHERE Variable_name IN "
+            "('Questions', 'Com_select', 'Com_insert', 'Com_update', 'Com_commit')"
+        )
+        return {nome: int(valor) for nome, valor in cursor.fetchall()}
+    finally:
+        conexao.close()
+
+
+# ==========================================================
+# 👥 Clientes
+# ==========================================================
+class Coleta:
+    """Resultados compartilhados entre os clientes (protegidos por trava)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.conexao_ms = []
+        self.entrega_ms = []
+        self.enviadas = {}        # (cliente, seq) -> (instante, tamanho da sala)
+        self.entregas = Counter()  # (cliente, seq) -> entregas recebidas
+        self.eventos = Counter()
+
+    def contar(self, evento: str) -> None:
+        with self.lock:
+            self.eventos[evento] += 1
+
+
+class ClienteCarga:
+    def __init__(self, numero: int, url: str, cookies: str, sala: tuple, coleta: Coleta, args):
+        self.numero = numero
+        self.url = url
+        self.cookies = cookies
+        self.conversa_id, self.sala = sala
+        self.coleta = coleta
+        self.args = args
+        self.sessao_http = requests.Session()
+        self.sessao_http.headers["Cookie"] = cookies
+        self.sio = socketio.Client(reconnection=False)
+        self.sio.on("message", self._ao_receber)
+        self.sio.on("error", lambda _dados: coleta.contar("erros_servidor"))
+        self.sio.on("disconnect", lambda *_: coleta.contar("desconexoes"))
+
+    def _ao_receber(self, dados: dict) -> None:
+        texto = dados.get("msg") or ""
+        if not texto.startswith(MARCADOR + ":"):
+            return
+        _, cliente, seq = texto.split(" ", 1)[0].split(":")
+        chave = (int(cliente), int(seq))
+        agora = time.perf_counter()
+        with self.coleta.lock:
+            enviada = self.coleta.enviadas.get(chave)
+            if enviada:
+                self.coleta.entrega_ms.append((agora - enviada[0]) * 1000)
+                self.coleta.entregas[chave] += 1
+
+    def conectar(self) -> bool:
+        inicio = time.perf_counter()
+        try:
+            self.sio.connect(self.url, headers={"Cookie": self.cookies}, transports=["websocket"])
+        except socketio.exceptions.ConnectionError:
+            self.coleta.contar("falhas_conexao")
+            return False
+        with self.coleta.lock:
+            self.coleta.conexao_ms.append((time.perf_counter() - inicio) * 1000)
+        self.sio.emit("join", {"room": self.sala})
+        return True
+
+    def _anexo(self) -> dict | None:
+        conteudo = os.urandom(self.args.tamanho_anexo)
+        resposta = self.sessao_http.post(
+            f"{self.url}/chat/upload",
+            files={"file": (f"carga_{self.numero}.pdf", conteudo, "application/pdf")},
+        )
+        if resposta.status_code != 201:
+            self.coleta.contar("falhas_upload")
+            return None
+        dados = resposta.json()
+        return {
+            "filename": dados["filename"],
+            "original_name": dados["original_filename"],
+            "type": dados["mime_type"],
+            "size": dados["size"],
+        }
+
+    def executar(self, fim: float, tamanho_sala: int, rng: random.Random) -> None:
+        seq = 0
+        proximo_heartbeat = time.monotonic() + rng.uniform(0, self.args.heartbeat or 1)
+        proxima_mensagem = time.monotonic() + rng.expovariate(self.args.taxa)
+        while time.monotonic() < fim and self.sio.connected:
+            agora = time.monotonic()
+            if self.args.heartbeat and agora >= proximo_heartbeat:
+                self.sio.emit("heartbeat")
+                self.coleta.contar("heartbeats")
+                proximo_heartbeat = agora + self.args.heartbeat
+            if agora >= proxima_mensagem:
+                seq += 1
+                anexos = []
+                if rng.random() < self.args.anexos:
+                    anexo = self._anexo()
+                    anexos = [anexo] if anexo else []
+                with self.coleta.lock:
+                    self.coleta.enviadas[(self.numero, seq)] = (time.perf_counter(), tamanho_sala)
+                self.sio.emit("send_message", {
+                    "room": self.sala,
+                    "conversation_id": self.conversa_id,
+                    "message": f"{MARCADOR}:{self.numero}:{seq} mensagem de carga",
+                    "attachments": anexos,
+                })
+                self.coleta.contar("mensagens")
+                if anexos:
+                    self.coleta.contar("anexos")
+                # Chegadas de Poisson: intervalo exponencial com média 1/taxa
+                proxima_mensagem = agora + rng.expovariate(self.args.taxa)
+            limite = min(proxima_mensagem, proximo_heartbeat) if self.args.heartbeat else proxima_mensagem
+            time.sleep(max(0.0, min(limite, fim) - time.monotonic()))
+
+    def desconectar(self) -> None:
+        if self.sio.connected:
+            self.sio.disconnect()
+
+
+def _login(url: str, cpf: str, senha: str) -> str:
+    sessao = requests.Session()
+    resposta = sessao.post(f"{url}/login", data={"cpf": cpf, "senha": senha})
+    if resposta.status_code != 200 or resposta.url.rstrip("/").endswith("/login"):
+        raise SystemExit(f"Falha no login do CPF {cpf} (status {resposta.status_code}).")
+    return "; ".join(f"{nome}={valor}" for nome, valor in sessao.cookies.items())
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Teste de carga do chat/presença: N clientes Socket.IO autenticados contra o servidor local."
+    )
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--manifesto", default="benchmark_manifesto.json", help="Gerado pelo benchmark_popular.py.")
+    parser.add_argument("--clientes", type=int, default=50, help="Conexões Socket.IO simultâneas.")
+    parser.add_argument("--usuarios", type=int, default=20, help="Contas distintas (os clientes dividem as sessões).")
+    parser.add_argument("--por-sala", type=int, default=2, help="Clientes em cada sala de conversa.")
+    parser.add_argument("--taxa", type=float, default=0.5, help="Mensagens por segundo, por cliente.")
+    parser.add_argument("--duracao", type=float, default=60, help="Segundos de envio.")
+    parser.add_argument("--heartbeat", type=float, default=30, help="Intervalo do heartbeat em segundos (0 desliga).")
+    parser.add_argument("--anexos", type=float, default=0.0, help="Fração das mensagens com anexo (0 a 1).")
+    parser.add_argument("--tamanho-anexo", type=int, default=50_000, help="Bytes de cada anexo.")
+    parser.add_argument("--espera", type=float, default=5, help="Segundos aguardando entregas após o envio.")
+    parser.add_argument("--pid-servidor", type=int, help="PID do run.py (padrão: procura em /proc).")
+    parser.add_argument("--saida", help="Arquivo do relatório (padrão: benchmark_socketio_<data>.json).")
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+
+    if socketio is None or requests is None:
+        raise SystemExit('Instale o cliente Socket.IO: pip install "python-socketio[client]"')
+
+    with open(args.manifesto, encoding="utf-8") as arquivo:
+        manifesto = json.load(arquivo)
+    url = args.url.rstrip("/")
+    rng = random.Random(args.semente)
+
+    cpfs = manifesto["usuarios_chat"][:args.usuarios]
+    print(f"Login de {len(cpfs)} usuários...", flush=True)
+    sessoes = [_login(url, cpf, manifesto["senha"]) for cpf in cpfs]
+
+    salas = manifesto["conversas"]
+    coleta = Coleta()
+    clientes = [
+        ClienteCarga(numero, url, sessoes[numero % len(sessoes)], tuple(salas[(numero // args.por_sala) % len(salas)]),
+                     coleta, args)
+        for numero in range(args.clientes)
+    ]
+
+    pid = args.pid_servidor or _localizar_servidor()
+    monitor = MonitorProcesso(pid) if pid else None
+    if monitor:
+        monitor.iniciar()
+    else:
+        print("Processo do servidor não encontrado: CPU/RSS não serão medidos (use --pid-servidor).")
+
+    print(f"Conectando {len(clientes)} clientes...", flush=True)
+    conectados = [cliente for cliente in clientes if cliente.conectar()]
+    time.sleep(1)  # deixa os joins chegarem antes das mensagens
+    tamanho_sala = Counter(cliente.sala for cliente in conectados)
+
+    mysql_antes = _status_mysql()
+    print(f"Enviando por {args.duracao:.0f}s ({len(conectados)} clientes, {args.taxa}/s cada)...", flush=True)
+    fim = time.monotonic() + args.duracao
+    threads = [
+        threading.Thread(
+            target=cliente.executar,
+            args=(fim, tamanho_sala[cliente.sala], random.Random(rng.random())),
+            daemon=True,
+        )
+        for cliente in conectados
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    time.sleep(args.espera)
+    mysql_depois = _status_mysql()
+
+    for cliente in conectados:
+        cliente.desconectar()
+    servidor = monitor.parar() if monitor else None
+
+    mensagens = coleta.eventos["mensagens"]
+    esperadas = sum(tamanho for _, tamanho in coleta.enviadas.values())
+    entregues = sum(coleta.entregas.values())
+    banco = None
+    if mysql_antes and mysql_depois:
+        delta = {nome: mysql_depois[nome] - mysql_antes[nome] for nome in mysql_antes}
+        banco = {
+            "delta": delta,
+            "consultas_por_mensagem": round(delta["Questions"] / mensagens, 2) if mensagens else None,
+        }
+
+    agora = datetime.now()
+    relatorio = {
+        "gerado_em": agora.isoformat(timespec="seconds"),
+        "url": url,
+        "parametros": {chave: valor for chave, valor in vars(args).items() if chave not in ("saida", "manifesto")},
+        "clientes_conectados": len(conectados),
+        "conexao_ms": _percentis(coleta.conexao_ms),
+        "mensagens_enviadas": mensagens,
+        "anexos_enviados": coleta.eventos["anexos"],
+        "heartbeats": coleta.eventos["heartbeats"],
+        "entregas_esperadas": esperadas,
+        "entregas_recebidas": entregues,
+        "entregas_perdidas": esperadas - entregues,
+        "entrega_ms": _percentis(coleta.entrega_ms),
+        "vazao_mensagens_s": round(mensagens / args.duracao, 2),
+        "eventos": dict(coleta.eventos),
+        "banco": banco,
+        "servidor": servidor,
+    }
+    saida = args.saida or f"benchmark_socketio_{agora:%Y%m%d-%H%M%S}.json"
+    with open(saida, "w", encoding="utf-8") as arquivo:
+        json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+
+    conexao, entrega = relatorio["conexao_ms"], relatorio["entrega_ms"]
+    print(f"\nConexão (ms): p50 {conexao['p50']} | p95 {conexao['p95']} | p99 {conexao['p99']}")
+    print(f"Entrega (ms): p50 {entrega['p50']} | p95 {entrega['p95']} | p99 {entrega['p99']}")
+    print(f"Mensagens: {mensagens} enviadas, {entregues}/{esperadas} entregas ({esperadas - entregues} perdidas)")
+    if banco:
+        print(f"Banco: {banco['consultas_por_mensagem']} consultas por mensagem ({banco['delta']})")
+    if servidor:
+        print(
+            f"Servidor: CPU média {servidor['cpu_percentual_medio']}% (máx. {servidor['cpu_percentual_max']}%), "
+            f"RSS {servidor['rss_mb_inicio']} -> {servidor['rss_mb_max']} MB"
+        )
+    print(f"Relatório gravado em {saida}.")
+
+
+if __name__ == "__main__":
+    main()
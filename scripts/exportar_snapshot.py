@@ -0,0 +1,28 @@
+import argparse
+
+from app import create_app
+from app.services import analytics_service
+
+app = create_app()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Exporta pedidos, histórico e tentativas para o snapshot colunar de análises (.npz) "
+            "e grava as métricas calculadas para a página de relatórios."
+        )
+    )
+    parser.add_argument("--destino", help="Caminho do arquivo (padrão: ANALYTICS_SNAPSHOT_PATH).")
+    args = parser.parse_args()
+
+    with app.app_context():
+        totais = analytics_service.exportar_snapshot(args.destino)
+        resumo = ", ".join(f"{conjunto}: {total}" for conjunto, total in totais.items())
+        print(f"Snapshot gerado ({resumo}).")
+        destino = args.destino or app.config["ANALYTICS_SNAPSHOT_PATH"]
+        print(f"Métricas gravadas em {analytics_service.caminho_metricas(destino)}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import argparse
+import os
+
+from app import create_app
+from app.repositories import usuarios as usuarios_repo
+from app.services import importacao_service
+from app.utils.exportacao import gerar_csv
+from app.utils.importacao import FORMATOS_IMPORTACAO
+
+app = create_app()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Importa pedidos (e cadastros de pacientes) de uma planilha CSV/XLSX de unidade."
+    )
+    parser.add_argument("arquivo", help="Planilha .csv ou .xlsx com linha de cabeçalho.")
+    parser.add_argument("--usuario-cpf", required=True, help="Usuário registrado como criador dos pedidos.")
+    parser.add_argument("--unidade-id", type=int, help="Unidade das linhas sem a coluna unidade.")
+    parser.add_argument("--tamanho-lote", type=int, help="Linhas gravadas por transação.")
+    parser.add_argument("--simular", action="store_true", help="Só valida; não grava nada.")
+    parser.add_argument("--relatorio", help="CSV com as linhas recusadas (padrão: <arquivo>_erros.csv).")
+    args = parser.parse_args()
+
+    formato = os.path.splitext(args.arquivo)[1].lower().lstrip(".")
+    if formato not in FORMATOS_IMPORTACAO:
+        raise SystemExit("Use um arquivo .csv ou .xlsx.")
+
+    with app.app_context():
+        usuario = usuarios_repo.obter_por_cpf(args.usuario_cpf, incluir_inativos=False)
+        if usuario is None:
+            raise SystemExit(f"Usuário ativo com CPF {args.usuario_cpf} não encontrado.")
+        # Recepção só importa para a própria unidade, como na tela
+        unidade_fixa = usuario["unidade_id"] if usuario["role"] == "recepcao" else None
+
+        with open(args.arquivo, "rb") as arquivo:
+            try:
+                resultado = importacao_service.importar_pedidos(
+                    arquivo,
+                    formato,
+                    usuario_id=usuario["id"],
+                    unidade_fixa=unidade_fixa,
+                    unidade_padrao=args.unidade_id,
+                    tamanho_lote=args.tamanho_lote,
+                    simular=args.simular,
+                )
+            except (ValueError, RuntimeError) as erro:
+                raise SystemExit(str(erro))
+
+    acao = "válidas" if resultado["simulacao"] else "importadas"
+    print(
+        f"Linhas lidas: {resultado['linhas']}, {acao}: {resultado['importados']}, "
+        f"com erro: {len(resultado['erros'])} ({resultado['segundos']} s, {resultado['lotes']} lotes)."
+    )
+    if resultado["erros"]:
+        destino = args.relatorio or f"{os.path.splitext(args.arquivo)[0]}_erros.csv"
+        with open(destino, "wb") as saida:
+            for bloco in gerar_csv(resultado["erros"], importacao_service.COLUNAS_RELATORIO):
+                saida.write(bloco)
+        print(f"Relatório de erros gravado em {destino}.")
+
+
+if __name__ == "__main__":
+    main()